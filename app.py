@@ -10,6 +10,8 @@ from utils.auth import check_login, login_required, logout, init_session
 from components.sidebar import render_sidebar
 from components.header import render_header, render_page_title
 from database.schema import get_db_connection
+from models.notifications import get_notifications, mark_notifications_read
+from models.jobs import start_background_worker
 
 # Import page modules
 from pages.admin import dashboard, students, teachers, courses, assignments, ai_tools, analytics, course_enrollment, academic_calendar, student_transcript_viewer
@@ -31,6 +33,11 @@ st.set_page_config(
 # Initialize session state
 init_session()
 
+# Drain the job queue in this server process: queued jobs, expired class test attempts,
+# notification delivery and timetable rebuilds all run from the worker loop. Started once
+# per process; later reruns find the thread alive and return.
+start_background_worker()
+
 # Check if static/images directory exists, create if not
 os.makedirs("static/images", exist_ok=True)
 
@@ -326,9 +333,16 @@ def teacher_dashboard():
     # Show notifications
     st.write("### Notifications")
     
-    # Example notifications - this would be connected to a notifications table in a real implementation
-    st.info("📬 Admin has uploaded new teaching materials for your courses.")
-    st.info("📬 Grade submission for Mid-term will be open from next week.")
+    notifications = get_notifications(conn, teacher_id, 'teacher', unread_only=True, limit=5)
+    if notifications:
+        for notification in notifications:
+            updates = f" ({notification['event_count']} updates)" if notification['event_count'] > 1 else ""
+            st.info(f"📬 **{notification['title']}**{updates} - {notification['message']}")
+        if st.button("Mark all as read", key="teacher_notifications_read"):
+            mark_notifications_read(conn, teacher_id, 'teacher')
+            st.rerun()
+    else:
+        st.write("No new notifications.")
     
     # Close the database connection
     conn.close()
@@ -1,2 +1,3 @@
 from components.sidebar import render_sidebar
-from components.header import render_header, render_page_title 
\ No newline at end of file
+from components.header import render_header, render_page_title 
+from components.pagination import render_page_controls
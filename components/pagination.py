@@ -0,0 +1,15 @@
+import streamlit as st
+
+def render_page_controls(cursors, older_cursor, key):
+    """Render Newer/Older buttons for a keyset-paged list (cursors is the session's page stack)"""
+    newer_col, page_col, older_col = st.columns([1, 2, 1])
+    with newer_col:
+        if st.button("← Newer", key=f"{key}_newer", disabled=len(cursors) == 1):
+            cursors.pop()
+            st.rerun()
+    with page_col:
+        st.caption(f"Page {len(cursors)}")
+    with older_col:
+        if st.button("Older →", key=f"{key}_older", disabled=older_cursor is None):
+            cursors.append(older_cursor)
+            st.rerun()
@@ -3,13 +3,19 @@ import os
 import json
 from datetime import datetime
 
+# SQLite database file; INTELLIX_DB_PATH points the app (and its worker processes) elsewhere
+DB_PATH = os.environ.get("INTELLIX_DB_PATH", os.path.join(os.path.dirname(__file__), 'intellix.db'))
+
 # Database initialization
 def init_db():
     """Initialize the database with the required tables"""
-    db_path = os.path.join(os.path.dirname(__file__), 'intellix.db')
-    conn = sqlite3.connect(db_path)
+    conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
     
+    # Write-ahead logging lets pages keep reading while the background worker writes;
+    # the mode is stored in the database file, so every later connection uses it
+    cursor.execute("PRAGMA journal_mode=WAL")
+    
     # Create users table
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS users (
@@ -81,6 +87,74 @@ def init_db():
     )
     ''')
     
+    # Create course_seats table (enrolled_count per course and semester, kept in step by triggers)
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='course_seats'")
+    seats_table_exists = cursor.fetchone() is not None
+
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS course_seats (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        course_id INTEGER NOT NULL,
+        semester TEXT NOT NULL,
+        enrolled_count INTEGER NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (course_id) REFERENCES courses (id),
+        UNIQUE(course_id, semester)
+    )
+    ''')
+
+    if not seats_table_exists:
+        # Backfill counters from enrollments made before the table existed
+        cursor.execute('''
+        INSERT INTO course_seats (course_id, semester, enrolled_count)
+        SELECT course_id, semester, COUNT(*) FROM enrollments GROUP BY course_id, semester
+        ''')
+
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS enrollments_seat_insert AFTER INSERT ON enrollments
+    BEGIN
+        INSERT OR IGNORE INTO course_seats (course_id, semester, enrolled_count) VALUES (NEW.course_id, NEW.semester, 0);
+        UPDATE course_seats SET enrolled_count = enrolled_count + 1, updated_at = CURRENT_TIMESTAMP
+        WHERE course_id = NEW.course_id AND semester = NEW.semester;
+    END
+    ''')
+
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS enrollments_seat_delete AFTER DELETE ON enrollments
+    BEGIN
+        UPDATE course_seats SET enrolled_count = MAX(enrolled_count - 1, 0), updated_at = CURRENT_TIMESTAMP
+        WHERE course_id = OLD.course_id AND semester = OLD.semester;
+    END
+    ''')
+
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS enrollments_seat_update AFTER UPDATE OF course_id, semester ON enrollments
+    BEGIN
+        UPDATE course_seats SET enrolled_count = MAX(enrolled_count - 1, 0), updated_at = CURRENT_TIMESTAMP
+        WHERE course_id = OLD.course_id AND semester = OLD.semester;
+        INSERT OR IGNORE INTO course_seats (course_id, semester, enrolled_count) VALUES (NEW.course_id, NEW.semester, 0);
+        UPDATE course_seats SET enrolled_count = enrolled_count + 1, updated_at = CURRENT_TIMESTAMP
+        WHERE course_id = NEW.course_id AND semester = NEW.semester;
+    END
+    ''')
+
+    # Create waitlist table (students waiting for a seat in a full course)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS waitlist (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        student_id INTEGER NOT NULL,
+        course_id INTEGER NOT NULL,
+        semester TEXT NOT NULL,
+        status TEXT DEFAULT 'waiting',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        promoted_at TIMESTAMP,
+        FOREIGN KEY (student_id) REFERENCES students (id),
+        FOREIGN KEY (course_id) REFERENCES courses (id),
+        UNIQUE(student_id, course_id, semester)
+    )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_waitlist_course ON waitlist (course_id, semester, status, id)")
+
     # Create teaching table (teachers assigned to courses)
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS teaching (
@@ -162,10 +236,28 @@ def init_db():
         student_id INTEGER NOT NULL,
         plan_json TEXT NOT NULL,
         semester TEXT NOT NULL,
+        input_hash TEXT,
+        version INTEGER NOT NULL DEFAULT 1,
         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
         FOREIGN KEY (student_id) REFERENCES students (id)
     )
     ''')
+    # Older study_plans tables kept every generated plan unversioned; number the existing rows per student and semester
+    cursor.execute("SELECT COUNT(*) FROM pragma_table_info('study_plans') WHERE name = 'version'")
+    if cursor.fetchone()[0] == 0:
+        cursor.execute("ALTER TABLE study_plans ADD COLUMN input_hash TEXT")
+        cursor.execute("ALTER TABLE study_plans ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+        cursor.execute('''
+        UPDATE study_plans SET version = (
+            SELECT COUNT(*) FROM study_plans p
+            WHERE p.student_id = study_plans.student_id AND p.semester = study_plans.semester AND p.id <= study_plans.id
+        )
+        ''')
+    # Latest plan lookup: ORDER BY version DESC LIMIT 1 on this index
+    cursor.execute('''
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_study_plans_version
+    ON study_plans (student_id, semester, version)
+    ''')
     
     # Create class_tests table
     cursor.execute('''
@@ -231,12 +323,450 @@ def init_db():
         marks REAL DEFAULT 0,
         status TEXT DEFAULT 'pending',
         submitted_at TIMESTAMP,
+        key_version TEXT,
         FOREIGN KEY (student_id) REFERENCES students (id),
         FOREIGN KEY (test_id) REFERENCES class_tests (id),
         UNIQUE(student_id, test_id)
     )
     ''')
+    # key_version records which class_tests.updated_at a submission was scored against (models/test_grading.py)
+    cursor.execute("SELECT COUNT(*) FROM pragma_table_info('student_test_submissions') WHERE name = 'key_version'")
+    if cursor.fetchone()[0] == 0:
+        cursor.execute("ALTER TABLE student_test_submissions ADD COLUMN key_version TEXT")
     
+    # Normalized class test storage: one row per question and per submitted answer (models/test_grading.py)
+    cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = 'test_answers'")
+    migrate_test_json = cursor.fetchone()[0] == 0
+    migrated_answers = 0
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS test_questions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        test_id INTEGER NOT NULL,
+        position INTEGER NOT NULL,
+        question TEXT NOT NULL,
+        type TEXT NOT NULL,
+        options TEXT,
+        answer INTEGER,
+        expected_answer TEXT,
+        marks REAL NOT NULL,
+        FOREIGN KEY (test_id) REFERENCES class_tests (id),
+        UNIQUE(test_id, position)
+    )
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS test_answers (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        submission_id INTEGER NOT NULL,
+        test_id INTEGER NOT NULL,
+        student_id INTEGER NOT NULL,
+        position INTEGER NOT NULL,
+        choice INTEGER,
+        text_answer TEXT,
+        is_correct BOOLEAN,
+        marks_awarded REAL,
+        FOREIGN KEY (submission_id) REFERENCES student_test_submissions (id),
+        UNIQUE(submission_id, position)
+    )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_test_answers_item ON test_answers (test_id, position)")
+    if migrate_test_json:
+        # Copy the JSON columns once; migrated submissions are marked unscored and a
+        # regrade_class_tests job (queued below) fills is_correct/marks_awarded
+        cursor.execute('''
+        INSERT OR IGNORE INTO test_questions (test_id, position, question, type, options, answer, expected_answer, marks)
+        SELECT ct.id, CAST(q.key AS INTEGER), IFNULL(json_extract(q.value, '$.question'), ''),
+               IFNULL(json_extract(q.value, '$.type'), 'short_answer'), json_extract(q.value, '$.options'),
+               json_extract(q.value, '$.answer'), json_extract(q.value, '$.expected_answer'),
+               IFNULL(json_extract(q.value, '$.marks'), 0)
+        FROM class_tests ct, json_each(ct.questions) q
+        WHERE json_valid(ct.questions) AND json_type(ct.questions) = 'array'
+        ''')
+        cursor.execute('''
+        INSERT OR IGNORE INTO test_answers (submission_id, test_id, student_id, position, choice, text_answer)
+        SELECT sts.id, sts.test_id, sts.student_id, tq.position,
+               CASE WHEN tq.type = 'mcq' THEN CAST(a.value AS INTEGER) END,
+               CASE WHEN tq.type != 'mcq' THEN CAST(a.value AS TEXT) END
+        FROM student_test_submissions sts, json_each(sts.answers) a
+        JOIN test_questions tq ON tq.test_id = sts.test_id AND 'q_' || tq.position = a.key
+        WHERE json_valid(sts.answers) AND json_type(sts.answers) = 'object'
+        ''')
+        migrated_answers = cursor.rowcount
+        cursor.execute("UPDATE student_test_submissions SET key_version = NULL")
+    
+    # Create test attempt tables (server-timed, resumable class test attempts; models/test_attempts.py)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS test_attempts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        student_id INTEGER NOT NULL,
+        test_id INTEGER NOT NULL,
+        status TEXT NOT NULL DEFAULT 'in_progress',
+        current_page INTEGER NOT NULL DEFAULT 0,
+        started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        deadline TIMESTAMP NOT NULL,
+        submitted_at TIMESTAMP,
+        FOREIGN KEY (student_id) REFERENCES students (id),
+        FOREIGN KEY (test_id) REFERENCES class_tests (id),
+        UNIQUE(student_id, test_id)
+    )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_test_attempts_deadline ON test_attempts (status, deadline)")
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS test_attempt_answers (
+        attempt_id INTEGER NOT NULL,
+        position INTEGER NOT NULL,
+        value TEXT,
+        saved_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (attempt_id, position),
+        FOREIGN KEY (attempt_id) REFERENCES test_attempts (id)
+    )
+    ''')
+    
+    # Create command_journal table (AI command executions, used for history and undo)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS command_journal (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        command_text TEXT NOT NULL,
+        operation TEXT,
+        plan_json TEXT,
+        affected_json TEXT,
+        status TEXT NOT NULL,
+        message TEXT,
+        duration_ms REAL,
+        executed_by TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        undone_at TIMESTAMP
+    )
+    ''')
+
+    # Create class_routine and exam_schedule tables (filled by the schedulers in models/scheduler.py)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS class_routine (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        course_id INTEGER NOT NULL,
+        teacher_id INTEGER NOT NULL,
+        day TEXT NOT NULL,
+        time_slot TEXT NOT NULL,
+        room TEXT NOT NULL,
+        session TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (course_id) REFERENCES courses (id),
+        FOREIGN KEY (teacher_id) REFERENCES teachers (id),
+        UNIQUE(course_id, day, time_slot, session)
+    )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_class_routine_session_day ON class_routine (session, day)")
+
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS exam_schedule (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        course_id INTEGER NOT NULL,
+        exam_date DATE NOT NULL,
+        start_time TIME NOT NULL,
+        end_time TIME NOT NULL,
+        room TEXT NOT NULL,
+        exam_type TEXT NOT NULL DEFAULT 'Final',
+        session TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (course_id) REFERENCES courses (id),
+        UNIQUE(course_id, exam_date, exam_type, session)
+    )
+    ''')
+    # exam_schedule tables created by older versions of the calendar page have no exam_type column
+    cursor.execute("SELECT COUNT(*) FROM pragma_table_info('exam_schedule') WHERE name = 'exam_type'")
+    if cursor.fetchone()[0] == 0:
+        cursor.execute("ALTER TABLE exam_schedule ADD COLUMN exam_type TEXT NOT NULL DEFAULT 'Final'")
+
+    # Create schedule_blocks table (closed rooms, days, slots and halls that every routine or
+    # exam repair of the session keeps honouring; block is the JSON dict passed to the repair)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS schedule_blocks (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session TEXT NOT NULL,
+        schedule TEXT NOT NULL,
+        block TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE(session, schedule, block)
+    )
+    ''')
+
+    # Create timetable tables (per-student and per-teacher timetables materialized by models/timetable.py)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS timetable_entries (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        owner_role TEXT NOT NULL,
+        owner_id INTEGER NOT NULL,
+        session TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        course_id INTEGER NOT NULL,
+        course_code TEXT,
+        course_title TEXT,
+        teacher_name TEXT,
+        day TEXT,
+        day_order INTEGER,
+        time_slot TEXT,
+        slot_order INTEGER,
+        exam_date DATE,
+        start_time TEXT,
+        end_time TEXT,
+        exam_type TEXT,
+        room TEXT
+    )
+    ''')
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_timetable_owner
+    ON timetable_entries (owner_role, owner_id, session, kind, day_order, slot_order)
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_timetable_session ON timetable_entries (session)")
+
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS timetable_ical (
+        owner_role TEXT NOT NULL,
+        owner_id INTEGER NOT NULL,
+        session TEXT NOT NULL,
+        ical TEXT NOT NULL,
+        generated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (owner_role, owner_id, session)
+    )
+    ''')
+
+    # Students and teachers whose materialized timetable is out of date. The triggers below mark
+    # every owner a change touches; models/timetable.py rebuilds just those owners in batches.
+    dirty_exists = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'timetable_dirty'"
+    ).fetchone()
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS timetable_dirty (
+        owner_role TEXT NOT NULL,
+        owner_id INTEGER NOT NULL,
+        session TEXT NOT NULL,
+        PRIMARY KEY (owner_role, owner_id, session)
+    ) WITHOUT ROWID
+    ''')
+    if not dirty_exists:
+        cursor.execute('''
+        INSERT OR IGNORE INTO timetable_dirty (owner_role, owner_id, session)
+        SELECT 'student', student_id, semester FROM enrollments
+        UNION SELECT 'teacher', teacher_id, semester FROM teaching
+        UNION SELECT 'teacher', teacher_id, session FROM class_routine
+        ''')
+
+    # Lookups by course and by teacher made by the triggers
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_enrollments_course ON enrollments (course_id, semester)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_teaching_course ON teaching (course_id, semester)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_class_routine_teacher ON class_routine (teacher_id, session)")
+
+    # {row} is NEW or OLD; an UPDATE marks the owners of both versions of the row
+    mark_owners = {
+        "enrollments": "SELECT 'student', {row}.student_id, {row}.semester",
+        "teaching": "SELECT 'teacher', {row}.teacher_id, {row}.semester",
+        "class_routine": """
+            SELECT 'teacher', {row}.teacher_id, {row}.session
+            UNION SELECT 'student', student_id, semester FROM enrollments
+            WHERE course_id = {row}.course_id AND semester = {row}.session""",
+        "exam_schedule": """
+            SELECT 'student', student_id, semester FROM enrollments
+            WHERE course_id = {row}.course_id AND semester = {row}.session
+            UNION SELECT 'teacher', teacher_id, semester FROM teaching
+            WHERE course_id = {row}.course_id AND semester = {row}.session"""
+    }
+    for table, owners in mark_owners.items():
+        for event, rows in [("INSERT", ["NEW"]), ("DELETE", ["OLD"]), ("UPDATE", ["OLD", "NEW"])]:
+            marks = "".join(
+                f"INSERT OR IGNORE INTO timetable_dirty (owner_role, owner_id, session) {owners.format(row=row)};\n"
+                for row in rows
+            )
+            cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {table}_timetable_dirty_{event.lower()} AFTER {event} ON {table}
+            BEGIN
+                {marks}
+            END
+            ''')
+
+    # Course titles, teacher names and session dates are copied into timetables too
+    for table, columns, owners in [
+        ("courses", "code, title", """
+            SELECT 'student', student_id, semester FROM enrollments WHERE course_id = NEW.id
+            UNION SELECT 'teacher', teacher_id, semester FROM teaching WHERE course_id = NEW.id
+            UNION SELECT 'teacher', teacher_id, session FROM class_routine WHERE course_id = NEW.id"""),
+        ("teachers", "name", """
+            SELECT 'teacher', NEW.id, session FROM class_routine WHERE teacher_id = NEW.id
+            UNION SELECT 'student', e.student_id, r.session FROM class_routine r
+            JOIN enrollments e ON e.course_id = r.course_id AND e.semester = r.session
+            WHERE r.teacher_id = NEW.id"""),
+        ("academic_sessions", "start_date, end_date", """
+            SELECT owner_role, owner_id, session FROM timetable_ical WHERE session = NEW.name""")
+    ]:
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {table}_timetable_dirty_update AFTER UPDATE OF {columns} ON {table}
+        BEGIN
+            INSERT OR IGNORE INTO timetable_dirty (owner_role, owner_id, session) {owners};
+        END
+        ''')
+
+    # Create jobs table (background job queue processed by models/jobs.py workers)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        job_type TEXT NOT NULL,
+        params_json TEXT NOT NULL DEFAULT '{}',
+        dedupe_key TEXT,
+        status TEXT NOT NULL DEFAULT 'queued',
+        priority INTEGER NOT NULL DEFAULT 0,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        max_attempts INTEGER NOT NULL DEFAULT 3,
+        progress REAL NOT NULL DEFAULT 0,
+        progress_message TEXT,
+        result_json TEXT,
+        error TEXT,
+        created_by TEXT,
+        locked_by TEXT,
+        run_after TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        started_at TIMESTAMP,
+        heartbeat_at TIMESTAMP,
+        finished_at TIMESTAMP
+    )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_jobs_queue ON jobs (status, priority, run_after)")
+    # At most one pending copy of the same job
+    cursor.execute('''
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_dedupe ON jobs (dedupe_key)
+    WHERE status IN ('queued', 'running')
+    ''')
+    if migrated_answers:
+        # Score the answers copied from the JSON columns above
+        cursor.execute('''
+        INSERT OR IGNORE INTO jobs (job_type, params_json, dedupe_key, created_by)
+        VALUES ('regrade_class_tests', '{}', 'regrade_class_tests:{}', 'migration')
+        ''')
+
+    # Create gpa_models table (versioned GPA regression models trained by models/gpa_model.py)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS gpa_models (
+        version INTEGER PRIMARY KEY AUTOINCREMENT,
+        model BLOB NOT NULL,
+        features TEXT NOT NULL,
+        training_rows INTEGER NOT NULL,
+        mae REAL,
+        r2 REAL,
+        is_active BOOLEAN NOT NULL DEFAULT 0,
+        trained_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+
+    # Create blobs table (content-addressed uploads stored by models/blob_store.py)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS blobs (
+        path TEXT PRIMARY KEY,
+        sha256 TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        refcount INTEGER NOT NULL DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_blobs_orphans ON blobs (refcount, created_at)")
+    # Keep blob reference counts in step with the columns that hold file paths
+    for table, column in (("student_assignments", "submission_file"), ("students", "photo"), ("teachers", "photo")):
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {table}_{column}_blob_insert
+        AFTER INSERT ON {table} WHEN NEW.{column} IS NOT NULL
+        BEGIN
+            UPDATE blobs SET refcount = refcount + 1 WHERE path = NEW.{column};
+        END
+        ''')
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {table}_{column}_blob_delete
+        AFTER DELETE ON {table} WHEN OLD.{column} IS NOT NULL
+        BEGIN
+            UPDATE blobs SET refcount = refcount - 1 WHERE path = OLD.{column};
+        END
+        ''')
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {table}_{column}_blob_update
+        AFTER UPDATE OF {column} ON {table} WHEN OLD.{column} IS NOT NEW.{column}
+        BEGIN
+            UPDATE blobs SET refcount = refcount - 1 WHERE path = OLD.{column};
+            UPDATE blobs SET refcount = refcount + 1 WHERE path = NEW.{column};
+        END
+        ''')
+
+    # Create broadcasts table (one row per course-wide message, delivered to everyone enrolled)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS broadcasts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        sender_id INTEGER NOT NULL,
+        sender_role TEXT NOT NULL,
+        course_id INTEGER NOT NULL,
+        semester TEXT NOT NULL,
+        recipient_role TEXT NOT NULL DEFAULT 'student',
+        subject TEXT NOT NULL,
+        message TEXT NOT NULL,
+        sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (course_id) REFERENCES courses (id)
+    )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_broadcasts_course ON broadcasts (course_id, semester, sent_at)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_broadcasts_sender ON broadcasts (sender_id, sender_role, sent_at)")
+
+    # Create broadcast_reads table (read state, a row is only written when a recipient opens a broadcast)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS broadcast_reads (
+        broadcast_id INTEGER NOT NULL,
+        recipient_id INTEGER NOT NULL,
+        recipient_role TEXT NOT NULL,
+        read_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (broadcast_id, recipient_id, recipient_role),
+        FOREIGN KEY (broadcast_id) REFERENCES broadcasts (id) ON DELETE CASCADE
+    ) WITHOUT ROWID
+    ''')
+
+    # Create notifications table (also created by update_db.py on older databases)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS notifications (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        user_role TEXT NOT NULL,
+        title TEXT NOT NULL,
+        message TEXT NOT NULL,
+        link TEXT,
+        is_read BOOLEAN DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        read_at TIMESTAMP
+    )
+    ''')
+    # Digest columns: unread notifications with the same digest_key are coalesced into one row
+    for column, definition in (("event_type", "TEXT"), ("digest_key", "TEXT"), ("event_count", "INTEGER NOT NULL DEFAULT 1")):
+        cursor.execute(f"SELECT COUNT(*) FROM pragma_table_info('notifications') WHERE name = '{column}'")
+        if cursor.fetchone()[0] == 0:
+            cursor.execute(f"ALTER TABLE notifications ADD COLUMN {column} {definition}")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_notifications_unread ON notifications (user_id, user_role, is_read, created_at)")
+    cursor.execute('''
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_notifications_digest ON notifications (user_id, user_role, digest_key)
+    WHERE is_read = 0 AND digest_key IS NOT NULL
+    ''')
+
+    # Create notification_events table (domain events queued for delivery by the notification worker)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS notification_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        event_type TEXT NOT NULL,
+        course_id INTEGER,
+        semester TEXT,
+        payload TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        processed_at TIMESTAMP,
+        recipients INTEGER
+    )
+    ''')
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_notification_events_pending ON notification_events (id)
+    WHERE processed_at IS NULL
+    ''')
+
+    # The messages table is created by update_db.py; index it once it exists
+    if cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'messages'").fetchone():
+        init_message_indexes(cursor)
+
     # Insert default admin user if not exists
     cursor.execute("SELECT * FROM users WHERE username = 'admin'")
     if not cursor.fetchone():
@@ -248,12 +778,52 @@ def init_db():
     conn.commit()
     conn.close()
     
-    return db_path
+    return DB_PATH
+
+def init_message_indexes(cursor):
+    """Create the inbox/sent indexes and the maintained unread counters for the messages table"""
+    # Keyset pagination walks these newest first
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_messages_inbox ON messages (recipient_id, recipient_role, sent_at, id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_messages_sent ON messages (sender_id, sender_role, sent_at, id)")
+
+    # Unread direct messages per user, kept current by the triggers below
+    counters_exist = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'message_counters'"
+    ).fetchone()
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS message_counters (
+        user_id INTEGER NOT NULL,
+        user_role TEXT NOT NULL,
+        unread INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, user_role)
+    ) WITHOUT ROWID
+    ''')
+    if not counters_exist:
+        cursor.execute('''
+        INSERT INTO message_counters (user_id, user_role, unread)
+        SELECT recipient_id, recipient_role, COUNT(*) FROM messages
+        WHERE is_read = 0
+        GROUP BY recipient_id, recipient_role
+        ''')
+    for name, event, condition, delta, recipient in (
+        ("insert", "AFTER INSERT", "NOT NEW.is_read", "+ 1", "NEW"),
+        ("delete", "AFTER DELETE", "NOT OLD.is_read", "- 1", "OLD"),
+        ("read", "AFTER UPDATE OF is_read", "NOT OLD.is_read AND NEW.is_read", "- 1", "NEW"),
+        ("unread", "AFTER UPDATE OF is_read", "OLD.is_read AND NOT NEW.is_read", "+ 1", "NEW"),
+    ):
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS messages_unread_{name}
+        {event} ON messages WHEN {condition}
+        BEGIN
+            INSERT INTO message_counters (user_id, user_role, unread)
+            VALUES ({recipient}.recipient_id, {recipient}.recipient_role, MAX(0, 0 {delta}))
+            ON CONFLICT (user_id, user_role) DO UPDATE SET unread = MAX(0, unread {delta});
+        END
+        ''')
 
 def get_db_connection():
     """Get a connection to the database"""
-    db_path = os.path.join(os.path.dirname(__file__), 'intellix.db')
-    conn = sqlite3.connect(db_path)
+    conn = sqlite3.connect(DB_PATH)
     conn.row_factory = sqlite3.Row
     return conn
 
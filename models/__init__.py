@@ -1,3 +1,18 @@
 from models.gpa_predictor import predict_gpa, calculate_gpa
-from models.study_plan import generate_study_plan
-from models.command_parser import parse_command, execute_command 
\ No newline at end of file
+from models.gpa_model import train_gpa_model, predict_gpas
+from models.study_plan import generate_study_plan, generate_study_plans, build_study_plan, get_latest_study_plan
+from models.command_parser import parse_command, execute_command, undo_command, get_command_history
+from models.course_import import import_courses, read_course_file, plan_course_import, apply_course_import
+from models.enrollment import plan_enrollment_changes, apply_enrollment_changes, batch_enroll, batch_unenroll
+from models.seats import get_seat_availability, reserve_seat, release_seat, promote_waitlist
+from models.scheduler import schedule_routine, schedule_exams, repair_routine, repair_exam_schedule, get_course_conflicts
+from models.timetable import refresh_timetables, refresh_all_timetables, get_weekly_timetable, get_classes_on_day, get_exam_timetable, get_ical
+from models.jobs import enqueue_job, get_job, list_jobs, cancel_job, run_worker
+from models.memo import enable_disk_cache, clear_memo, student_fingerprint
+from models.test_grading import get_answer_key, score_submission, record_submission, regrade_test, regrade_outdated_tests, item_analysis, distractor_analysis
+from models.test_attempts import start_attempt, save_answers, submit_attempt, sweep_expired_attempts, delete_class_test
+from models.blob_store import store_file, discard_file, rebuild_refcounts, collect_garbage, build_submissions_zip
+from models.thumbnails import get_thumbnail, thumbnail_data_uri, create_thumbnails
+from models.grade_sheet import load_grade_sheet, save_grade_sheet
+from models.messaging import send_messages, send_broadcast, get_inbox, get_sent, mark_read, count_unread
+from models.notifications import queue_event, deliver_notifications, get_notifications, mark_notifications_read
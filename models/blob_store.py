@@ -0,0 +1,264 @@
+import hashlib
+import os
+import re
+import shutil
+import time
+import uuid
+import zipfile
+from database.schema import get_db_connection
+
+# Root of the content-addressed store, relative to the app directory like the other static paths
+BLOB_ROOT = os.path.join("static", "blobs")
+
+# Bytes read and written at a time while storing an upload
+CHUNK_SIZE = 1024 * 1024
+
+# Unreferenced blobs younger than this are kept: an upload is stored before the row pointing at it
+GC_MIN_AGE_SECONDS = 3600
+
+# Tables and columns holding blob paths (their triggers maintain blobs.refcount)
+BLOB_REFERENCES = (("student_assignments", "submission_file"), ("students", "photo"), ("teachers", "photo"))
+
+EXTENSION_PATTERN = re.compile(r"^[a-z0-9]{1,10}$")
+
+# Formats that are already compressed are stored in ZIP archives without deflating again
+STORED_EXTENSIONS = {"pdf", "zip", "jpg", "jpeg", "png", "webp", "docx", "pptx", "xlsx"}
+
+# Submission ZIPs are cached here and rebuilt only when the submissions change
+ARCHIVE_DIR = os.path.join(BLOB_ROOT, "archives")
+
+def blob_path(digest, extension=""):
+    """Path of a blob: static/blobs/<2 hex>/<2 hex>/<sha256>[.ext]"""
+    filename = f"{digest}.{extension}" if extension else digest
+    return os.path.join(BLOB_ROOT, digest[:2], digest[2:4], filename)
+
+def _extension(filename):
+    """Lower-case extension of an upload's name, kept so previews and MIME checks still work"""
+    extension = os.path.splitext(filename or "")[1].lstrip(".").lower()
+    return extension if EXTENSION_PATTERN.match(extension) else ""
+
+def store_file(fileobj, filename=None):
+    """Stream a file into the store and register it
+
+    The data is copied in CHUNK_SIZE pieces to a temporary file while being
+    hashed, then renamed to its SHA-256 name. Identical content uploaded
+    again (with the same extension) reuses the existing file.
+
+    Args:
+        fileobj: Readable binary file object (e.g. a Streamlit UploadedFile)
+        filename: Original name, used for the extension (defaults to fileobj.name)
+
+    Returns:
+        str: Path to store in submission_file/photo columns
+    """
+    extension = _extension(filename or getattr(fileobj, "name", ""))
+    temp_dir = os.path.join(BLOB_ROOT, "tmp")
+    os.makedirs(temp_dir, exist_ok=True)
+    temp_path = os.path.join(temp_dir, uuid.uuid4().hex)
+
+    digest = hashlib.sha256()
+    size = 0
+    if hasattr(fileobj, "seek"):
+        fileobj.seek(0)
+    try:
+        with open(temp_path, "wb") as out:
+            while True:
+                chunk = fileobj.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+
+        path = blob_path(digest.hexdigest(), extension)
+        if os.path.exists(path):
+            os.remove(temp_path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(temp_path, path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    conn = get_db_connection()
+    try:
+        conn.execute(
+            "INSERT OR IGNORE INTO blobs (path, sha256, size) VALUES (?, ?, ?)",
+            (path, digest.hexdigest(), size)
+        )
+        # Re-uploading an orphan about to be collected makes it young again
+        conn.execute("UPDATE blobs SET created_at = CURRENT_TIMESTAMP WHERE path = ? AND refcount <= 0", (path,))
+        conn.commit()
+    finally:
+        conn.close()
+    return path
+
+def is_blob(path):
+    """Whether a stored path points into the blob store"""
+    return bool(path) and os.path.normpath(path).startswith(os.path.normpath(BLOB_ROOT) + os.sep)
+
+def discard_file(path):
+    """Drop a file a deleted or replaced row pointed at
+
+    Blobs may be shared, so they are left to collect_garbage(); files saved
+    before the blob store existed are removed directly.
+    """
+    if path and not is_blob(path) and os.path.exists(path):
+        from models.thumbnails import discard_thumbnails
+        discard_thumbnails(path)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def submission_download_name(display_id, title, path):
+    """Readable file name for a submission (blob names are hashes)"""
+    stem = re.sub(r"[^A-Za-z0-9_-]+", "_", f"{display_id}_{title}").strip("_")
+    extension = _extension(path)
+    return f"{stem}.{extension}" if extension else stem
+
+def build_submissions_zip(assignment_id):
+    """Bundle every submitted file of an assignment into one ZIP on disk
+
+    Files are copied into the archive in CHUNK_SIZE pieces, so memory use
+    does not grow with the number of submissions. The archive name is a
+    hash of the submitted files, so asking again without new submissions
+    reuses the cached archive.
+
+    Args:
+        assignment_id: ID of the assignment
+
+    Returns:
+        dict: {"assignment_id", "path", "files", "bytes"}; path is None if nothing was submitted
+    """
+    conn = get_db_connection()
+    try:
+        rows = conn.execute("""
+            SELECT s.student_id AS display_id, a.title, sa.submission_file
+            FROM student_assignments sa
+            JOIN students s ON s.id = sa.student_id
+            JOIN assignments a ON a.id = sa.assignment_id
+            WHERE sa.assignment_id = ? AND sa.submission_file IS NOT NULL
+            ORDER BY s.student_id
+        """, (assignment_id,)).fetchall()
+    finally:
+        conn.close()
+
+    files = []
+    key = hashlib.sha256()
+    for row in rows:
+        path = row['submission_file']
+        if not os.path.exists(path):
+            continue
+        stat = os.stat(path)
+        files.append((path, submission_download_name(row['display_id'], row['title'], path)))
+        key.update(f"{path}\t{stat.st_size}\t{stat.st_mtime_ns}\n".encode())
+    if not files:
+        return {"assignment_id": assignment_id, "path": None, "files": 0, "bytes": 0}
+
+    prefix = f"assignment_{assignment_id}_"
+    archive = os.path.join(ARCHIVE_DIR, f"{prefix}{key.hexdigest()[:16]}.zip")
+    if not os.path.exists(archive):
+        os.makedirs(ARCHIVE_DIR, exist_ok=True)
+        temp_path = f"{archive}.{uuid.uuid4().hex}.tmp"
+        try:
+            with zipfile.ZipFile(temp_path, "w") as bundle:
+                used = set()
+                for path, name in files:
+                    # Two submissions from one student (resubmissions) get numbered names
+                    stem, dot, extension = name.partition(".")
+                    arcname, copy = name, 1
+                    while arcname in used:
+                        copy += 1
+                        arcname = f"{stem}_{copy}{dot}{extension}"
+                    used.add(arcname)
+
+                    info = zipfile.ZipInfo.from_file(path, arcname)
+                    info.compress_type = (zipfile.ZIP_STORED if _extension(path) in STORED_EXTENSIONS
+                                          else zipfile.ZIP_DEFLATED)
+                    with open(path, "rb") as src, bundle.open(info, "w") as dst:
+                        shutil.copyfileobj(src, dst, CHUNK_SIZE)
+            os.replace(temp_path, archive)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        # Older archives of this assignment are superseded
+        for entry in os.scandir(ARCHIVE_DIR):
+            if entry.name.startswith(prefix) and entry.path != archive:
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+
+    return {"assignment_id": assignment_id, "path": archive, "files": len(files),
+            "bytes": os.path.getsize(archive)}
+
+def rebuild_refcounts():
+    """Recount blob references from the referencing columns (repairs drift after manual edits)
+
+    Returns:
+        int: Number of blobs whose count changed
+    """
+    union = " UNION ALL ".join(
+        f"SELECT {column} AS path FROM {table} WHERE {column} IS NOT NULL" for table, column in BLOB_REFERENCES
+    )
+    conn = get_db_connection()
+    try:
+        counts = {row['path']: row['refs'] for row in conn.execute(
+            f"SELECT path, COUNT(*) AS refs FROM ({union}) GROUP BY path"
+        ).fetchall()}
+        changed = [
+            (counts.get(row['path'], 0), row['path'])
+            for row in conn.execute("SELECT path, refcount FROM blobs").fetchall()
+            if row['refcount'] != counts.get(row['path'], 0)
+        ]
+        conn.executemany("UPDATE blobs SET refcount = ? WHERE path = ?", changed)
+        conn.commit()
+        return len(changed)
+    finally:
+        conn.close()
+
+def collect_garbage(min_age_seconds=GC_MIN_AGE_SECONDS):
+    """Delete unreferenced blobs older than min_age_seconds, plus stale temporary files and archives
+
+    Returns:
+        dict: {"blobs": files removed, "bytes": space freed}
+    """
+    conn = get_db_connection()
+    try:
+        orphans = conn.execute("""
+            SELECT path, size FROM blobs
+            WHERE refcount <= 0 AND created_at <= datetime('now', ?)
+        """, (f"-{int(min_age_seconds)} seconds",)).fetchall()
+        from models.thumbnails import discard_thumbnails
+        removed = []
+        freed = 0
+        for row in orphans:
+            try:
+                if os.path.exists(row['path']):
+                    discard_thumbnails(row['path'])
+                    os.remove(row['path'])
+                removed.append((row['path'],))
+                freed += row['size']
+            except OSError:
+                continue
+        conn.executemany("DELETE FROM blobs WHERE path = ? AND refcount <= 0", removed)
+        conn.commit()
+    finally:
+        conn.close()
+
+    # Temporary files left behind by interrupted uploads, and cached submission ZIPs
+    cutoff = time.time() - min_age_seconds
+    for directory in (os.path.join(BLOB_ROOT, "tmp"), ARCHIVE_DIR):
+        if not os.path.isdir(directory):
+            continue
+        for entry in os.scandir(directory):
+            try:
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except OSError:
+                pass
+
+    return {"blobs": len(removed), "bytes": freed}
@@ -1,108 +1,407 @@
 import re
+import copy
+import json
+import time
+from collections import Counter
+from datetime import datetime
+from functools import lru_cache
 from database.schema import get_db_connection
+from models.enrollment import plan_enrollment_changes, apply_enrollment_changes
+from models.seats import begin_immediate
 
-def parse_command(command_text):
-    """Parse natural language command text into actionable operations
-    
-    Args:
-        command_text: The command text to parse
-        
-    Returns:
-        dict: Parsed command with operation type and parameters
+# Token grammar for the command language. Alternatives are tried in order, so
+# semesters and course codes win over plain numbers and words.
+TOKEN_PATTERN = re.compile(r"""
+    (?P<SEMESTER>\b(?:spring|summer|fall|winter)\s+\d{4}\b)
+  | (?P<COURSE>\b(?!(?:to|in|of|for|and|from|with|into|id|ids|all|gpa|t)\b)[a-z]{2,4}\s*\d{3,4}(?:\s*-\s*\d{3}\b)?(?![\d.]))
+  | (?P<DECIMAL>\b\d+\.\d+\b)
+  | (?P<RANGE>\bt?\d+\s*-\s*t?\d+\b)
+  | (?P<NUMBER>\bt?\d+\b)
+  | (?P<WORD>[a-z]+)
+  | (?P<COMMA>,)
+""", re.VERBOSE)
+
+CREATE_COURSE_PATTERN = re.compile(
+    r"course\s+(?P<code>[a-z]{2,4}\s*\d{3,4}(?:\s*-\s*\d{3})?)\s*(?:[-:]\s*)?(?P<title>.*?)"
+    r"(?:\s+with\s+(?P<credits>\d+(?:\.\d+)?)\s+credits?(?:\s+hours?)?)?"
+    r"(?:\s+(?:and|with)\s+(?:capacity\s+|max\s+)?(?:of\s+)?(?P<capacity>\d+)(?:\s+(?:students|seats))?)?\s*\.?$",
+    re.IGNORECASE
+)
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+VERBS = {
+    "enroll": "enroll", "register": "enroll", "assign": "assign",
+    "show": "show", "list": "show", "find": "show", "display": "show",
+    "move": "move", "transfer": "move",
+    "create": "create"
+}
+
+ENTITY_WORDS = {
+    "student": "students", "students": "students",
+    "teacher": "teachers", "teachers": "teachers",
+    "course": "courses", "courses": "courses",
+    "department": "departments", "departments": "departments", "dept": "departments"
+}
+
+# Words that end a department name ("department computer science to CSE303")
+DEPARTMENT_STOP_WORDS = {"to", "in", "into", "for", "from", "with", "and", "or", "gpa", "all", "the",
+                         "students", "student", "teachers", "teacher", "courses", "course"}
+
+# Widest id range a command may name ("students 1-10000")
+MAX_ID_RANGE = 10000
+
+# Operations that only read; they take no write lock and are not journaled
+READ_ONLY_OPERATIONS = {"show_students", "show_courses"}
+
+GPA_COMPARATORS = {"below": "<", "under": "<", "less": "<", "above": ">", "over": ">", "greater": ">"}
+
+@lru_cache(maxsize=12)
+def _default_semester(year, month):
+    """Name the semester a month falls in, e.g. (2024, 9) -> Fall 2024"""
+    if month <= 4:
+        term = "Spring"
+    elif month <= 7:
+        term = "Summer"
+    else:
+        term = "Fall"
+    return f"{term} {year}"
+
+def _normalize_code(code):
+    """Normalize a course code for comparison (e.g. "cse 0613-213" -> "CSE0613-213")"""
+    return WHITESPACE_PATTERN.sub("", code.upper())
+
+def _expand_ids(token_kind, value):
+    """Expand a NUMBER or RANGE token into a list of integer ids
+
+    Raises:
+        ValueError: If a range spans more than MAX_ID_RANGE ids
     """
-    command_text = command_text.strip().lower()
-    
-    # Initialize result
+    value = value.replace("t", "")
+    if token_kind == "RANGE":
+        low, high = (int(part) for part in value.split("-"))
+        if low > high:
+            low, high = high, low
+        if high - low + 1 > MAX_ID_RANGE:
+            raise ValueError(f"Range {low}-{high} is too large; name at most {MAX_ID_RANGE} ids per range")
+        return list(range(low, high + 1))
+    return [int(value)]
+
+def _compact_ids(ids):
+    """Describe an id list as ranges, e.g. [1, 2, 3, 7] -> "1-3, 7" """
+    parts = []
+    ids = sorted(set(ids))
+    start = prev = None
+    for value in ids + [None]:
+        if start is not None and value == prev + 1:
+            prev = value
+            continue
+        if start is not None:
+            parts.append(str(start) if start == prev else f"{start}-{prev}")
+        start = prev = value
+    return ", ".join(parts)
+
+def _tokenize(command_text):
+    """Split lowercased command text into (kind, value) tokens"""
+    return [(match.lastgroup, match.group(match.lastgroup)) for match in TOKEN_PATTERN.finditer(command_text)]
+
+@lru_cache(maxsize=256)
+def _parse_normalized(command_text, original_text, default_semester):
+    """Parse a normalized command; cached, so callers must not mutate the result"""
     result = {
         "valid": False,
         "operation": None,
         "params": {},
-        "message": "Invalid command"
+        "message": "Invalid command",
+        "command": original_text
     }
-    
-    # Extract student IDs (handles both "student 101, 102" and just "101, 102")
-    student_ids = re.findall(r'student\s+(\d+(?:\s*,\s*\d+)*)', command_text)
-    if not student_ids:
-        student_ids = re.findall(r'(\d+(?:\s*,\s*\d+)*)\s+to\s+', command_text)
-    
+    params = result["params"]
+    tokens = _tokenize(command_text)
+
+    verb = next((VERBS[value] for kind, value in tokens if kind == "WORD" and value in VERBS), None)
+
+    student_ids, teacher_ids, course_codes, source_codes, departments = [], [], [], [], []
+    context = None
+    after_from = False
+    gpa_filter = None
+    gpa_value_index = None
+    all_students = False
+    range_error = None
+
+    index = 0
+    while index < len(tokens):
+        kind, value = tokens[index]
+
+        if kind == "WORD":
+            if value in ENTITY_WORDS:
+                context = ENTITY_WORDS[value]
+                if context == "departments":
+                    # Collect department names up to the next keyword
+                    name_words = []
+                    while index + 1 < len(tokens) and tokens[index + 1][0] in ("WORD", "COMMA"):
+                        next_kind, next_value = tokens[index + 1]
+                        if next_kind == "COMMA" or next_value in ("and", "or"):
+                            if name_words:
+                                departments.append(" ".join(name_words))
+                                name_words = []
+                            index += 1
+                            continue
+                        if next_value in DEPARTMENT_STOP_WORDS:
+                            break
+                        name_words.append(next_value)
+                        index += 1
+                    if name_words:
+                        departments.append(" ".join(name_words))
+                    context = None
+            elif value == "all":
+                all_students = True
+            elif value == "from":
+                after_from = True
+            elif value in ("to", "into"):
+                after_from = False
+            elif value == "gpa":
+                # "gpa below 2.5", "gpa less than 2.5"
+                comparator = None
+                for offset, (look_kind, look_value) in enumerate(tokens[index + 1:index + 4], start=index + 1):
+                    if look_kind == "WORD" and look_value in GPA_COMPARATORS:
+                        comparator = GPA_COMPARATORS[look_value]
+                    elif look_kind in ("DECIMAL", "NUMBER") and comparator:
+                        gpa_filter = {"op": comparator, "value": float(look_value)}
+                        gpa_value_index = offset
+                        break
+        elif kind in ("NUMBER", "RANGE"):
+            try:
+                if context == "teachers" or (context is None and value.startswith("t")):
+                    teacher_ids.extend(_expand_ids(kind, value))
+                elif context in ("students", None) and index != gpa_value_index:
+                    student_ids.extend(_expand_ids(kind, value))
+            except ValueError as e:
+                range_error = str(e)
+        elif kind == "COURSE":
+            code = _normalize_code(value)
+            (source_codes if after_from else course_codes).append(code)
+        elif kind == "SEMESTER":
+            term, year = value.split()
+            params["semester"] = f"{term.capitalize()} {year}"
+
+        index += 1
+
     if student_ids:
-        # Split comma-separated IDs and convert to integers
-        student_id_list = [int(id.strip()) for id in re.split(r'\s*,\s*', student_ids[0])]
-        result["params"]["student_ids"] = student_id_list
-    
-    # Extract teacher IDs
-    teacher_ids = re.findall(r'teacher\s+(\d+(?:\s*,\s*\d+)*)', command_text)
-    if not teacher_ids:
-        teacher_ids = re.findall(r'teacher\s+t(\d+(?:\s*,\s*\d+)*)', command_text)
-    
+        params["student_ids"] = list(dict.fromkeys(student_ids))
     if teacher_ids:
-        # Split comma-separated IDs and convert to integers
-        teacher_id_list = [int(id.strip()) for id in re.split(r'\s*,\s*', teacher_ids[0])]
-        result["params"]["teacher_ids"] = teacher_id_list
-    
-    # Extract course codes (handles both "CSE303, CSE304" and "cse303, cse304")
-    course_pattern = r'([a-zA-Z]{2,4}\s*\d{3}(?:\s*,\s*[a-zA-Z]{2,4}\s*\d{3})*)'
-    course_codes = re.findall(course_pattern, command_text)
-    
+        params["teacher_ids"] = list(dict.fromkeys(teacher_ids))
     if course_codes:
-        # Split comma-separated codes and normalize format
-        course_code_list = []
-        for code_group in course_codes:
-            codes = re.split(r'\s*,\s*', code_group)
-            for code in codes:
-                # Normalize format (e.g., "cse 303" to "CSE303")
-                normalized = re.sub(r'\s+', '', code.upper())
-                course_code_list.append(normalized)
-        
-        result["params"]["course_codes"] = course_code_list
-    
+        params["course_codes"] = list(dict.fromkeys(course_codes))
+    if source_codes:
+        params["source_course_codes"] = list(dict.fromkeys(source_codes))
+    if departments:
+        params["departments"] = departments
+    if gpa_filter:
+        params["gpa_filter"] = gpa_filter
+    params.setdefault("semester", default_semester)
+
+    student_selector = params.get("student_ids") or params.get("departments")
+
     # Detect operation type
-    if "assign" in command_text or "enroll" in command_text:
-        if "student" in command_text or any(str(i) in command_text for i in result.get("params", {}).get("student_ids", [])):
-            if "course" in command_text or any(code in command_text.upper() for code in result.get("params", {}).get("course_codes", [])):
-                result["operation"] = "enroll_students"
-                result["valid"] = bool(result.get("params", {}).get("student_ids") and result.get("params", {}).get("course_codes"))
-                result["message"] = f"Enroll students {result.get('params', {}).get('student_ids', [])} to courses {result.get('params', {}).get('course_codes', [])}"
-        
-        if "teacher" in command_text or any(str(i) in command_text for i in result.get("params", {}).get("teacher_ids", [])):
-            if "course" in command_text or any(code in command_text.upper() for code in result.get("params", {}).get("course_codes", [])):
-                result["operation"] = "assign_teachers"
-                result["valid"] = bool(result.get("params", {}).get("teacher_ids") and result.get("params", {}).get("course_codes"))
-                result["message"] = f"Assign teachers {result.get('params', {}).get('teacher_ids', [])} to courses {result.get('params', {}).get('course_codes', [])}"
-    
-    # Extract semester information
-    semester_pattern = r'(spring|summer|fall|winter)\s+(\d{4})'
-    semester_match = re.search(semester_pattern, command_text, re.IGNORECASE)
+    if verb == "create" and "courses" in (ENTITY_WORDS.get(v) for k, v in tokens if k == "WORD"):
+        match = CREATE_COURSE_PATTERN.search(original_text)
+        if match:
+            params["course"] = {
+                "code": WHITESPACE_PATTERN.sub(" ", match.group("code").upper()).strip(),
+                "title": match.group("title").strip(" -:"),
+                "credit_hour": float(match.group("credits")) if match.group("credits") else None,
+                "max_students": int(match.group("capacity")) if match.group("capacity") else None
+            }
+            params.pop("student_ids", None)
+            params.pop("course_codes", None)
+            result["operation"] = "create_course"
+            result["valid"] = bool(params["course"]["title"] and params["course"]["credit_hour"])
+            result["message"] = f"Create course {params['course']['code']} - {params['course']['title']} with {params['course']['credit_hour']} credit hours"
+    elif verb == "move":
+        result["operation"] = "move_students"
+        result["valid"] = len(params.get("source_course_codes", [])) == 1 and len(params.get("course_codes", [])) == 1
+        who = _compact_ids(params["student_ids"]) if params.get("student_ids") else "all students"
+        result["message"] = f"Move {who} from {params.get('source_course_codes', [])} to {params.get('course_codes', [])}"
+    elif verb == "show":
+        shown = "courses" if any(ENTITY_WORDS.get(v) == "courses" for k, v in tokens[:3] if k == "WORD") else "students"
+        result["operation"] = f"show_{shown}"
+        result["valid"] = True
+        result["message"] = f"Show {shown}" + (f" in {params['course_codes']}" if params.get("course_codes") else "")
+    elif verb in ("enroll", "assign"):
+        if params.get("teacher_ids") or (verb == "assign" and "teachers" in (ENTITY_WORDS.get(v) for k, v in tokens if k == "WORD")):
+            result["operation"] = "assign_teachers"
+            result["valid"] = bool(params.get("teacher_ids") and params.get("course_codes"))
+            result["message"] = f"Assign teachers {params.get('teacher_ids', [])} to courses {params.get('course_codes', [])}"
+        else:
+            result["operation"] = "enroll_students"
+            result["valid"] = bool(student_selector and params.get("course_codes"))
+            who = _compact_ids(params["student_ids"]) if params.get("student_ids") else f"in departments {params.get('departments', [])}"
+            result["message"] = f"Enroll students {who} to courses {params.get('course_codes', [])}"
+
+    if all_students and result["operation"] == "enroll_students" and not student_selector:
+        result["message"] = "Enrolling all students needs a department selector, e.g. 'enroll all students in department cse to CSE303'"
+    if range_error:
+        result["valid"] = False
+        result["message"] = range_error
+
+    # Structured plan: a compact, serializable description of what execution will touch
+    result["plan"] = {
+        "operation": result["operation"],
+        "semester": params["semester"],
+        "students": _compact_ids(params.get("student_ids", [])) or None,
+        "departments": params.get("departments"),
+        "teachers": _compact_ids(params.get("teacher_ids", [])) or None,
+        "courses": params.get("course_codes"),
+        "source_courses": params.get("source_course_codes"),
+        "pairs": len(params.get("student_ids", params.get("teacher_ids", []))) * len(params.get("course_codes", []))
+    }
+
+    return result
+
+def parse_command(command_text):
+    """Parse natural language command text into actionable operations
     
-    if semester_match:
-        semester_term = semester_match.group(1).capitalize()
-        semester_year = semester_match.group(2)
-        result["params"]["semester"] = f"{semester_term} {semester_year}"
-    else:
-        # Default to current semester
-        from datetime import datetime
-        current_month = datetime.now().month
-        current_year = datetime.now().year
-        
-        if 1 <= current_month <= 4:
-            term = "Spring"
-        elif 5 <= current_month <= 7:
-            term = "Summer"
-        elif 8 <= current_month <= 12:
-            term = "Fall"
-            
-        result["params"]["semester"] = f"{term} {current_year}"
+    Supported commands include ID lists and ranges ("students 101-250, 300"),
+    department selectors ("all students in department computer science"),
+    "show", "move ... from X to Y" and "create course" operations. Results are
+    cached per command text, so re-parsing on Streamlit reruns is free.
     
-    return result
+    Args:
+        command_text: The command text to parse
+        
+    Returns:
+        dict: Parsed command with operation type, parameters and a compact plan
+    """
+    original_text = WHITESPACE_PATTERN.sub(" ", command_text.strip())
+    now = datetime.now()
+    parsed = _parse_normalized(original_text.lower(), original_text, _default_semester(now.year, now.month))
+    return copy.deepcopy(parsed)
+
+def _fetch_in(conn, query, values, params=(), chunk_size=900):
+    """Run a query with an IN (...) clause over values, chunked below SQLite's variable limit
+
+    The query must contain a single "{placeholders}" marker for the IN list;
+    params are bound before the IN values.
+    """
+    rows = []
+    values = list(values)
+    for start in range(0, len(values), chunk_size):
+        chunk = values[start:start + chunk_size]
+        placeholders = ", ".join("?" for _ in chunk)
+        rows.extend(conn.execute(query.format(placeholders=placeholders), list(params) + chunk).fetchall())
+    return rows
+
+def _resolve_courses(conn, course_codes, result):
+    """Resolve normalized course codes to ids in one query, reporting unknown codes"""
+    courses = {
+        row['norm_code']: row['id']
+        for row in _fetch_in(
+            conn,
+            "SELECT id, REPLACE(UPPER(code), ' ', '') as norm_code FROM courses WHERE REPLACE(UPPER(code), ' ', '') IN ({placeholders})",
+            course_codes
+        )
+    }
+    for course_code in course_codes:
+        if course_code not in courses:
+            result["details"].append(f"Course {course_code} not found")
+    return courses
+
+def _resolve_students(conn, params, result):
+    """Resolve student ids and department selectors to {id: name}"""
+    student_ids = list(dict.fromkeys(params.get("student_ids", [])))
+    students = {
+        row['id']: row['name']
+        for row in _fetch_in(conn, "SELECT id, name FROM students WHERE id IN ({placeholders})", student_ids)
+    }
+    for student_id in student_ids:
+        if student_id not in students:
+            result["details"].append(f"Student ID {student_id} not found")
+
+    for department in params.get("departments", []):
+        rows = conn.execute(
+            "SELECT id, name FROM students WHERE LOWER(dept) = ? OR LOWER(dept) LIKE ?",
+            (department, f"%{department}%")
+        ).fetchall()
+        if not rows:
+            result["details"].append(f"No students found in department {department}")
+        students.update((row['id'], row['name']) for row in rows)
+
+    return students
+
+# Grade point for a grades row, mirroring calculate_gpa() in models/gpa_predictor.py
+GRADE_POINT_SQL = """
+    CASE
+        WHEN (g.mid + g.assignment + g.final) >= 80 THEN 4.00
+        WHEN (g.mid + g.assignment + g.final) >= 75 THEN 3.75
+        WHEN (g.mid + g.assignment + g.final) >= 70 THEN 3.50
+        WHEN (g.mid + g.assignment + g.final) >= 65 THEN 3.25
+        WHEN (g.mid + g.assignment + g.final) >= 60 THEN 3.00
+        WHEN (g.mid + g.assignment + g.final) >= 55 THEN 2.75
+        WHEN (g.mid + g.assignment + g.final) >= 50 THEN 2.50
+        WHEN (g.mid + g.assignment + g.final) >= 45 THEN 2.25
+        WHEN (g.mid + g.assignment + g.final) >= 40 THEN 2.00
+        ELSE 0.00
+    END
+"""
+
+def _max_id(conn, table):
+    """Highest row id in a table, used as a watermark to find the rows a command inserts"""
+    return conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}").fetchone()[0]
+
+def _rows_since(conn, table, owner_column, watermark):
+    """Unique keys [owner_id, course_id, semester] of the rows inserted after a watermark
+
+    Journal entries store natural keys rather than row ids, so undo still finds
+    rows that were deleted and re-created by a later command or undo.
+    """
+    return [
+        [row[0], row[1], row[2]]
+        for row in conn.execute(
+            f"SELECT {owner_column}, course_id, semester FROM {table} WHERE id > ?", (watermark,)
+        ).fetchall()
+    ]
+
+def _record_journal(conn, parsed_command, result, affected, status, executed_by=None):
+    """Write a command_journal entry without committing and return its id"""
+    cursor = conn.execute(
+        """INSERT INTO command_journal
+           (command_text, operation, plan_json, affected_json, status, message, duration_ms, executed_by)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+        (
+            parsed_command.get("command", ""),
+            parsed_command.get("operation"),
+            json.dumps(parsed_command.get("plan", {})),
+            json.dumps(affected),
+            status,
+            result.get("message"),
+            result.get("duration_ms"),
+            executed_by
+        )
+    )
+    return cursor.lastrowid
 
-def execute_command(parsed_command):
+def execute_command(parsed_command, dry_run=False, executed_by=None):
     """Execute a parsed command
     
+    Students/teachers and courses are resolved with one IN (...) query each,
+    the missing pairs are computed in memory and written with a single
+    executemany, so bulk commands run as one short transaction.
+    
+    Every execution is recorded in command_journal with its plan, the keys of
+    the rows it inserted (and the rows it deleted), timing and outcome, so it
+    can be reversed later with undo_command(). The entry commits together with
+    the changes. With dry_run=True nothing is written, not even a journal
+    entry: the result carries the exact delta and an estimated cost instead.
+    Read-only operations (READ_ONLY_OPERATIONS) are never journaled either.
+    
     Args:
         parsed_command: The parsed command dict
+        dry_run: If True, only compute the changes the command would make
+        executed_by: Optional username recorded in the journal
         
     Returns:
-        dict: Result of the operation
+        dict: Result of the operation, including "delta", "cost" and "journal_id"
+              (None for dry runs and read-only operations)
     """
     if not parsed_command.get("valid", False):
         return {
@@ -113,97 +412,390 @@ def execute_command(parsed_command):
     operation = parsed_command.get("operation")
     params = parsed_command.get("params", {})
     
+    started = time.perf_counter()
     conn = get_db_connection()
     result = {
         "success": False,
         "message": "Operation not implemented",
-        "details": []
+        "details": [],
+        "dry_run": dry_run,
+        "delta": {},
+        "cost": {},
+        "journal_id": None
     }
+    affected = {}
+    journaled = not dry_run and operation not in READ_ONLY_OPERATIONS
     
     try:
+        if journaled:
+            begin_immediate(conn)
+        
         if operation == "enroll_students":
-            student_ids = params.get("student_ids", [])
-            course_codes = params.get("course_codes", [])
+            course_codes = list(dict.fromkeys(params.get("course_codes", [])))
             semester = params.get("semester")
             
-            # Verify students exist
-            for student_id in student_ids:
-                student = conn.execute("SELECT id, name FROM students WHERE id = ?", (student_id,)).fetchone()
-                if not student:
-                    result["details"].append(f"Student ID {student_id} not found")
-                    continue
-                
-                # Get course IDs from codes
-                for course_code in course_codes:
-                    course = conn.execute("SELECT id, title FROM courses WHERE code = ?", (course_code,)).fetchone()
-                    if not course:
-                        result["details"].append(f"Course {course_code} not found")
-                        continue
-                    
-                    # Check if enrollment already exists
-                    existing = conn.execute(
-                        "SELECT id FROM enrollments WHERE student_id = ? AND course_id = ? AND semester = ?", 
-                        (student_id, course['id'], semester)
-                    ).fetchone()
-                    
-                    if existing:
-                        result["details"].append(f"Student {student['name']} already enrolled in {course_code}")
-                        continue
-                    
-                    # Enroll student
-                    conn.execute(
-                        "INSERT INTO enrollments (student_id, course_id, semester) VALUES (?, ?, ?)",
-                        (student_id, course['id'], semester)
-                    )
-                    result["details"].append(f"Enrolled student {student['name']} in {course_code}")
+            # Verify students exist (ids, ranges and department selectors)
+            students = _resolve_students(conn, params, result)
+            
+            courses = _resolve_courses(conn, course_codes, result)
+            
+            # Diff against existing enrollments
+            plan = plan_enrollment_changes(conn, list(students), list(courses.values()), semester)
+            result["delta"] = {
+                "enrollments_insert": len(plan["insert"]),
+                "already_enrolled": len(plan["unchanged"]),
+                "over_capacity": len(plan["over_capacity"])
+            }
+            
+            enrolled_counts = Counter(course_id for _, course_id in plan["insert"])
+            existing_counts = Counter(course_id for _, course_id in plan["unchanged"])
+            full_counts = Counter(course_id for _, course_id in plan["over_capacity"])
+            verb = "Would enroll" if dry_run else "Enrolled"
+            for course_code, course_id in courses.items():
+                enrolled = enrolled_counts[course_id]
+                existing = existing_counts[course_id]
+                full = full_counts[course_id]
+                if enrolled:
+                    result["details"].append(f"{verb} {enrolled} students in {course_code}")
+                if existing:
+                    result["details"].append(f"{existing} students already enrolled in {course_code}")
+                if full:
+                    result["details"].append(f"{full} students not enrolled in {course_code} (course is full)")
+            
+            if dry_run:
+                new_enrollments = len(plan["insert"])
+            else:
+                watermark = _max_id(conn, "enrollments")
+                summary = apply_enrollment_changes(conn, plan, commit=False)
+                new_enrollments = summary["enrolled"]
+                affected["enrollments_inserted"] = _rows_since(conn, "enrollments", "student_id", watermark)
             
             result["success"] = True
-            result["message"] = f"Enrollment processed for {len(student_ids)} students in {len(course_codes)} courses"
+            result["message"] = f"Enrollment processed for {len(students)} students in {len(course_codes)} courses ({new_enrollments} new enrollments)"
         
         elif operation == "assign_teachers":
-            teacher_ids = params.get("teacher_ids", [])
-            course_codes = params.get("course_codes", [])
+            teacher_ids = list(dict.fromkeys(params.get("teacher_ids", [])))
+            course_codes = list(dict.fromkeys(params.get("course_codes", [])))
             semester = params.get("semester")
             
             # Verify teachers exist
+            teachers = {
+                row['id']: row['name']
+                for row in _fetch_in(conn, "SELECT id, name FROM teachers WHERE id IN ({placeholders})", teacher_ids)
+            }
             for teacher_id in teacher_ids:
-                teacher = conn.execute("SELECT id, name FROM teachers WHERE id = ?", (teacher_id,)).fetchone()
-                if not teacher:
+                if teacher_id not in teachers:
                     result["details"].append(f"Teacher ID {teacher_id} not found")
-                    continue
-                
-                # Get course IDs from codes
-                for course_code in course_codes:
-                    course = conn.execute("SELECT id, title FROM courses WHERE code = ?", (course_code,)).fetchone()
-                    if not course:
-                        result["details"].append(f"Course {course_code} not found")
-                        continue
-                    
-                    # Check if teaching assignment already exists
-                    existing = conn.execute(
-                        "SELECT id FROM teaching WHERE teacher_id = ? AND course_id = ? AND semester = ?", 
-                        (teacher_id, course['id'], semester)
-                    ).fetchone()
-                    
-                    if existing:
-                        result["details"].append(f"Teacher {teacher['name']} already assigned to {course_code}")
-                        continue
-                    
-                    # Assign teacher
-                    conn.execute(
-                        "INSERT INTO teaching (teacher_id, course_id, semester) VALUES (?, ?, ?)",
-                        (teacher_id, course['id'], semester)
-                    )
-                    result["details"].append(f"Assigned teacher {teacher['name']} to {course_code}")
+            
+            courses = _resolve_courses(conn, course_codes, result)
+            
+            # Check which teaching assignments already exist
+            existing = {
+                (row['teacher_id'], row['course_id'])
+                for row in _fetch_in(
+                    conn,
+                    "SELECT teacher_id, course_id FROM teaching WHERE semester = ? AND course_id IN ({placeholders})",
+                    courses.values(),
+                    (semester,)
+                )
+            }
+            
+            new_assignments = []
+            verb = "Would assign" if dry_run else "Assigned"
+            for teacher_id, teacher_name in teachers.items():
+                for course_code, course_id in courses.items():
+                    if (teacher_id, course_id) in existing:
+                        result["details"].append(f"Teacher {teacher_name} already assigned to {course_code}")
+                    else:
+                        new_assignments.append((teacher_id, course_id, semester))
+                        result["details"].append(f"{verb} teacher {teacher_name} to {course_code}")
+            result["delta"] = {"teaching_insert": len(new_assignments)}
+            
+            # Assign teachers
+            if not dry_run:
+                watermark = _max_id(conn, "teaching")
+                conn.executemany(
+                    "INSERT OR IGNORE INTO teaching (teacher_id, course_id, semester) VALUES (?, ?, ?)",
+                    new_assignments
+                )
+                affected["teaching_inserted"] = _rows_since(conn, "teaching", "teacher_id", watermark)
             
             result["success"] = True
             result["message"] = f"Teacher assignment processed for {len(teacher_ids)} teachers to {len(course_codes)} courses"
+        
+        elif operation == "show_students":
+            course_codes = params.get("course_codes", [])
+            semester = params.get("semester")
             
-        conn.commit()
+            query = f"""
+                SELECT s.id, s.student_id, s.name, s.dept, s.semester,
+                       ROUND(SUM(({GRADE_POINT_SQL}) * c.credit_hour) / SUM(c.credit_hour), 2) as gpa
+                FROM students s
+                LEFT JOIN grades g ON g.student_id = s.id
+                LEFT JOIN courses c ON g.course_id = c.id
+            """
+            conditions, values = [], []
+            if course_codes:
+                courses = _resolve_courses(conn, course_codes, result)
+                placeholders = ", ".join("?" for _ in courses)
+                conditions.append(f"s.id IN (SELECT student_id FROM enrollments WHERE semester = ? AND course_id IN ({placeholders}))")
+                values.extend([semester] + list(courses.values()))
+            if params.get("student_ids"):
+                placeholders = ", ".join("?" for _ in params["student_ids"])
+                conditions.append(f"s.id IN ({placeholders})")
+                values.extend(params["student_ids"])
+            if params.get("departments"):
+                conditions.append("(" + " OR ".join("LOWER(s.dept) LIKE ?" for _ in params["departments"]) + ")")
+                values.extend(f"%{department}%" for department in params["departments"])
+            if conditions:
+                query += " WHERE " + " AND ".join(conditions)
+            query += " GROUP BY s.id"
+            
+            gpa_filter = params.get("gpa_filter")
+            if gpa_filter:
+                query += f" HAVING gpa {gpa_filter['op']} ?"
+                values.append(gpa_filter["value"])
+            query += " ORDER BY s.name"
+            
+            result["rows"] = [dict(row) for row in conn.execute(query, values).fetchall()]
+            result["success"] = True
+            result["message"] = f"Found {len(result['rows'])} students"
+        
+        elif operation == "show_courses":
+            query = """
+                SELECT c.id, c.code, c.title, c.credit_hour, c.max_students,
+                       (SELECT COALESCE(SUM(cs.enrolled_count), 0) FROM course_seats cs
+                        WHERE cs.course_id = c.id AND cs.semester = ?) as enrolled
+                FROM courses c
+            """
+            values = [params.get("semester")]
+            conditions = []
+            if params.get("teacher_ids"):
+                placeholders = ", ".join("?" for _ in params["teacher_ids"])
+                conditions.append(f"c.id IN (SELECT course_id FROM teaching WHERE semester = ? AND teacher_id IN ({placeholders}))")
+                values.extend([params.get("semester")] + params["teacher_ids"])
+            if params.get("student_ids"):
+                placeholders = ", ".join("?" for _ in params["student_ids"])
+                conditions.append(f"c.id IN (SELECT course_id FROM enrollments WHERE semester = ? AND student_id IN ({placeholders}))")
+                values.extend([params.get("semester")] + params["student_ids"])
+            if params.get("course_codes"):
+                placeholders = ", ".join("?" for _ in params["course_codes"])
+                conditions.append(f"REPLACE(UPPER(c.code), ' ', '') IN ({placeholders})")
+                values.extend(params["course_codes"])
+            if conditions:
+                query += " WHERE " + " AND ".join(conditions)
+            query += " ORDER BY c.code"
+            
+            result["rows"] = [dict(row) for row in conn.execute(query, values).fetchall()]
+            result["success"] = True
+            result["message"] = f"Found {len(result['rows'])} courses"
+        
+        elif operation == "move_students":
+            semester = params.get("semester")
+            source = _resolve_courses(conn, params.get("source_course_codes", []), result)
+            target = _resolve_courses(conn, params.get("course_codes", []), result)
+            
+            if source and target:
+                source_id = next(iter(source.values()))
+                target_id = next(iter(target.values()))
+                
+                # Students currently in the source course (optionally restricted to the given ids)
+                movers = [
+                    row['student_id'] for row in conn.execute(
+                        "SELECT student_id FROM enrollments WHERE course_id = ? AND semester = ? ORDER BY id",
+                        (source_id, semester)
+                    ).fetchall()
+                ]
+                if params.get("student_ids"):
+                    wanted = set(params["student_ids"])
+                    movers = [student_id for student_id in movers if student_id in wanted]
+                
+                # Enroll into the target (capacity-checked), then drop the source rows of everyone now in the target
+                plan = plan_enrollment_changes(conn, movers, [target_id], semester)
+                moved = [student_id for student_id, _ in plan["insert"] + plan["unchanged"]]
+                result["delta"] = {
+                    "enrollments_insert": len(plan["insert"]),
+                    "enrollments_delete": len(moved),
+                    "over_capacity": len(plan["over_capacity"])
+                }
+                
+                if not dry_run:
+                    watermark = _max_id(conn, "enrollments")
+                    apply_enrollment_changes(conn, plan, commit=False)
+                    in_target = {
+                        row['student_id'] for row in conn.execute(
+                            "SELECT student_id FROM enrollments WHERE course_id = ? AND semester = ?",
+                            (target_id, semester)
+                        ).fetchall()
+                    }
+                    moved = [student_id for student_id in movers if student_id in in_target]
+                    conn.executemany(
+                        "DELETE FROM enrollments WHERE student_id = ? AND course_id = ? AND semester = ?",
+                        [(student_id, source_id, semester) for student_id in moved]
+                    )
+                    affected["enrollments_inserted"] = _rows_since(conn, "enrollments", "student_id", watermark)
+                    affected["enrollments_deleted"] = [[student_id, source_id, semester] for student_id in moved]
+                
+                result["details"].append(f"{'Would move' if dry_run else 'Moved'} {len(moved)} students")
+                if plan["over_capacity"]:
+                    result["details"].append(f"{len(plan['over_capacity'])} students not moved (target course is full)")
+                result["success"] = True
+                result["message"] = f"{'Would move' if dry_run else 'Moved'} {len(moved)} of {len(movers)} students"
+            else:
+                result["message"] = "Source or target course not found"
+        
+        elif operation == "create_course":
+            course = params.get("course", {})
+            existing = conn.execute(
+                "SELECT id FROM courses WHERE REPLACE(UPPER(code), ' ', '') = ?",
+                (_normalize_code(course["code"]),)
+            ).fetchone()
+            
+            if existing:
+                result["message"] = f"Course code {course['code']} already exists"
+            else:
+                result["delta"] = {"courses_insert": 1}
+                if not dry_run:
+                    cursor = conn.execute(
+                        "INSERT INTO courses (code, title, credit_hour, max_students) VALUES (?, ?, ?, ?)",
+                        (course["code"], course["title"], course["credit_hour"], course.get("max_students") or 40)
+                    )
+                    affected["courses_inserted"] = [cursor.lastrowid]
+                result["success"] = True
+                result["message"] = f"{'Would create' if dry_run else 'Created'} course {course['code']} - {course['title']}"
+        
+        # Estimated cost: rows written and the number of write statements needed
+        rows_to_write = sum(value for key, value in result["delta"].items() if key.endswith(("_insert", "_delete")))
+        result["cost"] = {
+            "rows_to_write": rows_to_write,
+            "write_statements": sum(1 for key, value in result["delta"].items() if key.endswith(("_insert", "_delete")) and value)
+        }
+        
+        result["duration_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        if not journaled:
+            conn.rollback()
+        else:
+            status = "executed" if result["success"] else "failed"
+            result["journal_id"] = _record_journal(conn, parsed_command, result, affected, status, executed_by)
+            conn.commit()
     except Exception as e:
+        conn.rollback()
+        result["journal_id"] = None
         result["success"] = False
         result["message"] = f"Error executing command: {str(e)}"
+    
+    try:
+        result["duration_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        if journaled and result["journal_id"] is None:
+            # Failed commands are journaled on their own; they changed nothing that needs undoing
+            result["journal_id"] = _record_journal(conn, parsed_command, result, {}, "failed", executed_by)
+            conn.commit()
+    finally:
+        conn.close()
+    
+    return result
+
+def undo_command(journal_id):
+    """Reverse an executed command from its journal entry
+    
+    Inserted rows are deleted through their unique (owner, course, semester)
+    index and deleted enrollments are re-inserted, all in one transaction,
+    so no table has to be scanned. Enrollment changes go through
+    apply_enrollment_changes: restored students who no longer fit are
+    waitlisted and freed seats are offered to the waitlist.
+    
+    Args:
+        journal_id: ID of the command_journal entry
+        
+    Returns:
+        dict: Result with success flag and message
+    """
+    conn = get_db_connection()
+    result = {"success": False, "message": "", "details": []}
+    
+    try:
+        entry = conn.execute("SELECT * FROM command_journal WHERE id = ?", (journal_id,)).fetchone()
+        if not entry:
+            result["message"] = f"Journal entry {journal_id} not found"
+            return result
+        if entry['status'] != "executed":
+            result["message"] = f"Only executed commands can be undone (entry is '{entry['status']}')"
+            return result
+        
+        affected = json.loads(entry['affected_json'] or "{}")
+        begin_immediate(conn)
+        
+        enrollment_keys = affected.get("enrollments_inserted", [])
+        restored = affected.get("enrollments_deleted", [])
+        
+        # Go through the seat-checked path so restored students never overfill
+        # a course and seats freed by removals are offered to the waitlist
+        plans = {}
+        for key, bucket in ((enrollment_keys, "delete"), (restored, "insert")):
+            for student_id, course_id, semester in key:
+                plan = plans.setdefault(semester, {
+                    "semester": semester, "enforce_capacity": True, "insert": [], "delete": [],
+                    "unchanged": [], "over_capacity": [], "missing_courses": []
+                })
+                plan[bucket].append((student_id, course_id))
+        restored_count = waitlisted = promoted = 0
+        for plan in plans.values():
+            summary = apply_enrollment_changes(conn, plan, waitlist_overflow=True, commit=False)
+            restored_count += summary["enrolled"]
+            waitlisted += summary["waitlisted"]
+            promoted += summary["promoted"]
+        
+        teaching_keys = affected.get("teaching_inserted", [])
+        conn.executemany(
+            "DELETE FROM teaching WHERE teacher_id = ? AND course_id = ? AND semester = ?",
+            [tuple(key) for key in teaching_keys]
+        )
+        
+        for course_id in affected.get("courses_inserted", []):
+            in_use = conn.execute(
+                "SELECT 1 FROM enrollments WHERE course_id = ? UNION ALL SELECT 1 FROM teaching WHERE course_id = ? LIMIT 1",
+                (course_id, course_id)
+            ).fetchone()
+            if in_use:
+                result["details"].append(f"Course {course_id} kept because it is now in use")
+            else:
+                conn.execute("DELETE FROM courses WHERE id = ?", (course_id,))
+                result["details"].append(f"Removed course {course_id}")
+        
+        conn.execute(
+            "UPDATE command_journal SET status = 'undone', undone_at = ? WHERE id = ?",
+            (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), journal_id)
+        )
+        conn.commit()
+        
+        if enrollment_keys:
+            result["details"].append(f"Removed {len(enrollment_keys)} enrollments")
+        if restored:
+            result["details"].append(f"Restored {restored_count} of {len(restored)} enrollments")
+        if waitlisted:
+            result["details"].append(f"{waitlisted} students waitlisted because their course is now full")
+        if promoted:
+            result["details"].append(f"Promoted {promoted} students from the waitlist")
+        if teaching_keys:
+            result["details"].append(f"Removed {len(teaching_keys)} teaching assignments")
+        result["success"] = True
+        result["message"] = f"Command #{journal_id} undone"
+    except Exception as e:
+        conn.rollback()
+        result["message"] = f"Error undoing command: {str(e)}"
     finally:
         conn.close()
     
-    return result 
\ No newline at end of file
+    return result
+
+def get_command_history(limit=20):
+    """Get the most recent command journal entries, newest first"""
+    conn = get_db_connection()
+    rows = conn.execute(
+        """SELECT id, command_text, operation, status, message, duration_ms, executed_by, created_at, undone_at
+           FROM command_journal
+           ORDER BY id DESC LIMIT ?""",
+        (limit,)
+    ).fetchall()
+    conn.close()
+    return rows
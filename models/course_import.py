@@ -0,0 +1,177 @@
+import os
+import pandas as pd
+from database.schema import get_db_connection
+
+# Accepted spellings for each column of an import file, matched case-insensitively
+COLUMN_ALIASES = {
+    "Code": ["code", "course code", "course_code"],
+    "Title": ["title", "course title", "course_title", "name"],
+    "CreditHours": ["credithours", "credit hours", "credit_hours", "credit hour", "credit_hour", "credits"],
+    "MaxStudents": ["maxstudents", "max students", "max_students", "capacity"]
+}
+
+DEFAULT_MAX_STUDENTS = 40
+
+def _normalize_columns(df):
+    """Rename known column aliases to the canonical import column names"""
+    renamed = {}
+    for column in df.columns:
+        key = str(column).strip().lower()
+        for canonical, aliases in COLUMN_ALIASES.items():
+            if key in aliases:
+                renamed[column] = canonical
+                break
+    return df.rename(columns=renamed)
+
+def _find_header_row(raw):
+    """Return the index of the first row that looks like a course header, or None"""
+    for index, row in raw.iterrows():
+        values = [str(v).strip().lower() for v in row.values if pd.notna(v)]
+        if any(v in COLUMN_ALIASES["Code"] for v in values) and any(v in COLUMN_ALIASES["Title"] for v in values):
+            return index
+    return None
+
+def read_course_file(uploaded_file):
+    """Read a course catalog from a CSV or Excel (.xlsx) upload
+
+    Excel workbooks are scanned sheet by sheet and every sheet with a
+    recognisable Code/Title/Credit Hours header (possibly below a banner
+    row, as in "Intellix - Courses Data.xlsx") is stacked into one frame.
+
+    Args:
+        uploaded_file: File path or file-like object with a ``name`` attribute
+
+    Returns:
+        DataFrame: Rows with Code, Title, CreditHours and MaxStudents columns
+    """
+    name = getattr(uploaded_file, "name", str(uploaded_file))
+    extension = os.path.splitext(name)[1].lower()
+
+    if extension == ".xlsx":
+        frames = []
+        sheets = pd.read_excel(uploaded_file, sheet_name=None, header=None)
+        for raw in sheets.values():
+            header_row = _find_header_row(raw)
+            if header_row is None:
+                continue
+            sheet = raw.iloc[header_row + 1:].copy()
+            sheet.columns = raw.iloc[header_row].values
+            sheet = _normalize_columns(sheet)
+            if {"Code", "Title", "CreditHours"}.issubset(sheet.columns):
+                frames.append(sheet.loc[:, ~sheet.columns.duplicated()])
+        df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    else:
+        df = _normalize_columns(pd.read_csv(uploaded_file))
+
+    if "MaxStudents" not in df.columns:
+        df["MaxStudents"] = DEFAULT_MAX_STUDENTS
+
+    return df
+
+def plan_course_import(conn, df, update_existing=False):
+    """Build a dry-run diff of a course import against the courses table
+
+    Existing courses are loaded with a single query and compared in memory,
+    so the plan costs one round-trip regardless of the file size.
+
+    Args:
+        conn: Open database connection
+        df: DataFrame returned by read_course_file
+        update_existing: If True, changed rows for existing codes are updated
+                         instead of skipped
+
+    Returns:
+        dict: Lists of rows keyed by "new", "updated", "unchanged",
+              "skipped", "duplicates" and "invalid"
+    """
+    plan = {"new": [], "updated": [], "unchanged": [], "skipped": [], "duplicates": [], "invalid": []}
+
+    missing = [c for c in ("Code", "Title", "CreditHours") if c not in df.columns]
+    if missing:
+        raise ValueError(f"Import file must contain columns: Code, Title, CreditHours (missing {', '.join(missing)})")
+
+    existing = {
+        row["code"]: row
+        for row in conn.execute("SELECT id, code, title, credit_hour, max_students FROM courses").fetchall()
+    }
+
+    codes = df["Code"].astype("string").str.strip()
+    titles = df["Title"].astype("string").str.strip()
+    credits = pd.to_numeric(df["CreditHours"], errors="coerce")
+    capacities = pd.to_numeric(df["MaxStudents"], errors="coerce").fillna(DEFAULT_MAX_STUDENTS)
+
+    seen = set()
+    for code, title, credit_hour, max_students in zip(codes, titles, credits, capacities):
+        if pd.isna(code) or not code or pd.isna(title) or not title or pd.isna(credit_hour) or credit_hour <= 0:
+            # Blank lines and "TOTAL CREDITS" style summary rows end up here
+            if not pd.isna(code) and code:
+                plan["invalid"].append({"code": code, "title": None if pd.isna(title) else title})
+            continue
+
+        row = {"code": code, "title": title, "credit_hour": float(credit_hour), "max_students": int(max_students)}
+
+        if code in seen:
+            plan["duplicates"].append(row)
+            continue
+        seen.add(code)
+
+        current = existing.get(code)
+        if current is None:
+            plan["new"].append(row)
+        elif (current["title"], float(current["credit_hour"]), current["max_students"]) == (title, row["credit_hour"], row["max_students"]):
+            plan["unchanged"].append(dict(row, id=current["id"]))
+        elif update_existing:
+            plan["updated"].append(dict(row, id=current["id"]))
+        else:
+            plan["skipped"].append(dict(row, id=current["id"]))
+
+    return plan
+
+def apply_course_import(conn, plan):
+    """Write a course import plan in a single transaction
+
+    Args:
+        conn: Open database connection
+        plan: Plan returned by plan_course_import
+
+    Returns:
+        dict: Counts of inserted and updated courses
+    """
+    try:
+        conn.executemany(
+            "INSERT INTO courses (code, title, credit_hour, max_students) VALUES (?, ?, ?, ?)",
+            [(r["code"], r["title"], r["credit_hour"], r["max_students"]) for r in plan["new"]]
+        )
+        conn.executemany(
+            "UPDATE courses SET title = ?, credit_hour = ?, max_students = ? WHERE id = ?",
+            [(r["title"], r["credit_hour"], r["max_students"], r["id"]) for r in plan["updated"]]
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    return {"inserted": len(plan["new"]), "updated": len(plan["updated"])}
+
+def import_courses(uploaded_file, update_existing=False, dry_run=False):
+    """Read, plan and (unless dry_run) apply a course import
+
+    Args:
+        uploaded_file: CSV or Excel (.xlsx) file path or upload
+        update_existing: If True, existing courses are updated from the file
+        dry_run: If True, only the diff report is returned
+
+    Returns:
+        dict: The import plan, plus a "result" entry when applied
+    """
+    df = read_course_file(uploaded_file)
+
+    conn = get_db_connection()
+    try:
+        plan = plan_course_import(conn, df, update_existing)
+        if not dry_run:
+            plan["result"] = apply_course_import(conn, plan)
+    finally:
+        conn.close()
+
+    return plan
@@ -0,0 +1,225 @@
+from database.schema import get_db_connection
+from models.seats import HAS_FREE_SEAT, begin_immediate, fill_from_waitlist, join_waitlist
+
+def _placeholders(values):
+    """Return a "?, ?, ..." placeholder list for an IN clause"""
+    return ", ".join("?" for _ in values)
+
+def plan_enrollment_changes(conn, student_ids, course_ids, semester, action="enroll", enforce_capacity=True):
+    """Compute the enrollment delta for students x courses in one query
+
+    The existing enrollments and capacity of every requested course are
+    fetched together, the requested pairs are diffed against them in memory
+    and, when enrolling, seats are handed out in the order the students were
+    given until each course reaches ``max_students``.
+
+    Args:
+        conn: Open database connection
+        student_ids: List of student IDs (students.id)
+        course_ids: List of course IDs (courses.id)
+        semester: Semester name, e.g. "Spring 2025"
+        action: "enroll" to add enrollments or "remove" to delete them
+        enforce_capacity: If True, enrollments beyond max_students are rejected
+
+    Returns:
+        dict: Plan with "insert", "delete", "unchanged" and "over_capacity"
+              lists of (student_id, course_id) pairs plus per-course "courses" info
+    """
+    student_ids = list(dict.fromkeys(student_ids))
+    course_ids = list(dict.fromkeys(course_ids))
+
+    plan = {
+        "action": action,
+        "semester": semester,
+        "enforce_capacity": enforce_capacity,
+        "insert": [],
+        "delete": [],
+        "unchanged": [],
+        "over_capacity": [],
+        "missing_courses": [],
+        "courses": {}
+    }
+
+    if not student_ids or not course_ids:
+        return plan
+
+    rows = conn.execute(f"""
+        SELECT c.id, c.code, c.max_students, e.student_id
+        FROM courses c
+        LEFT JOIN enrollments e ON e.course_id = c.id AND e.semester = ?
+        WHERE c.id IN ({_placeholders(course_ids)})
+    """, [semester] + course_ids).fetchall()
+
+    enrolled = {}
+    for row in rows:
+        info = plan["courses"].setdefault(row["id"], {
+            "code": row["code"],
+            "max_students": row["max_students"],
+            "enrolled": 0
+        })
+        members = enrolled.setdefault(row["id"], set())
+        if row["student_id"] is not None:
+            members.add(row["student_id"])
+            info["enrolled"] += 1
+
+    for course_id in course_ids:
+        info = plan["courses"].get(course_id)
+        if info is None:
+            plan["missing_courses"].append(course_id)
+            continue
+
+        members = enrolled[course_id]
+        if action == "remove":
+            removed = [s for s in student_ids if s in members]
+            plan["delete"].extend((s, course_id) for s in removed)
+            plan["unchanged"].extend((s, course_id) for s in student_ids if s not in members)
+            info["after"] = info["enrolled"] - len(removed)
+            continue
+
+        seats_left = None
+        if enforce_capacity and info["max_students"] is not None:
+            seats_left = max(info["max_students"] - info["enrolled"], 0)
+
+        added = 0
+        for student_id in student_ids:
+            pair = (student_id, course_id)
+            if student_id in members:
+                plan["unchanged"].append(pair)
+            elif seats_left is not None and added >= seats_left:
+                plan["over_capacity"].append(pair)
+            else:
+                plan["insert"].append(pair)
+                added += 1
+        info["after"] = info["enrolled"] + added
+
+    return plan
+
+def apply_enrollment_changes(conn, plan, waitlist_overflow=False, commit=True):
+    """Apply an enrollment plan with executemany in a single transaction
+
+    Inserts are guarded by the course_seats counters, so a course that filled
+    up after the plan was made (e.g. from another admin session) is never
+    oversold; with waitlist_overflow those students are queued instead.
+    Removals run first, and seats they free that the plan's own inserts do
+    not take are handed to waitlisted students.
+
+    Args:
+        conn: Open database connection
+        plan: Plan returned by plan_enrollment_changes
+        waitlist_overflow: If True, students rejected for capacity join the waitlist
+        commit: If False, the caller owns the transaction and must commit or roll back
+
+    Returns:
+        dict: Summary with enrolled, removed, unchanged, over_capacity,
+              waitlisted and promoted counts
+    """
+    semester = plan["semester"]
+    try:
+        begin_immediate(conn)
+
+        removed = 0
+        if plan["delete"]:
+            cursor = conn.executemany(
+                "DELETE FROM enrollments WHERE student_id = ? AND course_id = ? AND semester = ?",
+                [(student_id, course_id, semester) for student_id, course_id in plan["delete"]]
+            )
+            removed = max(cursor.rowcount, 0)
+
+        if plan.get("enforce_capacity", True):
+            cursor = conn.executemany(
+                f"""INSERT OR IGNORE INTO enrollments (student_id, course_id, semester)
+                    SELECT ?, ?, ? WHERE {HAS_FREE_SEAT}""",
+                [(student_id, course_id, semester, course_id, semester, course_id)
+                 for student_id, course_id in plan["insert"]]
+            )
+        else:
+            cursor = conn.executemany(
+                "INSERT OR IGNORE INTO enrollments (student_id, course_id, semester) VALUES (?, ?, ?)",
+                [(student_id, course_id, semester) for student_id, course_id in plan["insert"]]
+            )
+        enrolled = max(cursor.rowcount, 0)
+
+        # Inserts the seat guard turned away because the course filled up
+        # after the plan was made
+        rejected = []
+        if enrolled < len(plan["insert"]):
+            enrolled_now = {}
+            for student_id, course_id in plan["insert"]:
+                if course_id not in enrolled_now:
+                    enrolled_now[course_id] = {row[0] for row in conn.execute(
+                        "SELECT student_id FROM enrollments WHERE course_id = ? AND semester = ?",
+                        (course_id, semester)
+                    )}
+                if student_id not in enrolled_now[course_id]:
+                    rejected.append((student_id, course_id))
+
+        overflow = list(plan["over_capacity"]) + rejected
+        over_capacity = len(overflow)
+        waitlisted = 0
+        if waitlist_overflow and overflow:
+            waitlisted = join_waitlist(conn, overflow, semester)
+
+        promoted = 0
+        for course_id in dict.fromkeys(course_id for _, course_id in plan["delete"]):
+            promoted += len(fill_from_waitlist(conn, course_id, semester))
+
+        if commit:
+            conn.commit()
+    except Exception:
+        if commit:
+            conn.rollback()
+        raise
+
+    return {
+        "enrolled": enrolled,
+        "removed": removed,
+        "unchanged": len(plan["unchanged"]),
+        "over_capacity": over_capacity,
+        "waitlisted": waitlisted,
+        "promoted": promoted,
+        "missing_courses": len(plan["missing_courses"])
+    }
+
+def batch_enroll(student_ids, course_ids, semester, enforce_capacity=True, waitlist_overflow=False, conn=None):
+    """Enroll every student in every course for a semester
+
+    Args:
+        student_ids: List of student IDs
+        course_ids: List of course IDs
+        semester: Semester name
+        enforce_capacity: If True, courses are not filled past max_students
+        waitlist_overflow: If True, students who do not get a seat are waitlisted
+        conn: Optional open connection to reuse
+
+    Returns:
+        dict: Summary returned by apply_enrollment_changes
+    """
+    own_conn = conn is None
+    conn = conn or get_db_connection()
+    try:
+        plan = plan_enrollment_changes(conn, student_ids, course_ids, semester, "enroll", enforce_capacity)
+        return apply_enrollment_changes(conn, plan, waitlist_overflow)
+    finally:
+        if own_conn:
+            conn.close()
+
+def batch_unenroll(student_ids, course_ids, semester, conn=None):
+    """Remove every student from every course for a semester
+
+    Args:
+        student_ids: List of student IDs
+        course_ids: List of course IDs
+        semester: Semester name
+        conn: Optional open connection to reuse
+
+    Returns:
+        dict: Summary returned by apply_enrollment_changes
+    """
+    own_conn = conn is None
+    conn = conn or get_db_connection()
+    try:
+        plan = plan_enrollment_changes(conn, student_ids, course_ids, semester, "remove")
+        return apply_enrollment_changes(conn, plan)
+    finally:
+        if own_conn:
+            conn.close()
@@ -0,0 +1,216 @@
+import pickle
+import threading
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import HistGradientBoostingRegressor
+from sklearn.metrics import mean_absolute_error, r2_score
+from sklearn.model_selection import train_test_split
+from database.schema import get_db_connection
+
+# Per-course inputs available before the final exam; missing values stay NaN
+FEATURES = ["credit_hour", "mid", "assignment", "assignment_pct", "assignments_submitted",
+            "test_pct", "tests_taken", "attendance_rate", "classes_held"]
+
+# Completed courses needed before a model is trained
+MIN_TRAINING_ROWS = 50
+
+# Lower bounds of the grade point bands used by calculate_gpa
+GRADE_THRESHOLDS = np.array([40, 45, 50, 55, 60, 65, 70, 75, 80])
+GRADE_POINTS = np.array([0.00, 2.00, 2.25, 2.50, 2.75, 3.00, 3.25, 3.50, 3.75, 4.00])
+
+# One row per graded (student, course, semester); {student_filter} restricts every
+# aggregate to the students in the temp table gpa_students when scoring a subset
+FEATURE_QUERY = """
+    SELECT g.student_id, g.course_id, g.semester, c.credit_hour,
+           g.mid, g.assignment, g.final,
+           asg.pct AS assignment_pct, asg.submitted AS assignments_submitted,
+           tst.pct AS test_pct, tst.taken AS tests_taken,
+           att.rate AS attendance_rate, att.held AS classes_held
+    FROM grades g
+    JOIN courses c ON c.id = g.course_id
+    LEFT JOIN (
+        SELECT sa.student_id, a.course_id, a.semester,
+               AVG(sa.marks * 1.0 / a.max_marks) AS pct, COUNT(*) AS submitted
+        FROM student_assignments sa
+        JOIN assignments a ON a.id = sa.assignment_id
+        WHERE a.max_marks > 0 {student_filter_sa}
+        GROUP BY sa.student_id, a.course_id, a.semester
+    ) asg ON asg.student_id = g.student_id AND asg.course_id = g.course_id AND asg.semester = g.semester
+    LEFT JOIN (
+        SELECT sts.student_id, ct.course_id, ct.semester,
+               AVG(sts.marks * 1.0 / ct.max_marks) AS pct, COUNT(*) AS taken
+        FROM student_test_submissions sts
+        JOIN class_tests ct ON ct.id = sts.test_id
+        WHERE ct.max_marks > 0 {student_filter_sts}
+        GROUP BY sts.student_id, ct.course_id, ct.semester
+    ) tst ON tst.student_id = g.student_id AND tst.course_id = g.course_id AND tst.semester = g.semester
+    LEFT JOIN (
+        SELECT student_id, course_id, AVG(present) AS rate, COUNT(*) AS held
+        FROM attendance
+        WHERE 1 = 1 {student_filter_att}
+        GROUP BY student_id, course_id
+    ) att ON att.student_id = g.student_id AND att.course_id = g.course_id
+    WHERE 1 = 1 {student_filter_g}
+"""
+
+_loaded = {"version": None, "model": None}
+_load_lock = threading.Lock()
+
+def load_features(conn, student_ids=None, semester=None):
+    """Build the per-course feature frame in one query
+
+    Args:
+        conn: Open database connection
+        student_ids: Optional student IDs to restrict to (defaults to every graded row)
+        semester: Optional semester to restrict to
+
+    Returns:
+        DataFrame: student_id, course_id, semester, final and the FEATURES columns
+    """
+    filters = {"student_filter_sa": "", "student_filter_sts": "", "student_filter_att": "", "student_filter_g": ""}
+    params = []
+    if student_ids is not None:
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS gpa_students (id INTEGER PRIMARY KEY)")
+        conn.execute("DELETE FROM gpa_students")
+        conn.executemany("INSERT OR IGNORE INTO gpa_students (id) VALUES (?)", [(i,) for i in student_ids])
+        filters = {
+            "student_filter_sa": "AND sa.student_id IN (SELECT id FROM gpa_students)",
+            "student_filter_sts": "AND sts.student_id IN (SELECT id FROM gpa_students)",
+            "student_filter_att": "AND student_id IN (SELECT id FROM gpa_students)",
+            "student_filter_g": "AND g.student_id IN (SELECT id FROM gpa_students)"
+        }
+    query = FEATURE_QUERY.format(**filters)
+    if semester:
+        query += " AND g.semester = ?"
+        params.append(semester)
+
+    frame = pd.read_sql_query(query, conn, params=params)
+    frame[FEATURES + ["final"]] = frame[FEATURES + ["final"]].astype(float)
+    return frame
+
+def grade_points(totals):
+    """Vectorised calculate_gpa grade bands for an array of course totals"""
+    return GRADE_POINTS[np.searchsorted(GRADE_THRESHOLDS, np.asarray(totals, dtype=float), side="right")]
+
+def train_gpa_model(activate=True, progress=None):
+    """Train a course-total regression model on completed courses and store it as a new version
+
+    Completed courses (final marks recorded) are the training rows; the target
+    is mid + assignment + final and the features only use what is known
+    before the final exam. A 20% holdout is scored before the model is refit
+    on all rows.
+
+    Args:
+        activate: Make the new version the one used for predictions
+        progress: Optional callable(fraction, message) for progress reporting
+
+    Returns:
+        dict: {"version", "training_rows", "mae", "r2"}
+
+    Raises:
+        ValueError: If there are fewer than MIN_TRAINING_ROWS completed courses
+    """
+    conn = get_db_connection()
+    try:
+        frame = load_features(conn)
+        frame = frame[frame["final"] > 0]
+        if len(frame) < MIN_TRAINING_ROWS:
+            raise ValueError(f"Need at least {MIN_TRAINING_ROWS} completed courses to train, found {len(frame)}")
+        if progress:
+            progress(0.2, f"Training on {len(frame)} completed courses")
+
+        features = frame[FEATURES].to_numpy()
+        target = (frame["mid"].fillna(0) + frame["assignment"].fillna(0) + frame["final"]).to_numpy()
+
+        train_x, test_x, train_y, test_y = train_test_split(features, target, test_size=0.2, random_state=0)
+        model = HistGradientBoostingRegressor(max_iter=200, random_state=0)
+        model.fit(train_x, train_y)
+        predicted = model.predict(test_x)
+        mae = float(mean_absolute_error(test_y, predicted))
+        r2 = float(r2_score(test_y, predicted)) if len(test_y) > 1 else None
+        if progress:
+            progress(0.7, f"Holdout MAE {mae:.2f} marks")
+
+        model.fit(features, target)
+
+        cursor = conn.execute(
+            "INSERT INTO gpa_models (model, features, training_rows, mae, r2) VALUES (?, ?, ?, ?, ?)",
+            (pickle.dumps(model), ",".join(FEATURES), len(frame), mae, r2)
+        )
+        version = cursor.lastrowid
+        if activate:
+            conn.execute("UPDATE gpa_models SET is_active = (version = ?)", (version,))
+        conn.commit()
+    finally:
+        conn.close()
+
+    return {"version": version, "training_rows": len(frame), "mae": round(mae, 3),
+            "r2": round(r2, 3) if r2 is not None else None}
+
+def active_model_version(conn=None):
+    """Version number of the active GPA model, or None if none has been trained"""
+    own_conn = conn is None
+    conn = conn or get_db_connection()
+    try:
+        row = conn.execute("SELECT version FROM gpa_models WHERE is_active = 1 ORDER BY version DESC LIMIT 1").fetchone()
+    finally:
+        if own_conn:
+            conn.close()
+    return row['version'] if row else None
+
+def get_active_model(conn):
+    """Active model, unpickled once per process and reloaded only when the active version changes
+
+    Returns:
+        tuple: (version, model), or (None, None) if no model has been trained
+    """
+    version = active_model_version(conn)
+    with _load_lock:
+        if version != _loaded["version"]:
+            model = None
+            if version is not None:
+                row = conn.execute("SELECT model, features FROM gpa_models WHERE version = ?", (version,)).fetchone()
+                if row['features'] == ",".join(FEATURES):
+                    model = pickle.loads(row['model'])
+            _loaded.update(version=version if model is not None else None, model=model)
+        return _loaded["version"], _loaded["model"]
+
+def predict_gpas(student_ids, semester=None):
+    """Predict GPAs for many students with one feature query and one model call
+
+    Courses with final marks use their actual total; the rest use the
+    model's predicted total. Totals become grade points and are averaged
+    by credit hours per student.
+
+    Args:
+        student_ids: Student IDs to score
+        semester: Semester to predict for, if None uses all grades
+
+    Returns:
+        dict: student_id -> predicted GPA, or None if no model has been trained
+    """
+    conn = get_db_connection()
+    try:
+        version, model = get_active_model(conn)
+        if model is None:
+            return None
+        frame = load_features(conn, student_ids, semester)
+    finally:
+        conn.close()
+
+    predictions = {student_id: 0.0 for student_id in student_ids}
+    if frame.empty:
+        return predictions
+
+    completed = frame["final"].fillna(0).to_numpy() > 0
+    actual = (frame["mid"].fillna(0) + frame["assignment"].fillna(0) + frame["final"].fillna(0)).to_numpy()
+    totals = actual.copy()
+    if (~completed).any():
+        totals[~completed] = np.clip(model.predict(frame.loc[~completed, FEATURES].to_numpy()), 0, 100)
+
+    frame = frame.assign(weighted=grade_points(totals) * frame["credit_hour"])
+    sums = frame.groupby("student_id")[["weighted", "credit_hour"]].sum()
+    sums = sums[sums["credit_hour"] > 0]
+    for student_id, gpa in (sums["weighted"] / sums["credit_hour"]).round(2).items():
+        predictions[int(student_id)] = float(gpa)
+    return predictions
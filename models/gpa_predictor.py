@@ -1,12 +1,16 @@
 import numpy as np
 from database.schema import get_db_connection
+from models.memo import memoize_by_student
+from models.gpa_model import predict_gpas, active_model_version
 
-def calculate_gpa(grades):
+def calculate_gpa(grades, credit_hours=None):
     """Calculate GPA based on grades
     
     Args:
         grades: Dictionary with course_id as key and 
                 dict of mid, assignment, final as value
+        credit_hours: Optional dict of course_id -> credit hours; when given
+                      no database lookups are made
                 
     Returns:
         float: GPA on a 4.0 scale
@@ -14,20 +18,22 @@ def calculate_gpa(grades):
     total_points = 0
     total_credits = 0
     
-    # Get connection to database
-    conn = get_db_connection()
+    # Get connection to database only when credit hours were not supplied
+    conn = get_db_connection() if credit_hours is None else None
     
     for course_id, marks in grades.items():
         # Get course credit hours
-        course = conn.execute(
-            "SELECT credit_hour FROM courses WHERE id = ?", 
-            (course_id,)
-        ).fetchone()
+        if conn is None:
+            credit_hour = credit_hours.get(course_id)
+        else:
+            course = conn.execute(
+                "SELECT credit_hour FROM courses WHERE id = ?", 
+                (course_id,)
+            ).fetchone()
+            credit_hour = course['credit_hour'] if course else None
         
-        if not course:
+        if credit_hour is None:
             continue
-            
-        credit_hour = course['credit_hour']
         
         # Calculate total marks (mid + assignment + final)
         total_marks = marks.get('mid', 0) + marks.get('assignment', 0) + marks.get('final', 0)
@@ -58,7 +64,8 @@ def calculate_gpa(grades):
         total_points += grade_point * credit_hour
         total_credits += credit_hour
         
-    conn.close()
+    if conn is not None:
+        conn.close()
     
     # Calculate GPA
     if total_credits > 0:
@@ -66,9 +73,13 @@ def calculate_gpa(grades):
     else:
         return 0.0
 
+@memoize_by_student(extra_key=active_model_version)
 def predict_gpa(student_id, semester=None):
     """Predict GPA for a student
     
+    Uses the active trained model (see models/gpa_model.py) and falls back
+    to the attendance-adjusted current GPA until a model has been trained.
+    
     Args:
         student_id: ID of the student
         semester: Semester to predict for, if None uses current grades
@@ -76,6 +87,10 @@ def predict_gpa(student_id, semester=None):
     Returns:
         float: Predicted GPA
     """
+    predictions = predict_gpas([student_id], semester)
+    if predictions is not None:
+        return predictions[student_id]
+    
     conn = get_db_connection()
     
     # Get student's current grades
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+
+# Columns of the grade sheet; only Marks and Remarks are editable
+GRADE_SHEET_COLUMNS = ["submission_id", "Student ID", "Name", "Submitted At", "Status", "Marks", "Remarks"]
+
+def load_grade_sheet(conn, assignment_id):
+    """All submissions of an assignment as one editable frame
+
+    Args:
+        conn: Open database connection
+        assignment_id: ID of the assignment
+
+    Returns:
+        DataFrame: GRADE_SHEET_COLUMNS, one row per submission ordered by student ID
+    """
+    frame = pd.read_sql_query("""
+        SELECT sa.id AS submission_id, s.student_id AS "Student ID", s.name AS "Name",
+               sa.submitted_at AS "Submitted At", sa.status AS "Status",
+               sa.marks AS "Marks", IFNULL(sa.remarks, '') AS "Remarks"
+        FROM student_assignments sa
+        JOIN students s ON s.id = sa.student_id
+        WHERE sa.assignment_id = ?
+        ORDER BY s.student_id
+    """, conn, params=(assignment_id,))
+    # Pending submissions have no marks yet; keep the column numeric so the editor shows a number input
+    frame["Marks"] = frame["Marks"].astype(float)
+    frame.loc[frame["Status"] != "graded", "Marks"] = np.nan
+    return frame[GRADE_SHEET_COLUMNS]
+
+def save_grade_sheet(conn, assignment_id, edited):
+    """Validate an edited grade sheet and write the rows that changed
+
+    Rows are compared with a fresh load of the sheet, so only marks or
+    remarks that differ from the database are written, in one executemany.
+    Rows left without marks stay pending.
+
+    Args:
+        conn: Open database connection
+        assignment_id: ID of the assignment
+        edited: Grade sheet as returned by load_grade_sheet, after editing
+
+    Returns:
+        int: Number of submissions graded or updated
+
+    Raises:
+        ValueError: If any marks are negative or above the assignment's max_marks
+    """
+    assignment = conn.execute("SELECT max_marks FROM assignments WHERE id = ?", (assignment_id,)).fetchone()
+    if not assignment:
+        raise ValueError("Assignment not found")
+
+    current = load_grade_sheet(conn, assignment_id).set_index("submission_id")
+    edited = edited.set_index("submission_id").reindex(current.index)
+    marks = pd.to_numeric(edited["Marks"], errors="coerce")
+    remarks = edited["Remarks"].fillna("").astype(str).str.strip()
+
+    invalid = marks.notna() & ((marks < 0) | (marks > assignment['max_marks']))
+    if invalid.any():
+        students = ", ".join(current.loc[invalid, "Student ID"].astype(str))
+        raise ValueError(f"Marks must be between 0 and {assignment['max_marks']:g} (check {students})")
+
+    changed = marks.notna() & (
+        ~np.isclose(marks, current["Marks"].fillna(-1)) | (remarks != current["Remarks"].fillna(""))
+    )
+    rows = [
+        (float(mark), remark, int(submission_id))
+        for submission_id, mark, remark in zip(current.index[changed], marks[changed], remarks[changed])
+    ]
+    conn.executemany("""
+        UPDATE student_assignments
+        SET marks = ?, status = 'graded', remarks = ?, graded_at = CURRENT_TIMESTAMP
+        WHERE id = ?
+    """, rows)
+    conn.commit()
+    return len(rows)
@@ -0,0 +1,518 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from database.schema import get_db_connection
+
+# Seconds to wait before retrying a failed job, multiplied by 2 ** (attempt - 1)
+RETRY_BACKOFF_SECONDS = 10
+
+# A running job whose worker has not sent a heartbeat for this long is requeued
+STALE_AFTER_SECONDS = 300
+
+# Seconds between sweeps that auto-submit expired class test attempts, deliver queued
+# notifications and rebuild out-of-date timetables
+SWEEP_INTERVAL_SECONDS = 15
+
+# Longest pause after a worker loop error (e.g. "database is locked"); the pause
+# doubles from poll_interval on each consecutive error
+MAX_ERROR_BACKOFF_SECONDS = 60
+
+class JobCancelled(Exception):
+    """Raised inside a job handler when the job was cancelled from the UI"""
+
+def _handle_generate_routine(params, progress):
+    """Regenerate a session's class routine"""
+    from models.scheduler import generate_routine_for_session
+    progress(0.1, "Scheduling classes")
+    report = generate_routine_for_session(params["session"])
+    return {"placed": report["placed"], "unplaced": len(report["unplaced"]), "clashes": len(report["clashes"])}
+
+def _handle_generate_exam_schedule(params, progress):
+    """Regenerate a session's exam schedule"""
+    from models.scheduler import schedule_exams
+    progress(0.1, "Building conflict graph")
+    conn = get_db_connection()
+    try:
+        courses = conn.execute("SELECT id, code, title, credit_hour as credit, max_students as capacity FROM courses").fetchall()
+        report = schedule_exams(conn, courses, params["session"], params.get("exam_type", "Final"))
+    finally:
+        conn.close()
+    report["unplaced"] = len(report["unplaced"])
+    return report
+
+def _handle_refresh_timetables(params, progress):
+    """Rebuild a session's materialized timetables"""
+    from models.timetable import refresh_timetables
+    conn = get_db_connection()
+    try:
+        return refresh_timetables(conn, params["session"])
+    finally:
+        conn.close()
+
+def _students_for(params):
+    """Student IDs a bulk job applies to: explicit IDs, or everyone enrolled in the semester (optionally one department)"""
+    if params.get("student_ids"):
+        return list(params["student_ids"])
+    conn = get_db_connection()
+    try:
+        query = """
+            SELECT DISTINCT e.student_id FROM enrollments e
+            JOIN students s ON s.id = e.student_id
+            WHERE e.semester = ?
+        """
+        args = [params["semester"]]
+        if params.get("department"):
+            query += " AND s.dept = ?"
+            args.append(params["department"])
+        return [row["student_id"] for row in conn.execute(query + " ORDER BY e.student_id", args).fetchall()]
+    finally:
+        conn.close()
+
+def _handle_generate_study_plans(params, progress):
+    """Regenerate study plans for a semester's students"""
+    from models.study_plan import generate_study_plans
+    return generate_study_plans(
+        params["semester"],
+        student_ids=params.get("student_ids"),
+        department=params.get("department"),
+        processes=params.get("processes"),
+        force=params.get("force", False),
+        progress=progress
+    )
+
+def _handle_predict_gpa(params, progress):
+    """Predict GPAs for a semester's students"""
+    from models.gpa_model import predict_gpas
+    from models.gpa_predictor import predict_gpa
+    student_ids = _students_for(params)
+    progress(0.1, f"Scoring {len(student_ids)} students")
+    predictions = predict_gpas(student_ids, params.get("semester"))
+    if predictions is None:
+        # No trained model yet: fall back to the rule-based prediction per student
+        predictions = {}
+        for index, student_id in enumerate(student_ids):
+            predictions[student_id] = predict_gpa(student_id, params.get("semester"))
+            if index % 25 == 0:
+                progress(index / len(student_ids), f"{index} of {len(student_ids)} students")
+    return {"students": len(student_ids), "predictions": {str(k): v for k, v in predictions.items()}}
+
+def _handle_train_gpa_model(params, progress):
+    """Train and activate a new GPA model version"""
+    from models.gpa_model import train_gpa_model
+    return train_gpa_model(activate=params.get("activate", True), progress=progress)
+
+def _handle_regrade_class_tests(params, progress):
+    """Regrade one class test, or every test whose answer key changed since it was scored"""
+    from models.test_grading import regrade_test, regrade_outdated_tests
+    if params.get("test_id"):
+        return regrade_test(params["test_id"])
+    return regrade_outdated_tests()
+
+def _handle_sweep_test_attempts(params, progress):
+    """Auto-submit class test attempts whose deadline has passed"""
+    from models.test_attempts import sweep_expired_attempts
+    return {"submitted": sweep_expired_attempts()}
+
+def _handle_collect_blob_garbage(params, progress):
+    """Recount blob references, then delete blobs nothing refers to any more"""
+    from models.blob_store import rebuild_refcounts, collect_garbage, GC_MIN_AGE_SECONDS
+    repaired = rebuild_refcounts() if params.get("recount", True) else 0
+    progress(0.5, "Deleting unreferenced blobs")
+    result = collect_garbage(params.get("min_age_seconds", GC_MIN_AGE_SECONDS))
+    result["refcounts_repaired"] = repaired
+    return result
+
+def _handle_deliver_notifications(params, progress):
+    """Deliver every queued notification event"""
+    from models.notifications import deliver_notifications
+    result = {"events": 0, "notifications": 0}
+    while True:
+        batch = deliver_notifications()
+        if not batch["events"]:
+            return result
+        result["events"] += batch["events"]
+        result["notifications"] += batch["notifications"]
+
+# Job type -> handler(params, progress) returning a JSON-serialisable result
+JOB_HANDLERS = {
+    "generate_routine": _handle_generate_routine,
+    "generate_exam_schedule": _handle_generate_exam_schedule,
+    "refresh_timetables": _handle_refresh_timetables,
+    "generate_study_plans": _handle_generate_study_plans,
+    "predict_gpa": _handle_predict_gpa,
+    "train_gpa_model": _handle_train_gpa_model,
+    "regrade_class_tests": _handle_regrade_class_tests,
+    "sweep_test_attempts": _handle_sweep_test_attempts,
+    "collect_blob_garbage": _handle_collect_blob_garbage,
+    "deliver_notifications": _handle_deliver_notifications
+}
+
+JOB_LABELS = {
+    "generate_routine": "Generate class routine",
+    "generate_exam_schedule": "Generate exam schedule",
+    "refresh_timetables": "Refresh timetables",
+    "generate_study_plans": "Regenerate study plans",
+    "predict_gpa": "Predict GPAs",
+    "train_gpa_model": "Train GPA model",
+    "regrade_class_tests": "Regrade changed class tests",
+    "sweep_test_attempts": "Submit expired test attempts",
+    "collect_blob_garbage": "Clean up unused uploads",
+    "deliver_notifications": "Deliver notifications"
+}
+
+def enqueue_job(job_type, params=None, priority=0, max_attempts=3, created_by=None, dedupe=True):
+    """Add a job to the queue
+
+    Args:
+        job_type: Key of JOB_HANDLERS
+        params: JSON-serialisable parameters passed to the handler
+        priority: Higher priorities run first
+        max_attempts: Attempts before the job is marked failed
+        created_by: Username shown in the job list
+        dedupe: If True and an identical job is already queued or running,
+                that job's ID is returned instead of adding a new one
+
+    Returns:
+        int: Job ID
+    """
+    if job_type not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job type: {job_type}")
+
+    params_json = json.dumps(params or {}, sort_keys=True)
+    dedupe_key = f"{job_type}:{params_json}" if dedupe else None
+
+    conn = get_db_connection()
+    try:
+        try:
+            cursor = conn.execute(
+                """INSERT INTO jobs (job_type, params_json, dedupe_key, priority, max_attempts, created_by)
+                   VALUES (?, ?, ?, ?, ?, ?)""",
+                (job_type, params_json, dedupe_key, priority, max_attempts, created_by)
+            )
+            conn.commit()
+            return cursor.lastrowid
+        except sqlite3.IntegrityError:
+            conn.rollback()
+            return conn.execute(
+                "SELECT id FROM jobs WHERE dedupe_key = ? AND status IN ('queued', 'running')", (dedupe_key,)
+            ).fetchone()["id"]
+    finally:
+        conn.close()
+
+def _decode(row):
+    """Job row as a dict with params and result decoded from JSON"""
+    job = dict(row)
+    job["params"] = json.loads(job.pop("params_json") or "{}")
+    job["result"] = json.loads(job.pop("result_json")) if job.get("result_json") else None
+    return job
+
+def get_job(job_id):
+    """Get a job with decoded params and result, or None"""
+    conn = get_db_connection()
+    try:
+        row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _decode(row) if row else None
+    finally:
+        conn.close()
+
+def list_jobs(limit=20, job_type=None, status=None):
+    """Get the most recent jobs, newest first"""
+    query = "SELECT * FROM jobs WHERE 1 = 1"
+    params = []
+    if job_type:
+        query += " AND job_type = ?"
+        params.append(job_type)
+    if status:
+        query += " AND status = ?"
+        params.append(status)
+    query += " ORDER BY id DESC LIMIT ?"
+    params.append(limit)
+
+    conn = get_db_connection()
+    try:
+        return [_decode(row) for row in conn.execute(query, params).fetchall()]
+    finally:
+        conn.close()
+
+def cancel_job(job_id):
+    """Cancel a queued job, or ask a running job to stop at its next progress report
+
+    Returns:
+        bool: True if the job was still pending
+    """
+    conn = get_db_connection()
+    try:
+        cursor = conn.execute(
+            """UPDATE jobs SET status = 'cancelled', finished_at = CURRENT_TIMESTAMP, dedupe_key = NULL
+               WHERE id = ? AND status IN ('queued', 'running')""",
+            (job_id,)
+        )
+        conn.commit()
+        return cursor.rowcount > 0
+    finally:
+        conn.close()
+
+def claim_next_job(worker_id):
+    """Atomically move the next runnable job to 'running' and return its ID, or None"""
+    conn = get_db_connection()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute("""
+            SELECT id FROM jobs
+            WHERE status = 'queued' AND run_after <= CURRENT_TIMESTAMP
+            ORDER BY priority DESC, id
+            LIMIT 1
+        """).fetchone()
+        if row is None:
+            conn.rollback()
+            return None
+        conn.execute("""
+            UPDATE jobs SET status = 'running', attempts = attempts + 1, locked_by = ?, progress = 0,
+                            started_at = CURRENT_TIMESTAMP, heartbeat_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        """, (worker_id, row["id"]))
+        conn.commit()
+        return row["id"]
+    finally:
+        conn.close()
+
+def requeue_stale_jobs(stale_after=STALE_AFTER_SECONDS):
+    """Put running jobs whose worker stopped sending heartbeats back in the queue
+
+    Returns:
+        int: Number of jobs requeued or failed
+    """
+    conn = get_db_connection()
+    try:
+        cursor = conn.execute("""
+            UPDATE jobs
+            SET status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'queued' END,
+                error = 'Worker stopped responding', locked_by = NULL,
+                finished_at = CASE WHEN attempts >= max_attempts THEN CURRENT_TIMESTAMP END,
+                dedupe_key = CASE WHEN attempts >= max_attempts THEN NULL ELSE dedupe_key END
+            WHERE status = 'running' AND heartbeat_at < datetime('now', ?)
+        """, (f"-{int(stale_after)} seconds",))
+        conn.commit()
+        return cursor.rowcount
+    finally:
+        conn.close()
+
+def _report_progress(job_id, fraction, message=None):
+    """Store a job's progress; raises JobCancelled if the job was cancelled meanwhile"""
+    conn = get_db_connection()
+    try:
+        cursor = conn.execute("""
+            UPDATE jobs SET progress = ?, progress_message = COALESCE(?, progress_message),
+                            heartbeat_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND status = 'running'
+        """, (max(0.0, min(float(fraction), 1.0)), message, job_id))
+        conn.commit()
+        if cursor.rowcount == 0:
+            raise JobCancelled()
+    finally:
+        conn.close()
+
+def execute_job(job_id):
+    """Run one claimed job and record its outcome (runs inside a worker process)
+
+    Failures are retried with exponential backoff until max_attempts is
+    reached. A job cancelled while running is left cancelled.
+
+    Returns:
+        str: Final status of this attempt
+    """
+    job = get_job(job_id)
+    if job is None or job["status"] != "running":
+        return job["status"] if job else "missing"
+
+    def progress(fraction, message=None):
+        _report_progress(job_id, fraction, message)
+
+    conn = get_db_connection()
+    try:
+        result = JOB_HANDLERS[job["job_type"]](job["params"], progress)
+        conn.execute("""
+            UPDATE jobs SET status = 'succeeded', progress = 1, result_json = ?, error = NULL,
+                            dedupe_key = NULL, finished_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND status = 'running'
+        """, (json.dumps(result, default=str), job_id))
+        conn.commit()
+        return "succeeded"
+    except JobCancelled:
+        return "cancelled"
+    except Exception as e:
+        error = f"{e}\n{traceback.format_exc(limit=5)}"
+        if job["attempts"] < job["max_attempts"]:
+            delay = RETRY_BACKOFF_SECONDS * 2 ** (job["attempts"] - 1)
+            conn.execute("""
+                UPDATE jobs SET status = 'queued', error = ?, locked_by = NULL,
+                                run_after = datetime('now', ?)
+                WHERE id = ? AND status = 'running'
+            """, (error, f"+{delay} seconds", job_id))
+            status = "retrying"
+        else:
+            conn.execute("""
+                UPDATE jobs SET status = 'failed', error = ?, dedupe_key = NULL, finished_at = CURRENT_TIMESTAMP
+                WHERE id = ? AND status = 'running'
+            """, (error, job_id))
+            status = "failed"
+        conn.commit()
+        return status
+    finally:
+        conn.close()
+
+def peek_next_job():
+    """ID of the next runnable job without claiming it, or None"""
+    conn = get_db_connection()
+    try:
+        row = conn.execute("""
+            SELECT id FROM jobs WHERE status = 'queued' AND run_after <= CURRENT_TIMESTAMP
+            ORDER BY priority DESC, id LIMIT 1
+        """).fetchone()
+        return row["id"] if row else None
+    finally:
+        conn.close()
+
+def _heartbeat(job_ids):
+    """Mark jobs as alive on behalf of the worker processes running them"""
+    if not job_ids:
+        return
+    conn = get_db_connection()
+    try:
+        conn.executemany(
+            "UPDATE jobs SET heartbeat_at = CURRENT_TIMESTAMP WHERE id = ? AND status = 'running'",
+            [(job_id,) for job_id in job_ids]
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+def _mark_stale(job_ids):
+    """Expire the heartbeat of jobs whose worker process died, so the next sweep retries or fails them"""
+    conn = get_db_connection()
+    try:
+        conn.executemany(
+            "UPDATE jobs SET heartbeat_at = datetime('now', '-1 day') WHERE id = ? AND status = 'running'",
+            [(job_id,) for job_id in job_ids]
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+def _sweep_expired_attempts():
+    """Periodic sweep run by the worker loop; a failure is reported but never stops the worker"""
+    from models.test_attempts import sweep_expired_attempts
+    try:
+        sweep_expired_attempts()
+    except Exception:
+        traceback.print_exc()
+
+def _refresh_timetables():
+    """Periodic rebuild of out-of-date timetables run by the worker loop, reported like _sweep_expired_attempts"""
+    from models.timetable import refresh_all_timetables
+    try:
+        refresh_all_timetables()
+    except Exception:
+        traceback.print_exc()
+
+def _deliver_notifications():
+    """Periodic notification delivery run by the worker loop, reported like _sweep_expired_attempts"""
+    from models.notifications import deliver_notifications
+    try:
+        deliver_notifications()
+    except Exception:
+        traceback.print_exc()
+
+def run_worker(processes=2, poll_interval=1.0, stop_event=None, idle_exit=False):
+    """Claim queued jobs and run them in a pool of worker processes
+
+    Args:
+        processes: Number of jobs run in parallel
+        poll_interval: Seconds between queue polls
+        stop_event: Optional threading.Event that stops the loop when set
+        idle_exit: If True, return once the queue is empty and nothing is running
+
+    Errors in one loop iteration are printed and retried after a growing pause,
+    so the worker thread does not die with the app still running.
+    """
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    context = multiprocessing.get_context("spawn")
+    next_sweep = 0
+
+    while not (stop_event and stop_event.is_set()):
+        running = {}
+        try:
+            with ProcessPoolExecutor(max_workers=processes, mp_context=context) as pool:
+                errors = 0
+                while not (stop_event and stop_event.is_set()):
+                    try:
+                        requeue_stale_jobs()
+                        if time.monotonic() >= next_sweep:
+                            _sweep_expired_attempts()
+                            _deliver_notifications()
+                            _refresh_timetables()
+                            next_sweep = time.monotonic() + SWEEP_INTERVAL_SECONDS
+                        while len(running) < processes:
+                            job_id = claim_next_job(worker_id)
+                            if job_id is None:
+                                break
+                            running[pool.submit(execute_job, job_id)] = job_id
+
+                        finished = [f for f in running if f.done()]
+                        crashed = [running[f] for f in finished if f.exception() is not None]
+                        for future in finished:
+                            running.pop(future)
+                        _mark_stale(crashed)
+
+                        _heartbeat(list(running.values()))
+                        if idle_exit and not running and peek_next_job() is None:
+                            return
+                        errors = 0
+                    except BrokenProcessPool:
+                        raise
+                    except Exception:
+                        # Keep the worker alive through transient errors such as a locked database
+                        traceback.print_exc()
+                        errors += 1
+                        time.sleep(min(poll_interval * 2 ** errors, MAX_ERROR_BACKOFF_SECONDS))
+                        continue
+                    time.sleep(poll_interval)
+        except BrokenProcessPool:
+            # A worker process died hard; its jobs are retried and a fresh pool is started
+            _mark_stale(list(running.values()))
+            requeue_stale_jobs()
+
+_background_worker = None
+_background_lock = threading.Lock()
+
+def start_background_worker(processes=2):
+    """Start a worker thread inside the current (Streamlit server) process once
+
+    Jobs still live in the database, so they survive browser refreshes and a
+    separate ``python -m models.jobs`` worker can process the same queue.
+    """
+    global _background_worker
+    with _background_lock:
+        if _background_worker is None or not _background_worker.is_alive():
+            _background_worker = threading.Thread(
+                target=run_worker, kwargs={"processes": processes}, name="intellix-job-worker", daemon=True
+            )
+            _background_worker.start()
+    return _background_worker
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the Intellix background job worker")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 2, help="jobs run in parallel")
+    parser.add_argument("--poll-interval", type=float, default=1.0, help="seconds between queue polls")
+    parser.add_argument("--once", action="store_true", help="exit when the queue is empty")
+    args = parser.parse_args()
+    run_worker(args.processes, args.poll_interval, idle_exit=args.once)
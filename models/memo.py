@@ -0,0 +1,173 @@
+import functools
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from database.schema import get_db_connection
+
+# Results kept in the in-process LRU cache
+MEMO_SIZE = 1024
+
+# Everything predict_gpa and generate_study_plan read for a student, summarised per table.
+# Counts catch inserts/deletes, sums catch in-place mark or attendance edits and the
+# id-weighted sums catch values moving between rows. max_marks (used to scale marks)
+# and the code, title and credit hours of the student's courses (shown in study plans)
+# are included too. Every subquery starts from an index on student_id.
+FINGERPRINT_QUERY = """
+    SELECT
+        (SELECT name FROM students WHERE id = :student_id),
+        (SELECT COUNT(*) || ':' || IFNULL(SUM(e.id), 0) || ':' || IFNULL(SUM(c.credit_hour * e.id), 0)
+         FROM enrollments e JOIN courses c ON c.id = e.course_id WHERE e.student_id = :student_id),
+        (SELECT COUNT(*) || ':' || IFNULL(SUM(IFNULL(mid, 0) + IFNULL(assignment, 0) + IFNULL(final, 0)), 0) || ':' ||
+                IFNULL(SUM(id * (IFNULL(mid, 0) + 3 * IFNULL(assignment, 0) + 7 * IFNULL(final, 0))), 0)
+         FROM grades WHERE student_id = :student_id),
+        (SELECT COUNT(*) || ':' || IFNULL(SUM(present), 0) || ':' || IFNULL(SUM(id * present), 0)
+         FROM attendance WHERE student_id = :student_id),
+        (SELECT COUNT(*) || ':' || IFNULL(SUM(sa.marks), 0) || ':' || IFNULL(SUM(sa.id * sa.marks), 0) || ':' ||
+                IFNULL(SUM(sa.id * a.max_marks), 0)
+         FROM student_assignments sa JOIN assignments a ON a.id = sa.assignment_id WHERE sa.student_id = :student_id),
+        (SELECT COUNT(*) || ':' || IFNULL(SUM(sts.marks), 0) || ':' || IFNULL(SUM(sts.id * sts.marks), 0) || ':' ||
+                IFNULL(SUM(sts.id * ct.max_marks), 0)
+         FROM student_test_submissions sts JOIN class_tests ct ON ct.id = sts.test_id WHERE sts.student_id = :student_id),
+        (SELECT GROUP_CONCAT(course, ',') FROM (
+            SELECT c.id || '|' || c.code || '|' || c.title || '|' || c.credit_hour AS course
+            FROM courses c
+            WHERE c.id IN (SELECT course_id FROM enrollments WHERE student_id = :student_id
+                           UNION SELECT course_id FROM grades WHERE student_id = :student_id)
+            ORDER BY c.id))
+"""
+
+_memory = OrderedDict()
+_lock = threading.Lock()
+_disk_path = None
+
+def student_fingerprint(conn, student_id):
+    """Cheap fingerprint of a student's grades, attendance, submissions and enrollments
+
+    Args:
+        conn: Open database connection
+        student_id: ID of the student
+
+    Returns:
+        str: Hex digest that changes whenever the student's model inputs change
+    """
+    row = conn.execute(FINGERPRINT_QUERY, {"student_id": student_id}).fetchone()
+    return hashlib.sha1(json.dumps(list(row), default=str).encode("utf-8")).hexdigest()
+
+def enable_disk_cache(path=None):
+    """Also keep memoized results in an SQLite file, so they survive restarts
+
+    Args:
+        path: Cache file (defaults to database/model_cache.db)
+    """
+    global _disk_path
+    path = path or os.path.join(os.path.dirname(os.path.dirname(__file__)), "database", "model_cache.db")
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS memo (
+                key TEXT PRIMARY KEY,
+                fingerprint TEXT NOT NULL,
+                value_json TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        conn.commit()
+    finally:
+        conn.close()
+    _disk_path = path
+
+def disable_disk_cache():
+    """Stop reading and writing the on-disk cache"""
+    global _disk_path
+    _disk_path = None
+
+def clear_memo():
+    """Empty the in-process cache and, if enabled, the on-disk cache"""
+    with _lock:
+        _memory.clear()
+    if _disk_path:
+        conn = sqlite3.connect(_disk_path)
+        try:
+            conn.execute("DELETE FROM memo")
+            conn.commit()
+        finally:
+            conn.close()
+
+def _lookup(key, fingerprint):
+    """Cached JSON for key if it was computed from the same fingerprint"""
+    with _lock:
+        entry = _memory.get(key)
+        if entry:
+            _memory.move_to_end(key)
+            if entry[0] == fingerprint:
+                return entry[1]
+    if _disk_path:
+        conn = sqlite3.connect(_disk_path)
+        try:
+            row = conn.execute("SELECT fingerprint, value_json FROM memo WHERE key = ?", (key,)).fetchone()
+        finally:
+            conn.close()
+        if row and row[0] == fingerprint:
+            _remember(key, fingerprint, row[1], disk=False)
+            return row[1]
+    return None
+
+def _remember(key, fingerprint, value_json, disk=True):
+    """Store a result in the LRU cache (and on disk if enabled)"""
+    with _lock:
+        _memory[key] = (fingerprint, value_json)
+        _memory.move_to_end(key)
+        while len(_memory) > MEMO_SIZE:
+            _memory.popitem(last=False)
+    if disk and _disk_path:
+        conn = sqlite3.connect(_disk_path)
+        try:
+            conn.execute("INSERT OR REPLACE INTO memo (key, fingerprint, value_json) VALUES (?, ?, ?)",
+                         (key, fingerprint, value_json))
+            conn.commit()
+        finally:
+            conn.close()
+
+def memoize_by_student(extra_key=None):
+    """Memoize a function(student_id, semester=None, ...) on the student's input fingerprint
+
+    Results are reused until the fingerprint changes. Calls with extra
+    arguments (e.g. force=True) always run the function. Results are stored
+    as JSON, so every caller gets its own copy.
+
+    Args:
+        extra_key: Optional callable returning more key material, e.g. the current week
+
+    Returns:
+        Decorator
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(student_id, semester=None, *args, **kwargs):
+            if args or any(kwargs.values()):
+                return func(student_id, semester, *args, **kwargs)
+
+            conn = get_db_connection()
+            try:
+                fingerprint = student_fingerprint(conn, student_id)
+            finally:
+                conn.close()
+            key = json.dumps([func.__module__, func.__name__, student_id, semester,
+                              extra_key() if extra_key else None], default=str)
+
+            cached = _lookup(key, fingerprint)
+            if cached is not None:
+                return json.loads(cached)
+
+            result = func(student_id, semester)
+            # Errors (missing student etc.) are not cached
+            if not (isinstance(result, dict) and "error" in result):
+                _remember(key, fingerprint, json.dumps(result, default=str))
+            return result
+
+        wrapper.uncached = func
+        return wrapper
+    return decorator
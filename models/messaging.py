@@ -0,0 +1,186 @@
+# Entries shown per inbox/sent page
+INBOX_PAGE_SIZE = 25
+
+# Direct messages and the course broadcasts a user receives, in one shape. ?1 is the user ID,
+# ?2 the role, (?3, ?4, ?5) the (sent_at, kind, id) keyset cursor of the last entry on the
+# previous page (NULL for the first page) and ?6 the page size. Each branch walks its own
+# index newest first and stops after one page.
+INBOX_QUERY = """
+    SELECT * FROM (
+        SELECT 'direct' AS kind, m.id, m.sender_id, m.sender_role, m.course_id,
+               m.subject, m.message, m.sent_at, m.is_read
+        FROM messages m
+        WHERE m.recipient_id = ?1 AND m.recipient_role = ?2
+          AND (?3 IS NULL OR m.sent_at < ?3 OR (m.sent_at = ?3 AND ('direct', m.id) < (?4, ?5)))
+        ORDER BY m.sent_at DESC, m.id DESC
+        LIMIT ?6
+    )
+    UNION ALL
+    SELECT * FROM (
+        SELECT 'broadcast' AS kind, b.id, b.sender_id, b.sender_role, b.course_id,
+               b.subject, b.message, b.sent_at, br.broadcast_id IS NOT NULL AS is_read
+        FROM enrollments e
+        JOIN broadcasts b ON b.course_id = e.course_id AND b.semester = e.semester AND b.recipient_role = ?2
+        LEFT JOIN broadcast_reads br
+               ON br.broadcast_id = b.id AND br.recipient_id = ?1 AND br.recipient_role = ?2
+        WHERE e.student_id = ?1 AND ?2 = 'student'
+          AND (?3 IS NULL OR b.sent_at < ?3 OR (b.sent_at = ?3 AND ('broadcast', b.id) < (?4, ?5)))
+        ORDER BY b.sent_at DESC, b.id DESC
+        LIMIT ?6
+    )
+"""
+
+# Messages and broadcasts a user sent, paged like INBOX_QUERY; broadcasts report how many
+# recipients have read them
+SENT_QUERY = """
+    SELECT * FROM (
+        SELECT 'direct' AS kind, m.id, m.recipient_id, m.recipient_role, m.course_id,
+               m.subject, m.message, m.sent_at, m.is_read, NULL AS read_count
+        FROM messages m
+        WHERE m.sender_id = ?1 AND m.sender_role = ?2
+          AND (?3 IS NULL OR m.sent_at < ?3 OR (m.sent_at = ?3 AND ('direct', m.id) < (?4, ?5)))
+        ORDER BY m.sent_at DESC, m.id DESC
+        LIMIT ?6
+    )
+    UNION ALL
+    SELECT * FROM (
+        SELECT 'broadcast' AS kind, b.id, NULL, b.recipient_role, b.course_id,
+               b.subject, b.message, b.sent_at, 0,
+               (SELECT COUNT(*) FROM broadcast_reads br WHERE br.broadcast_id = b.id)
+        FROM broadcasts b
+        WHERE b.sender_id = ?1 AND b.sender_role = ?2
+          AND (?3 IS NULL OR b.sent_at < ?3 OR (b.sent_at = ?3 AND ('broadcast', b.id) < (?4, ?5)))
+        ORDER BY b.sent_at DESC, b.id DESC
+        LIMIT ?6
+    )
+"""
+
+# Unopened broadcasts of a student; direct messages are counted by the message_counters triggers
+UNREAD_BROADCASTS_QUERY = """
+    SELECT COUNT(*) AS count
+    FROM enrollments e
+    JOIN broadcasts b ON b.course_id = e.course_id AND b.semester = e.semester AND b.recipient_role = 'student'
+    WHERE e.student_id = ?
+      AND NOT EXISTS (SELECT 1 FROM broadcast_reads br
+                      WHERE br.broadcast_id = b.id AND br.recipient_id = e.student_id AND br.recipient_role = 'student')
+"""
+
+# Resolves the other party's display name once per row of the union
+PARTY_NAME = """
+    CASE
+        WHEN x.kind = 'broadcast' AND x.{role} = 'student' AND c.code IS NOT NULL THEN 'All students in ' || c.code
+        WHEN x.{role} = 'admin' THEN 'Administrator'
+        WHEN x.{role} = 'teacher' AND t.id IS NOT NULL THEN t.name
+        WHEN x.{role} = 'student' AND s.id IS NOT NULL THEN s.name
+        ELSE 'Unknown'
+    END
+"""
+
+def message_key(kind, message_id):
+    """Stable key of an inbox entry, e.g. "direct:12" or "broadcast:3" """
+    return f"{kind}:{message_id}"
+
+def send_messages(conn, sender_id, sender_role, recipient_ids, recipient_role, subject, message, course_id=None):
+    """Send the same direct message to several recipients with one executemany
+
+    Returns:
+        int: Number of messages written
+    """
+    rows = [(sender_id, sender_role, recipient_id, recipient_role, course_id, subject, message)
+            for recipient_id in recipient_ids]
+    conn.executemany("""
+        INSERT INTO messages
+        (sender_id, sender_role, recipient_id, recipient_role, course_id, subject, message)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, rows)
+    conn.commit()
+    return len(rows)
+
+def send_broadcast(conn, sender_id, sender_role, course_id, semester, subject, message):
+    """Send a message to every student enrolled in a course with a single row
+
+    Recipients are resolved from enrollments when inboxes are read and read
+    state rows are only written when a student opens the broadcast, so the
+    cost of sending does not depend on the class size.
+
+    Returns:
+        int: ID of the broadcast
+    """
+    cursor = conn.execute("""
+        INSERT INTO broadcasts (sender_id, sender_role, course_id, semester, subject, message)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, (sender_id, sender_role, course_id, semester, subject, message))
+    conn.commit()
+    return cursor.lastrowid
+
+def _fetch_page(conn, union, party_id, party_role, user_id, role, cursor, limit):
+    sent_at, kind, message_id = cursor or (None, None, None)
+    rows = conn.execute(f"""
+        SELECT x.*, c.code AS course_code, {PARTY_NAME.format(role=party_role)} AS party_name
+        FROM ({union}) x
+        LEFT JOIN teachers t ON x.{party_role} = 'teacher' AND t.id = x.{party_id}
+        LEFT JOIN students s ON x.{party_role} = 'student' AND s.id = x.{party_id}
+        LEFT JOIN courses c ON c.id = x.course_id
+        ORDER BY x.sent_at DESC, x.kind DESC, x.id DESC
+        LIMIT ?6
+    """, (user_id, role, sent_at, kind, message_id, limit + 1)).fetchall()
+    entries = [dict(row, key=message_key(row['kind'], row['id'])) for row in rows[:limit]]
+    # One extra row tells whether an older page exists
+    next_cursor = None
+    if len(rows) > limit:
+        last = entries[-1]
+        next_cursor = (last['sent_at'], last['kind'], last['id'])
+    return entries, next_cursor
+
+def get_inbox(conn, user_id, role, cursor=None, limit=INBOX_PAGE_SIZE):
+    """One page of the direct messages and course broadcasts received by a user, newest first
+
+    Pages are fetched by keyset: pass the cursor returned for the previous
+    page to get the next older one, so deep pages cost the same as the first.
+
+    Args:
+        conn: Open database connection
+        user_id: ID of the student/teacher (0 for admin)
+        role: 'student', 'teacher' or 'admin'
+        cursor: next_cursor of the previous page, or None for the newest page
+        limit: Entries per page
+
+    Returns:
+        tuple: (list of dicts with kind, id, key, sender_id, sender_role, course_id, course_code,
+                subject, message, sent_at, is_read and party_name (the sender),
+                cursor of the next older page or None)
+    """
+    return _fetch_page(conn, INBOX_QUERY, "sender_id", "sender_role", user_id, role, cursor, limit)
+
+def get_sent(conn, user_id, role, cursor=None, limit=INBOX_PAGE_SIZE):
+    """One page of the direct messages and broadcasts sent by a user, newest first
+
+    Returns:
+        tuple: (entries like get_inbox with party_name the recipient and read_count set
+                for broadcasts, cursor of the next older page or None)
+    """
+    return _fetch_page(conn, SENT_QUERY, "recipient_id", "recipient_role", user_id, role, cursor, limit)
+
+def count_unread(conn, user_id, role):
+    """Unread direct messages (maintained counter) plus unopened course broadcasts of a user"""
+    row = conn.execute(
+        "SELECT unread FROM message_counters WHERE user_id = ? AND user_role = ?", (user_id, role)
+    ).fetchone()
+    unread = row['unread'] if row else 0
+    if role == 'student':
+        unread += conn.execute(UNREAD_BROADCASTS_QUERY, (user_id,)).fetchone()['count']
+    return unread
+
+def mark_read(conn, kind, message_id, user_id, role):
+    """Mark a direct message or a broadcast as read by the user"""
+    if kind == "broadcast":
+        conn.execute("""
+            INSERT OR IGNORE INTO broadcast_reads (broadcast_id, recipient_id, recipient_role)
+            VALUES (?, ?, ?)
+        """, (message_id, user_id, role))
+    else:
+        conn.execute("""
+            UPDATE messages SET is_read = 1, read_at = datetime('now')
+            WHERE id = ? AND recipient_id = ? AND recipient_role = ? AND is_read = 0
+        """, (message_id, user_id, role))
+    conn.commit()
@@ -0,0 +1,210 @@
+import json
+from database.schema import get_db_connection
+from models.seats import begin_immediate
+
+# Events delivered per worker pass; the rest wait for the next pass
+NOTIFICATION_BATCH_SIZE = 200
+
+# Students below this attendance rate (after at least ATTENDANCE_MIN_CLASSES classes) are warned
+ATTENDANCE_THRESHOLD = 0.75
+ATTENDANCE_MIN_CLASSES = 3
+
+# Recipient queries (user_id, user_role) by audience; :course_id and :semester come from the event
+ENROLLED_STUDENTS = """
+    SELECT student_id AS user_id, 'student' AS user_role FROM enrollments
+    WHERE course_id = :course_id AND semester = :semester
+"""
+
+LOW_ATTENDANCE_STUDENTS = """
+    SELECT a.student_id AS user_id, 'student' AS user_role
+    FROM attendance a
+    JOIN enrollments e ON e.student_id = a.student_id AND e.course_id = a.course_id AND e.semester = :semester
+    WHERE a.course_id = :course_id
+    GROUP BY a.student_id
+    HAVING COUNT(*) >= :min_classes AND AVG(a.present) < :threshold
+"""
+
+EXAM_PARTICIPANTS = """
+    SELECT e.student_id AS user_id, 'student' AS user_role
+    FROM enrollments e
+    WHERE e.semester = :semester
+      AND e.course_id IN (SELECT course_id FROM exam_schedule WHERE session = :semester)
+    GROUP BY e.student_id
+    UNION
+    SELECT t.teacher_id, 'teacher'
+    FROM teaching t
+    WHERE t.semester = :semester
+      AND t.course_id IN (SELECT course_id FROM exam_schedule WHERE session = :semester)
+"""
+
+# Event type -> audience, text and the page the notification links to. Text is formatted with
+# the event payload plus course_code and semester.
+EVENT_TYPES = {
+    "assignment_published": {
+        "audience": ENROLLED_STUDENTS,
+        "title": "New assignment in {course_code}",
+        "message": "{title} is due on {due_date}.",
+        "link": "student_assignments"
+    },
+    "grade_finalized": {
+        "audience": ENROLLED_STUDENTS,
+        "title": "Grades finalized for {course_code}",
+        "message": "Your final marks for {course_code} ({semester}) are now available.",
+        "link": "student_grades"
+    },
+    "attendance_low": {
+        "audience": LOW_ATTENDANCE_STUDENTS,
+        "title": "Low attendance in {course_code}",
+        "message": "Your attendance in {course_code} is below {threshold_pct}%. Please attend the remaining classes.",
+        "link": "student_attendance"
+    },
+    "exam_scheduled": {
+        "audience": EXAM_PARTICIPANTS,
+        "title": "{exam_type} exam schedule published",
+        "message": "The {exam_type} exam schedule for {semester} has been published.",
+        "link": "dashboard"
+    }
+}
+
+# One notification per recipient and event; an unread notification with the same digest key is
+# updated in place (count and latest text) instead of adding another row
+FAN_OUT_QUERY = """
+    INSERT INTO notifications (user_id, user_role, title, message, link, event_type, digest_key)
+    SELECT user_id, user_role, :title_text, :message_text, :link, :event_type, :digest_key
+    FROM ({audience}) WHERE true
+    ON CONFLICT (user_id, user_role, digest_key) WHERE is_read = 0 AND digest_key IS NOT NULL
+    DO UPDATE SET event_count = event_count + 1, title = excluded.title,
+                  message = excluded.message, created_at = CURRENT_TIMESTAMP
+"""
+
+class _TextValues(dict):
+    """Format values that leave unknown placeholders blank instead of failing delivery"""
+    def __missing__(self, key):
+        return ""
+
+def queue_event(conn, event_type, course_id=None, semester=None, **payload):
+    """Queue a domain event for delivery by the notification worker
+
+    Only the event row is written, inside the caller's transaction, so the
+    event commits together with the change that caused it.
+
+    Args:
+        conn: Open database connection
+        event_type: Key of EVENT_TYPES
+        course_id: Course the event is about (None for session-wide events)
+        semester: Academic session name
+        **payload: Values used in the notification text, e.g. title and due_date
+
+    Raises:
+        ValueError: If event_type is unknown
+    """
+    if event_type not in EVENT_TYPES:
+        raise ValueError(f"Unknown notification event: {event_type}")
+    conn.execute(
+        "INSERT INTO notification_events (event_type, course_id, semester, payload) VALUES (?, ?, ?, ?)",
+        (event_type, course_id, semester, json.dumps(payload))
+    )
+
+def _fan_out(conn, event, course_codes):
+    """Write one event's notifications to its whole audience and return the rows written or coalesced"""
+    spec = EVENT_TYPES[event['event_type']]
+    payload = json.loads(event['payload'] or "{}")
+    values = _TextValues({
+        "course_code": course_codes.get(event['course_id'], ""),
+        "semester": event['semester'] or "",
+        "threshold_pct": int(ATTENDANCE_THRESHOLD * 100),
+        "exam_type": "Final",
+        **payload
+    })
+    digest_scope = event['course_id'] if event['course_id'] is not None else event['semester']
+    cursor = conn.execute(FAN_OUT_QUERY.format(audience=spec["audience"]), {
+        "course_id": event['course_id'],
+        "semester": event['semester'],
+        "threshold": ATTENDANCE_THRESHOLD,
+        "min_classes": ATTENDANCE_MIN_CLASSES,
+        "title_text": spec["title"].format_map(values),
+        "message_text": spec["message"].format_map(values),
+        "link": spec["link"],
+        "event_type": event['event_type'],
+        "digest_key": f"{event['event_type']}:{digest_scope}"
+    })
+    return cursor.rowcount
+
+def deliver_notifications(limit=NOTIFICATION_BATCH_SIZE):
+    """Fan queued events out to their recipients
+
+    Each event becomes one INSERT ... SELECT over its audience, so a course
+    announcement to hundreds of students is a single statement. Unread
+    notifications with the same digest key (event type and course) are
+    coalesced into one row with a count.
+
+    Returns:
+        dict: {"events": events delivered, "notifications": rows written or coalesced}
+    """
+    conn = get_db_connection()
+    try:
+        begin_immediate(conn)
+        events = conn.execute("""
+            SELECT id, event_type, course_id, semester, payload FROM notification_events
+            WHERE processed_at IS NULL
+            ORDER BY id
+            LIMIT ?
+        """, (limit,)).fetchall()
+        course_codes = {row['id']: row['code'] for row in conn.execute("""
+            SELECT id, code FROM courses
+            WHERE id IN (SELECT course_id FROM notification_events WHERE processed_at IS NULL)
+        """).fetchall()}
+
+        delivered = []
+        total = 0
+        for event in events:
+            recipients = _fan_out(conn, event, course_codes) if event['event_type'] in EVENT_TYPES else 0
+            delivered.append((recipients, event['id']))
+            total += recipients
+        conn.executemany(
+            "UPDATE notification_events SET processed_at = CURRENT_TIMESTAMP, recipients = ? WHERE id = ?",
+            delivered
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return {"events": len(events), "notifications": total}
+
+def get_notifications(conn, user_id, role, unread_only=False, limit=10):
+    """Newest notifications of a user, read from idx_notifications_unread
+
+    Returns:
+        list: dicts with id, title, message, link, event_count, is_read and created_at
+    """
+    read_filter = "AND is_read = 0" if unread_only else ""
+    return [dict(row) for row in conn.execute(f"""
+        SELECT id, title, message, link, event_count, is_read, created_at
+        FROM notifications
+        WHERE user_id = ? AND user_role = ? {read_filter}
+        ORDER BY created_at DESC, id DESC
+        LIMIT ?
+    """, (user_id, role, limit)).fetchall()]
+
+def count_unread_notifications(conn, user_id, role):
+    """Number of unread notifications of a user"""
+    return conn.execute(
+        "SELECT COUNT(*) AS count FROM notifications WHERE user_id = ? AND user_role = ? AND is_read = 0",
+        (user_id, role)
+    ).fetchone()['count']
+
+def mark_notifications_read(conn, user_id, role, notification_ids=None):
+    """Mark some (or all) of a user's unread notifications as read"""
+    if notification_ids is None:
+        conn.execute("""
+            UPDATE notifications SET is_read = 1, read_at = CURRENT_TIMESTAMP
+            WHERE user_id = ? AND user_role = ? AND is_read = 0
+        """, (user_id, role))
+    else:
+        conn.executemany("""
+            UPDATE notifications SET is_read = 1, read_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND user_id = ? AND user_role = ? AND is_read = 0
+        """, [(notification_id, user_id, role) for notification_id in notification_ids])
+    conn.commit()
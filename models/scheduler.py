@@ -0,0 +1,830 @@
+import json
+from datetime import datetime, timedelta
+from database.schema import get_db_connection
+from models.notifications import queue_event
+
+# Weekly teaching grid used by the class routine
+ROUTINE_DAYS = ["Sunday", "Monday", "Tuesday", "Wednesday", "Thursday"]
+ROUTINE_TIME_SLOTS = [
+    "8:00 AM - 9:30 AM",
+    "9:45 AM - 11:15 AM",
+    "11:30 AM - 1:00 PM",
+    "2:00 PM - 3:30 PM",
+    "3:45 PM - 5:15 PM"
+]
+ROUTINE_ROOMS = [f"Room {i:03d}" for i in range(101, 121)]
+
+MAX_CLASSES_PER_WEEK = 3
+
+def get_course_conflicts(conn, semester, course_ids=None):
+    """Build the sparse course co-enrollment graph for a semester
+
+    Two courses are adjacent when at least one student is enrolled in both.
+    The graph is computed with a single self-join on enrollments, which is
+    served by the (student_id, course_id, semester) unique index.
+
+    Args:
+        conn: Open database connection
+        semester: Semester name
+        course_ids: Optional iterable restricting the graph to these courses
+
+    Returns:
+        dict: course_id -> {neighbour_course_id: shared_student_count}
+    """
+    rows = conn.execute("""
+        SELECT e1.course_id as a, e2.course_id as b, COUNT(*) as shared
+        FROM enrollments e1
+        JOIN enrollments e2 ON e1.student_id = e2.student_id
+                           AND e2.semester = e1.semester
+                           AND e1.course_id < e2.course_id
+        WHERE e1.semester = ?
+        GROUP BY e1.course_id, e2.course_id
+    """, (semester,)).fetchall()
+
+    wanted = set(course_ids) if course_ids is not None else None
+    graph = {}
+    for row in rows:
+        a, b = row["a"], row["b"]
+        if wanted is not None and (a not in wanted or b not in wanted):
+            continue
+        graph.setdefault(a, {})[b] = row["shared"]
+        graph.setdefault(b, {})[a] = row["shared"]
+    return graph
+
+def _classes_per_week(credit):
+    """Weekly meetings for a course: one per credit hour, at least 1 and at most 3"""
+    return max(1, min(int(credit or 0), MAX_CLASSES_PER_WEEK))
+
+def _lowest_free_bit(mask, width):
+    """Index of the lowest zero bit of mask below width, or None"""
+    free = ~mask & ((1 << width) - 1)
+    if not free:
+        return None
+    return (free & -free).bit_length() - 1
+
+class RoutineScheduler:
+    """Constraint-based weekly routine builder
+
+    Every (day, time slot) pair is a bit position. Teachers, courses and
+    rooms each keep an integer bitset of the slots they already occupy, so
+    checking availability is a couple of bitwise operations. Sections are
+    placed most-constrained first (a DSatur-style graph colouring order),
+    and a class is only placed where the teacher, the room and every course
+    that shares students with it are free.
+    """
+
+    def __init__(self, days=None, time_slots=None, rooms=None, conflicts=None):
+        self.days = days or ROUTINE_DAYS
+        self.time_slots = time_slots or ROUTINE_TIME_SLOTS
+        self.rooms = rooms or ROUTINE_ROOMS
+        self.slot_count = len(self.days) * len(self.time_slots)
+        self.all_slots = (1 << self.slot_count) - 1
+        self.conflicts = conflicts or {}
+
+        self.teacher_busy = {}
+        self.course_busy = {}      # slots used by the course itself
+        self.blocked_for = {}      # slots used by courses sharing students
+        self.room_busy = [0] * self.slot_count   # per slot: bitset of used rooms
+        self.full_slots = 0                       # slots with no room left
+        self.slot_load = [0] * self.slot_count
+        self.entries = []
+
+    def slot_index(self, day, time_slot):
+        """Bit position of a (day, time slot) pair"""
+        return self.days.index(day) * len(self.time_slots) + self.time_slots.index(time_slot)
+
+    def slot_label(self, index):
+        """(day, time slot) for a bit position"""
+        return self.days[index // len(self.time_slots)], self.time_slots[index % len(self.time_slots)]
+
+    def day_mask(self, index):
+        """Bitset of every slot on the same day as a slot"""
+        per_day = len(self.time_slots)
+        day = index // per_day
+        return ((1 << per_day) - 1) << (day * per_day)
+
+    def _use_room(self, slot, room_index):
+        """Mark a room as taken in a slot and track slots whose rooms are all taken"""
+        self.room_busy[slot] |= 1 << room_index
+        if self.room_busy[slot] == (1 << len(self.rooms)) - 1:
+            self.full_slots |= 1 << slot
+
+    def occupy(self, course_id, teacher_id, slot, room_index):
+        """Mark a slot as used by a class and record the routine entry"""
+        bit = 1 << slot
+        self.teacher_busy[teacher_id] = self.teacher_busy.get(teacher_id, 0) | bit
+        self.course_busy[course_id] = self.course_busy.get(course_id, 0) | bit
+        for neighbour in self.conflicts.get(course_id, {}):
+            self.blocked_for[neighbour] = self.blocked_for.get(neighbour, 0) | bit
+        self._use_room(slot, room_index)
+        self.slot_load[slot] += 1
+
+        day, time_slot = self.slot_label(slot)
+        self.entries.append({
+            "course_id": course_id,
+            "teacher_id": teacher_id,
+            "day": day,
+            "time_slot": time_slot,
+            "room": self.rooms[room_index]
+        })
+
+    def load_existing(self, entries):
+        """Seed the bitsets with already scheduled classes (used for incremental repairs)"""
+        for entry in entries:
+            slot = self.slot_index(entry["day"], entry["time_slot"])
+            room_index = self.rooms.index(entry["room"]) if entry["room"] in self.rooms else None
+            bit = 1 << slot
+            self.teacher_busy[entry["teacher_id"]] = self.teacher_busy.get(entry["teacher_id"], 0) | bit
+            self.course_busy[entry["course_id"]] = self.course_busy.get(entry["course_id"], 0) | bit
+            for neighbour in self.conflicts.get(entry["course_id"], {}):
+                self.blocked_for[neighbour] = self.blocked_for.get(neighbour, 0) | bit
+            if room_index is not None:
+                self._use_room(slot, room_index)
+            self.slot_load[slot] += 1
+
+    def block(self, slots=0, rooms_by_slot=None):
+        """Make slots unavailable to everyone, or specific rooms unavailable in given slots"""
+        for slot in range(self.slot_count):
+            if slots >> slot & 1:
+                self.room_busy[slot] = (1 << len(self.rooms)) - 1
+                self.full_slots |= 1 << slot
+        for slot, room_names in (rooms_by_slot or {}).items():
+            for room in room_names:
+                if room in self.rooms:
+                    self._use_room(slot, self.rooms.index(room))
+
+    def free_slots(self, course_id, teacher_id, strict=True):
+        """Bitset of slots where a class of this section could go"""
+        busy = self.teacher_busy.get(teacher_id, 0) | self.course_busy.get(course_id, 0)
+        if strict:
+            busy |= self.blocked_for.get(course_id, 0)
+        return self.all_slots & ~busy & ~self.full_slots
+
+    def pick_slot(self, candidates, course_id):
+        """Choose a slot: prefer days the section does not meet yet, then the least loaded slot"""
+        used_days = 0
+        course_mask = self.course_busy.get(course_id, 0)
+        for slot in range(self.slot_count):
+            if course_mask >> slot & 1:
+                used_days |= self.day_mask(slot)
+        preferred = candidates & ~used_days or candidates
+
+        best, best_key = None, None
+        for slot in range(self.slot_count):
+            if preferred >> slot & 1:
+                key = (self.slot_load[slot], slot)
+                if best_key is None or key < best_key:
+                    best, best_key = slot, key
+        return best
+
+    def place(self, sections):
+        """Place every weekly class of the given sections
+
+        Args:
+            sections: List of dicts with course_id, teacher_id and classes (meetings per week)
+
+        Returns:
+            dict: {"placed": count, "unplaced": [section dicts with "missing"], "clashes": [...]}
+        """
+        # Most constrained first: many student conflicts and many meetings per week
+        ordered = sorted(
+            sections,
+            key=lambda s: (-len(self.conflicts.get(s["course_id"], {})), -s["classes"], s["course_id"], s["teacher_id"])
+        )
+
+        placed = 0
+        unplaced = []
+        clashes = []
+        for section in ordered:
+            course_id, teacher_id = section["course_id"], section["teacher_id"]
+            missing = 0
+            for _ in range(section["classes"]):
+                candidates = self.free_slots(course_id, teacher_id)
+                relaxed = False
+                if not candidates:
+                    # No clash-free slot left: fall back to one that only breaks student conflicts
+                    candidates = self.free_slots(course_id, teacher_id, strict=False)
+                    relaxed = True
+                slot = self.pick_slot(candidates, course_id) if candidates else None
+                if slot is None:
+                    missing += 1
+                    continue
+                room_index = _lowest_free_bit(self.room_busy[slot], len(self.rooms))
+                if relaxed:
+                    day, time_slot = self.slot_label(slot)
+                    clashes.append({"course_id": course_id, "day": day, "time_slot": time_slot})
+                self.occupy(course_id, teacher_id, slot, room_index)
+                placed += 1
+            if missing:
+                unplaced.append(dict(section, missing=missing))
+
+        return {"placed": placed, "unplaced": unplaced, "clashes": clashes}
+
+def build_sections(courses_with_teachers):
+    """Turn course/teacher rows (get_courses_with_teachers) into schedulable sections"""
+    sections = []
+    for row in courses_with_teachers:
+        sections.append({
+            "course_id": row["course_id"],
+            "teacher_id": row["teacher_id"],
+            "course_code": row["course_code"],
+            "teacher_name": row["teacher_name"],
+            "classes": _classes_per_week(row["credit"])
+        })
+    return sections
+
+def save_routine(conn, session_name, entries, replace=False):
+    """Write routine entries with one executemany in a single transaction
+
+    Args:
+        conn: Open database connection
+        session_name: Academic session name
+        entries: Routine entry dicts (course_id, teacher_id, day, time_slot, room)
+        replace: If True, the session's existing routine is deleted first
+    """
+    try:
+        if replace:
+            conn.execute("DELETE FROM class_routine WHERE session = ?", (session_name,))
+        conn.executemany(
+            """INSERT INTO class_routine (course_id, teacher_id, day, time_slot, room, session)
+               VALUES (?, ?, ?, ?, ?, ?)""",
+            [(e["course_id"], e["teacher_id"], e["day"], e["time_slot"], e["room"], session_name) for e in entries]
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+def schedule_routine(conn, courses_with_teachers, session_name, rooms=None, replace=True):
+    """Generate and store a conflict-free weekly routine for a session
+
+    Args:
+        conn: Open database connection
+        courses_with_teachers: Rows with course_id, course_code, credit, teacher_id, teacher_name
+        session_name: Academic session name
+        rooms: Optional list of room names (defaults to ROUTINE_ROOMS)
+        replace: If True, the session's existing routine is replaced
+
+    Returns:
+        dict: Report with placed count, unplaced sections and student clashes
+    """
+    sections = build_sections(courses_with_teachers)
+    conflicts = get_course_conflicts(conn, session_name, {s["course_id"] for s in sections})
+
+    scheduler = RoutineScheduler(rooms=rooms, conflicts=conflicts)
+    report = scheduler.place(sections)
+    save_routine(conn, session_name, scheduler.entries, replace=replace)
+
+    report["entries"] = len(scheduler.entries)
+    return report
+
+def generate_routine_for_session(session_name):
+    """Convenience wrapper that loads the session's teaching assignments and schedules them"""
+    conn = get_db_connection()
+    try:
+        courses_with_teachers = conn.execute("""
+            SELECT c.id as course_id, c.code as course_code, c.credit_hour as credit,
+                   t.id as teacher_id, t.name as teacher_name
+            FROM teaching te
+            JOIN courses c ON c.id = te.course_id
+            JOIN teachers t ON t.id = te.teacher_id
+            WHERE te.semester = ?
+        """, (session_name,)).fetchall()
+        return schedule_routine(conn, courses_with_teachers, session_name)
+    finally:
+        conn.close()
+
+# Exam timetable defaults
+EXAM_SLOTS = [
+    ("9:00 AM", "11:00 AM"),
+    ("12:00 PM", "2:00 PM"),
+    ("3:00 PM", "5:00 PM")
+]
+EXAM_HALLS = {f"Exam Hall {i:02d}": 60 for i in range(1, 11)}
+EXAM_WEEKDAYS = [0, 1, 2, 3, 4]  # Monday to Friday
+MAX_EXAM_DAYS = 30
+
+def get_exam_sizes(conn, semester, courses):
+    """Seats each course's exam needs
+
+    Uses the number of enrolled students for the semester, falling back to
+    the course's max_students when nobody is enrolled yet.
+
+    Returns:
+        dict: course_id -> seats
+    """
+    counts = {
+        row["course_id"]: row["enrolled"]
+        for row in conn.execute(
+            "SELECT course_id, COUNT(*) as enrolled FROM enrollments WHERE semester = ? GROUP BY course_id",
+            (semester,)
+        ).fetchall()
+    }
+    return {c["id"]: counts.get(c["id"]) or c["capacity"] or 0 for c in courses}
+
+class ExamScheduler:
+    """Exam timetabling by DSatur colouring of the course conflict graph
+
+    A period is one exam slot on one exam day. Courses are coloured with
+    periods in saturation order (the course whose neighbours already occupy
+    the most distinct periods goes next), choosing for each the period with
+    no student clash, then the fewest students sitting back-to-back exams,
+    then the lightest load. Seats are packed into halls per period, largest
+    free hall first, so a course may span several halls and several small
+    courses may share one.
+    """
+
+    def __init__(self, conflicts=None, halls=None, slots_per_day=len(EXAM_SLOTS),
+                 max_days=MAX_EXAM_DAYS, max_exams_per_day=None, new_day_cost=5):
+        self.conflicts = conflicts or {}
+        self.halls = dict(halls or EXAM_HALLS)
+        self.total_seats = sum(self.halls.values())
+        self.slots_per_day = slots_per_day
+        self.max_days = max_days
+        self.max_exams_per_day = max_exams_per_day
+        self.new_day_cost = new_day_cost
+
+        self.day_count = 0
+        self.free_seats = []       # per period: {hall: seats left}
+        self.day_exams = []        # per day: number of exams
+        self.period_of = {}
+        self.blocked = {}          # course_id -> bitset of periods used by its neighbours
+        self.standing_blocks = []  # (slot or None, hall or None) closed on every day
+        self.day_blocks = {}       # day index -> [(slot or None, hall or None)] closed on that day only
+        self.seated = 0
+
+    def open_day(self):
+        """Add one more exam day with every hall free except standing and day blocks"""
+        self.day_count += 1
+        self.day_exams.append(0)
+        for _ in range(self.slots_per_day):
+            self.free_seats.append(dict(self.halls))
+        first = (self.day_count - 1) * self.slots_per_day
+        for slot, hall in self.standing_blocks + self.day_blocks.get(self.day_count - 1, []):
+            for period in range(first, first + self.slots_per_day):
+                if slot is None or period - first == slot:
+                    self.block(period, hall)
+
+    def block(self, period, hall=None):
+        """Close one hall, or every hall, in a period"""
+        for name in ([hall] if hall else list(self.free_seats[period])):
+            if name in self.free_seats[period]:
+                self.free_seats[period][name] = 0
+
+    def load_existing(self, entries, sizes):
+        """Seed the timetable with already scheduled exams (used for incremental repairs)
+
+        Args:
+            entries: Dicts with course_id, period and halls
+            sizes: dict course_id -> seats, taken from the listed halls in order
+        """
+        for entry in entries:
+            period = entry["period"]
+            while period >= self.day_count * self.slots_per_day:
+                self.open_day()
+            self.period_of[entry["course_id"]] = period
+            self.day_exams[period // self.slots_per_day] += 1
+            for neighbour in self.conflicts.get(entry["course_id"], {}):
+                self.blocked[neighbour] = self.blocked.get(neighbour, 0) | (1 << period)
+            seats = sizes.get(entry["course_id"], 0)
+            for hall in entry["halls"]:
+                take = min(self.free_seats[period].get(hall, 0), seats)
+                self.free_seats[period][hall] -= take
+                self.seated += take
+                seats -= take
+
+    def _costs(self, course_id, period):
+        """Students clashing with and sitting back-to-back to this course in a period"""
+        clash = back_to_back = 0
+        day = period // self.slots_per_day
+        for neighbour, shared in self.conflicts.get(course_id, {}).items():
+            other = self.period_of.get(neighbour)
+            if other is None:
+                continue
+            if other == period:
+                clash += shared
+            elif abs(other - period) == 1 and other // self.slots_per_day == day:
+                back_to_back += shared
+        return clash, back_to_back
+
+    def _period_key(self, course_id, period, seats):
+        """Ranking key of a period for a course, or None if it lacks seats or its day is full"""
+        day = period // self.slots_per_day
+        free = sum(self.free_seats[period].values())
+        if free < seats:
+            return None
+        if self.max_exams_per_day and self.day_exams[day] >= self.max_exams_per_day:
+            return None
+        clash, back_to_back = self._costs(course_id, period)
+        return (clash, back_to_back, self.total_seats - free, period)
+
+    def _pick_period(self, course_id, seats):
+        """Best period for a course, opening a new exam day if that is cheaper"""
+        keys = [self._period_key(course_id, period, seats) for period in range(self.day_count * self.slots_per_day)]
+        best_key = min((key for key in keys if key), default=None)
+
+        can_open = self.day_count < self.max_days
+        if can_open and (best_key is None or best_key[0] > 0 or best_key[1] > self.new_day_cost):
+            self.open_day()
+            first = (self.day_count - 1) * self.slots_per_day
+            new_keys = [self._period_key(course_id, period, seats) for period in range(first, first + self.slots_per_day)]
+            new_key = min((key for key in new_keys if key), default=None)
+            if new_key:
+                return new_key[-1]
+            # Standing blocks leave the fresh day as short of seats as every later one would be
+            self._close_last_day()
+        return best_key[-1] if best_key else None
+
+    def _close_last_day(self):
+        """Drop the most recently opened exam day, which must still be empty"""
+        self.day_count -= 1
+        self.day_exams.pop()
+        del self.free_seats[-self.slots_per_day:]
+
+    def _assign_halls(self, period, seats):
+        """Take seats from the halls with the most free seats first"""
+        assigned = []
+        free = self.free_seats[period]
+        for hall in sorted(free, key=lambda h: (-free[h], h)):
+            if seats <= 0:
+                break
+            take = min(free[hall], seats)
+            if take > 0:
+                free[hall] -= take
+                self.seated += take
+                seats -= take
+                assigned.append(hall)
+        return assigned
+
+    def place(self, courses, sizes):
+        """Schedule every course's exam
+
+        Args:
+            courses: List of dicts with at least "id" and "code"
+            sizes: dict course_id -> seats needed
+
+        Returns:
+            dict: Report with "entries" (course_id, period, halls), "unplaced" and quality counts
+        """
+        pending = {c["id"]: c for c in courses}
+        degree = {cid: sum(self.conflicts.get(cid, {}).values()) for cid in pending}
+        entries = []
+        unplaced = []
+
+        while pending:
+            course_id = max(
+                pending,
+                key=lambda cid: (self.blocked.get(cid, 0).bit_count(), degree[cid], sizes.get(cid, 0), -cid)
+            )
+            course = pending.pop(course_id)
+            seats = sizes.get(course_id, 0)
+
+            period = None if seats > self.total_seats else self._pick_period(course_id, seats)
+            if period is None:
+                reason = "needs more seats than all halls together" if seats > self.total_seats else "no period with enough free seats"
+                unplaced.append({"course_id": course_id, "code": course["code"], "seats": seats, "reason": reason})
+                continue
+
+            self.period_of[course_id] = period
+            self.day_exams[period // self.slots_per_day] += 1
+            for neighbour in self.conflicts.get(course_id, {}):
+                self.blocked[neighbour] = self.blocked.get(neighbour, 0) | (1 << period)
+            entries.append({"course_id": course_id, "period": period, "halls": self._assign_halls(period, seats)})
+
+        return {"entries": entries, "unplaced": unplaced, **self.quality()}
+
+    def quality(self):
+        """Clash, back-to-back and seat utilisation figures for the current timetable"""
+        clashes = back_to_back = 0
+        for course_id, period in self.period_of.items():
+            for neighbour, shared in self.conflicts.get(course_id, {}).items():
+                other = self.period_of.get(neighbour)
+                if other is None or neighbour < course_id:
+                    continue
+                if other == period:
+                    clashes += shared
+                elif abs(other - period) == 1 and other // self.slots_per_day == period // self.slots_per_day:
+                    back_to_back += shared
+
+        periods_used = len(set(self.period_of.values()))
+        return {
+            "scheduled": len(self.period_of),
+            "days": self.day_count,
+            "student_clashes": clashes,
+            "back_to_back": back_to_back,
+            "seat_utilisation": round(self.seated / (periods_used * self.total_seats) * 100, 1) if periods_used else 0.0
+        }
+
+def exam_dates(start_date, count, weekdays=EXAM_WEEKDAYS, skip=()):
+    """The first ``count`` exam dates on or after start_date that fall on allowed weekdays"""
+    dates = []
+    current = start_date
+    while len(dates) < count:
+        if current.weekday() in weekdays and current.strftime("%Y-%m-%d") not in skip:
+            dates.append(current.strftime("%Y-%m-%d"))
+        current += timedelta(days=1)
+    return dates
+
+def has_exam_type_column(conn):
+    """Whether exam_schedule has the exam_type column (older page-created tables lack it)"""
+    return conn.execute(
+        "SELECT COUNT(*) FROM pragma_table_info('exam_schedule') WHERE name = 'exam_type'"
+    ).fetchone()[0] > 0
+
+def save_exam_schedule(conn, session_name, rows, exam_type="Final", replace=True):
+    """Write exam rows with one executemany in a single transaction
+
+    Args:
+        conn: Open database connection
+        session_name: Academic session name
+        rows: Dicts with course_id, exam_date, start_time, end_time, room
+        exam_type: Exam type stored with every row, e.g. "Midterm" or "Final"
+        replace: If True, the session's existing exams of this type are deleted first
+    """
+    try:
+        if replace:
+            conn.execute("DELETE FROM exam_schedule WHERE session = ? AND exam_type = ?", (session_name, exam_type))
+        conn.executemany(
+            """INSERT INTO exam_schedule (course_id, exam_date, start_time, end_time, room, exam_type, session)
+               VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            [(r["course_id"], r["exam_date"], r["start_time"], r["end_time"], r["room"], exam_type, session_name)
+             for r in rows]
+        )
+        if rows:
+            queue_event(conn, "exam_scheduled", semester=session_name, exam_type=exam_type)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+def schedule_exams(conn, courses, session_name, exam_type="Final", start_date=None,
+                   halls=None, max_exams_per_day=None):
+    """Generate and store a conflict-aware exam timetable for a session
+
+    Args:
+        conn: Open database connection
+        courses: Course rows with id, code and capacity (max_students)
+        session_name: Academic session name
+        exam_type: Exam type to write, e.g. "Midterm" or "Final"
+        start_date: First possible exam day (defaults to two weeks from today)
+        halls: Optional {hall name: seats} mapping (defaults to EXAM_HALLS)
+        max_exams_per_day: Optional cap on exams per day
+
+    Returns:
+        dict: Quality report with scheduled, unplaced, days, student_clashes,
+              back_to_back and seat_utilisation
+    """
+    if start_date is None:
+        start_date = (datetime.now() + timedelta(days=14)).replace(hour=0, minute=0, second=0, microsecond=0)
+
+    courses = [dict(c) for c in courses]
+    sizes = get_exam_sizes(conn, session_name, courses)
+    conflicts = get_course_conflicts(conn, session_name, sizes.keys())
+
+    scheduler = ExamScheduler(conflicts, halls=halls, max_exams_per_day=max_exams_per_day)
+    report = scheduler.place(courses, sizes)
+
+    dates = exam_dates(start_date, scheduler.day_count)
+    rows = []
+    for entry in report.pop("entries"):
+        day, slot = divmod(entry["period"], scheduler.slots_per_day)
+        start_time, end_time = EXAM_SLOTS[slot]
+        rows.append({
+            "course_id": entry["course_id"],
+            "exam_date": dates[day],
+            "start_time": start_time,
+            "end_time": end_time,
+            "room": ", ".join(entry["halls"]) or next(iter(scheduler.halls))
+        })
+    save_exam_schedule(conn, session_name, rows, exam_type)
+
+    if dates:
+        report["first_date"], report["last_date"] = dates[0], dates[-1]
+    return report
+
+def get_schedule_blocks(conn, session_name, schedule):
+    """Blocks stored for a session's "routine" or "exam" schedule, oldest first"""
+    return [json.loads(row["block"]) for row in conn.execute(
+        "SELECT block FROM schedule_blocks WHERE session = ? AND schedule = ? ORDER BY id",
+        (session_name, schedule)
+    ).fetchall()]
+
+def _merge_blocks(conn, session_name, schedule, blocked):
+    """Store new blocks (without committing) and return every block of the schedule"""
+    conn.executemany(
+        "INSERT OR IGNORE INTO schedule_blocks (session, schedule, block) VALUES (?, ?, ?)",
+        [(session_name, schedule, json.dumps(block, sort_keys=True)) for block in blocked or []]
+    )
+    return get_schedule_blocks(conn, session_name, schedule)
+
+def clear_schedule_blocks(conn, session_name, schedule):
+    """Lift every stored block of a session's "routine" or "exam" schedule"""
+    conn.execute("DELETE FROM schedule_blocks WHERE session = ? AND schedule = ?", (session_name, schedule))
+    conn.commit()
+
+def _matches_block(entry, blocked):
+    """True if a row falls inside any blocked cell; every key a block gives must match"""
+    return any(all(entry.get(key) == value for key, value in block.items()) for block in blocked)
+
+def repair_routine(conn, session_name, blocked=None):
+    """Bring an existing routine in line with the current teaching assignments
+
+    Only affected classes change: rows of sections that no longer exist or
+    that sit in a blocked cell are dropped (or handed to the course's new
+    teacher in place when that teacher is free), and sections that are now
+    short of classes, such as new courses or new teachers, are placed around
+    everything that is kept. Unaffected rows are left untouched.
+
+    Args:
+        conn: Open database connection
+        session_name: Academic session name
+        blocked: Optional list of new blocks, each a dict with any of "day",
+                 "time_slot" and "room", e.g. {"room": "Room 105", "day": "Monday"}.
+                 They are stored and applied together with the session's earlier blocks.
+
+    Returns:
+        dict: Counts of kept, removed, reassigned and placed classes plus
+              the unplaced sections and student clashes of newly placed classes
+    """
+    blocked = _merge_blocks(conn, session_name, "routine", blocked)
+    sections = build_sections(conn.execute("""
+        SELECT c.id as course_id, c.code as course_code, c.credit_hour as credit,
+               t.id as teacher_id, t.name as teacher_name
+        FROM teaching te
+        JOIN courses c ON c.id = te.course_id
+        JOIN teachers t ON t.id = te.teacher_id
+        WHERE te.semester = ?
+    """, (session_name,)).fetchall())
+    needed = {(s["course_id"], s["teacher_id"]): s for s in sections}
+    existing = [dict(row) for row in conn.execute(
+        "SELECT id, course_id, teacher_id, day, time_slot, room FROM class_routine WHERE session = ? ORDER BY id",
+        (session_name,)
+    ).fetchall()]
+
+    conflicts = get_course_conflicts(conn, session_name, {s["course_id"] for s in sections})
+    scheduler = RoutineScheduler(conflicts=conflicts)
+
+    kept, orphaned, removed = [], [], []
+    have = {}
+    for entry in existing:
+        key = (entry["course_id"], entry["teacher_id"])
+        in_grid = entry["day"] in scheduler.days and entry["time_slot"] in scheduler.time_slots
+        if not in_grid or _matches_block(entry, blocked):
+            removed.append(entry)
+        elif key not in needed:
+            orphaned.append(entry)
+        elif have.get(key, 0) >= needed[key]["classes"]:
+            removed.append(entry)
+        else:
+            have[key] = have.get(key, 0) + 1
+            kept.append(entry)
+    scheduler.load_existing(kept)
+
+    # A class whose teacher changed keeps its slot and room if the new teacher is free then
+    reassigned = []
+    for entry in orphaned:
+        slot = scheduler.slot_index(entry["day"], entry["time_slot"])
+        for key, section in needed.items():
+            if key[0] != entry["course_id"] or have.get(key, 0) >= section["classes"]:
+                continue
+            if scheduler.teacher_busy.get(key[1], 0) >> slot & 1:
+                continue
+            entry["teacher_id"] = key[1]
+            have[key] = have.get(key, 0) + 1
+            scheduler.load_existing([entry])
+            reassigned.append(entry)
+            break
+        else:
+            removed.append(entry)
+
+    for block in blocked:
+        for slot in range(scheduler.slot_count):
+            day, time_slot = scheduler.slot_label(slot)
+            if block.get("day", day) != day or block.get("time_slot", time_slot) != time_slot:
+                continue
+            if "room" in block:
+                scheduler.block(rooms_by_slot={slot: [block["room"]]})
+            else:
+                scheduler.block(slots=1 << slot)
+
+    missing = [dict(s, classes=s["classes"] - have.get(key, 0)) for key, s in needed.items() if have.get(key, 0) < s["classes"]]
+    report = scheduler.place(missing)
+
+    try:
+        conn.executemany("DELETE FROM class_routine WHERE id = ?", [(e["id"],) for e in removed])
+        conn.executemany(
+            "UPDATE class_routine SET teacher_id = ? WHERE id = ?",
+            [(e["teacher_id"], e["id"]) for e in reassigned]
+        )
+        save_routine(conn, session_name, scheduler.entries)
+    except Exception:
+        conn.rollback()
+        raise
+
+    report.update({
+        "kept": len(kept),
+        "removed": len(removed),
+        "reassigned": len(reassigned),
+        "entries": len(scheduler.entries)
+    })
+    return report
+
+def repair_exam_schedule(conn, courses, session_name, exam_type="Final", blocked=None, start_date=None):
+    """Update an existing exam timetable without moving unaffected exams
+
+    Exams of courses that are no longer in ``courses`` or that fall in a
+    blocked date/slot/hall are dropped, and every course without an exam is
+    placed into the remaining capacity, on the existing exam days where
+    possible and on extra days after the last one otherwise.
+
+    Args:
+        conn: Open database connection
+        courses: Course rows with id, code and capacity (max_students)
+        session_name: Academic session name
+        exam_type: Exam type being repaired
+        blocked: Optional list of new blocks, each a dict with any of "exam_date",
+                 "start_time" and "room" (a single hall name). They are stored and
+                 applied together with the session's earlier blocks (for every exam type).
+        start_date: First exam day when the session has no exams yet
+
+    Returns:
+        dict: Quality report for the whole timetable plus kept, removed and placed counts
+    """
+    blocked = _merge_blocks(conn, session_name, "exam", blocked)
+    courses = [dict(c) for c in courses]
+    by_id = {c["id"]: c for c in courses}
+    sizes = get_exam_sizes(conn, session_name, courses)
+    conflicts = get_course_conflicts(conn, session_name, sizes.keys())
+    scheduler = ExamScheduler(conflicts)
+    starts = [start for start, _ in EXAM_SLOTS]
+    dated = [b for b in blocked if "exam_date" in b]
+    scheduler.standing_blocks = [
+        (starts.index(b["start_time"]) if "start_time" in b else None, b.get("room"))
+        for b in blocked if "exam_date" not in b and b.get("start_time", starts[0]) in starts
+    ]
+
+    existing = [dict(row) for row in conn.execute(
+        "SELECT id, course_id, exam_date, start_time, room FROM exam_schedule WHERE session = ? AND exam_type = ?",
+        (session_name, exam_type)
+    ).fetchall()]
+
+    kept, removed = [], []
+    placed_ids = set()
+    for entry in existing:
+        halls = [hall for hall in entry["room"].split(", ") if hall in scheduler.halls]
+        in_block = any(_matches_block(dict(entry, room=hall), blocked) for hall in halls)
+        if entry["course_id"] not in by_id or entry["start_time"] not in starts or in_block or entry["course_id"] in placed_ids:
+            removed.append(entry)
+        else:
+            placed_ids.add(entry["course_id"])
+            kept.append(dict(entry, halls=halls))
+
+    # Existing exam days keep their positions; new days are appended after the last one
+    blocked_dates = {b["exam_date"] for b in dated if set(b) == {"exam_date"}}
+    existing_dates = sorted({e["exam_date"] for e in existing})
+    dates = list(existing_dates)
+    if not dates:
+        if start_date is None:
+            start_date = (datetime.now() + timedelta(days=14)).replace(hour=0, minute=0, second=0, microsecond=0)
+        first = start_date
+    else:
+        first = datetime.strptime(dates[-1], "%Y-%m-%d") + timedelta(days=1)
+    # Dates of the days place() may open, known up front so their blocks apply too
+    dates += exam_dates(first, max(scheduler.max_days - len(dates), 0), skip=blocked_dates)
+    for block in dated:
+        if block["exam_date"] in dates and block.get("start_time", starts[0]) in starts:
+            scheduler.day_blocks.setdefault(dates.index(block["exam_date"]), []).append(
+                (starts.index(block["start_time"]) if "start_time" in block else None, block.get("room"))
+            )
+    for _ in existing_dates:
+        scheduler.open_day()
+
+    scheduler.load_existing(
+        [{"course_id": e["course_id"], "period": dates.index(e["exam_date"]) * scheduler.slots_per_day
+          + starts.index(e["start_time"]), "halls": e["halls"]} for e in kept],
+        sizes
+    )
+
+    report = scheduler.place([c for c in courses if c["id"] not in placed_ids], sizes)
+
+    rows = []
+    for entry in report.pop("entries"):
+        day, slot = divmod(entry["period"], scheduler.slots_per_day)
+        start_time, end_time = EXAM_SLOTS[slot]
+        rows.append({
+            "course_id": entry["course_id"],
+            "exam_date": dates[day],
+            "start_time": start_time,
+            "end_time": end_time,
+            "room": ", ".join(entry["halls"]) or next(iter(scheduler.halls))
+        })
+
+    try:
+        conn.executemany("DELETE FROM exam_schedule WHERE id = ?", [(e["id"],) for e in removed])
+        save_exam_schedule(conn, session_name, rows, exam_type, replace=False)
+    except Exception:
+        conn.rollback()
+        raise
+
+    report.update({"kept": len(kept), "removed": len(removed), "placed": len(rows)})
+    return report
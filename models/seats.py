@@ -0,0 +1,240 @@
+from datetime import datetime
+from database.schema import get_db_connection
+
+# Condition used by every seat-taking INSERT: the (course, semester) counter must be
+# below the course capacity. A NULL max_students means the course is unlimited.
+HAS_FREE_SEAT = """
+    COALESCE((SELECT enrolled_count FROM course_seats WHERE course_id = ? AND semester = ?), 0)
+    < COALESCE((SELECT max_students FROM courses WHERE id = ?), 1e18)
+"""
+
+def begin_immediate(conn):
+    """Start a write transaction so the seat check and insert cannot interleave with other sessions"""
+    if not conn.in_transaction:
+        conn.execute("BEGIN IMMEDIATE")
+
+def get_seat_availability(conn, course_ids, semester):
+    """Get capacity, enrolled and waitlisted counts for courses from the seat counters
+
+    Args:
+        conn: Open database connection
+        course_ids: List of course IDs
+        semester: Semester name
+
+    Returns:
+        dict: course_id -> {"capacity", "enrolled", "available", "waitlisted"}
+    """
+    if not course_ids:
+        return {}
+
+    placeholders = ", ".join("?" for _ in course_ids)
+    rows = conn.execute(f"""
+        SELECT c.id, c.max_students,
+               COALESCE(cs.enrolled_count, 0) as enrolled,
+               (SELECT COUNT(*) FROM waitlist w
+                WHERE w.course_id = c.id AND w.semester = ? AND w.status = 'waiting') as waitlisted
+        FROM courses c
+        LEFT JOIN course_seats cs ON cs.course_id = c.id AND cs.semester = ?
+        WHERE c.id IN ({placeholders})
+    """, [semester, semester] + list(course_ids)).fetchall()
+
+    availability = {}
+    for row in rows:
+        capacity = row["max_students"]
+        availability[row["id"]] = {
+            "capacity": capacity,
+            "enrolled": row["enrolled"],
+            "available": None if capacity is None else max(capacity - row["enrolled"], 0),
+            "waitlisted": row["waitlisted"]
+        }
+    return availability
+
+def _try_enroll(conn, student_id, course_id, semester):
+    """Insert an enrollment only if a seat is free, returning True on success"""
+    cursor = conn.execute(f"""
+        INSERT OR IGNORE INTO enrollments (student_id, course_id, semester)
+        SELECT ?, ?, ? WHERE {HAS_FREE_SEAT}
+    """, (student_id, course_id, semester, course_id, semester, course_id))
+    return cursor.rowcount > 0
+
+def join_waitlist(conn, entries, semester):
+    """Queue (student_id, course_id) pairs on course waitlists without committing
+
+    A promoted or cancelled entry from an earlier wait is replaced by a fresh
+    one at the back of the queue; a student who is already waiting keeps
+    their place.
+
+    Returns:
+        int: Number of students newly queued
+    """
+    rows = [(student_id, course_id, semester) for student_id, course_id in entries]
+    conn.executemany(
+        "DELETE FROM waitlist WHERE student_id = ? AND course_id = ? AND semester = ? AND status != 'waiting'",
+        rows
+    )
+    cursor = conn.executemany(
+        "INSERT OR IGNORE INTO waitlist (student_id, course_id, semester) VALUES (?, ?, ?)",
+        rows
+    )
+    return max(cursor.rowcount, 0)
+
+def fill_from_waitlist(conn, course_id, semester):
+    """Move waiting students into freed seats, oldest first, without committing"""
+    promoted = []
+    waiting = conn.execute(
+        "SELECT id, student_id FROM waitlist WHERE course_id = ? AND semester = ? AND status = 'waiting' ORDER BY id",
+        (course_id, semester)
+    ).fetchall()
+
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    for entry in waiting:
+        if not _try_enroll(conn, entry["student_id"], course_id, semester):
+            already = conn.execute(
+                "SELECT 1 FROM enrollments WHERE student_id = ? AND course_id = ? AND semester = ?",
+                (entry["student_id"], course_id, semester)
+            ).fetchone()
+            if not already:
+                break  # Course is full again
+        conn.execute(
+            "UPDATE waitlist SET status = 'promoted', promoted_at = ? WHERE id = ?",
+            (now, entry["id"])
+        )
+        promoted.append(entry["student_id"])
+
+    return promoted
+
+def reserve_seat(student_id, course_id, semester, waitlist=True, conn=None):
+    """Enroll a student if a seat is free, otherwise optionally waitlist them
+
+    The capacity check and the insert are a single statement guarded by the
+    course_seats counter, so concurrent admin sessions cannot oversell a course.
+
+    Args:
+        student_id: ID of the student
+        course_id: ID of the course
+        semester: Semester name
+        waitlist: If True, a student who finds the course full joins its waitlist
+        conn: Optional open connection to reuse
+
+    Returns:
+        dict: {"status": "enrolled" | "already_enrolled" | "waitlisted" | "full",
+               "position": waitlist position when waitlisted}
+    """
+    own_conn = conn is None
+    conn = conn or get_db_connection()
+    result = {"status": "full", "position": None}
+    try:
+        begin_immediate(conn)
+        if _try_enroll(conn, student_id, course_id, semester):
+            result["status"] = "enrolled"
+            conn.execute(
+                "DELETE FROM waitlist WHERE student_id = ? AND course_id = ? AND semester = ?",
+                (student_id, course_id, semester)
+            )
+        elif conn.execute(
+            "SELECT 1 FROM enrollments WHERE student_id = ? AND course_id = ? AND semester = ?",
+            (student_id, course_id, semester)
+        ).fetchone():
+            result["status"] = "already_enrolled"
+        elif waitlist:
+            join_waitlist(conn, [(student_id, course_id)], semester)
+            result["status"] = "waitlisted"
+            result["position"] = conn.execute("""
+                SELECT COUNT(*) FROM waitlist
+                WHERE course_id = ? AND semester = ? AND status = 'waiting'
+                  AND id <= (SELECT id FROM waitlist WHERE student_id = ? AND course_id = ? AND semester = ?)
+            """, (course_id, semester, student_id, course_id, semester)).fetchone()[0]
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        if own_conn:
+            conn.close()
+
+    return result
+
+def release_seat(student_id, course_id, semester, promote=True, conn=None):
+    """Remove an enrollment and hand the freed seat to the next waitlisted student
+
+    Args:
+        student_id: ID of the student
+        course_id: ID of the course
+        semester: Semester name
+        promote: If True, waitlisted students are enrolled into the freed seat
+        conn: Optional open connection to reuse
+
+    Returns:
+        dict: {"removed": bool, "promoted": list of promoted student IDs}
+    """
+    own_conn = conn is None
+    conn = conn or get_db_connection()
+    try:
+        begin_immediate(conn)
+        cursor = conn.execute(
+            "DELETE FROM enrollments WHERE student_id = ? AND course_id = ? AND semester = ?",
+            (student_id, course_id, semester)
+        )
+        conn.execute(
+            "UPDATE waitlist SET status = 'cancelled' WHERE student_id = ? AND course_id = ? AND semester = ? AND status = 'waiting'",
+            (student_id, course_id, semester)
+        )
+        promoted = fill_from_waitlist(conn, course_id, semester) if promote else []
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        if own_conn:
+            conn.close()
+
+    return {"removed": cursor.rowcount > 0, "promoted": promoted}
+
+def promote_waitlist(course_id, semester, conn=None):
+    """Fill any free seats in a course from its waitlist
+
+    Args:
+        course_id: ID of the course
+        semester: Semester name
+        conn: Optional open connection to reuse
+
+    Returns:
+        list: IDs of the students that were enrolled
+    """
+    own_conn = conn is None
+    conn = conn or get_db_connection()
+    try:
+        begin_immediate(conn)
+        promoted = fill_from_waitlist(conn, course_id, semester)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        if own_conn:
+            conn.close()
+
+    return promoted
+
+def get_waitlist(conn, course_id, semester):
+    """Get the waiting students for a course in queue order"""
+    return conn.execute("""
+        SELECT w.id, w.student_id, s.student_id as student_code, s.name, w.created_at
+        FROM waitlist w
+        JOIN students s ON w.student_id = s.id
+        WHERE w.course_id = ? AND w.semester = ? AND w.status = 'waiting'
+        ORDER BY w.id
+    """, (course_id, semester)).fetchall()
+
+def rebuild_seat_counters(conn):
+    """Recompute every course_seats counter from the enrollments table
+
+    Only needed to repair counters after enrollments were edited with the
+    triggers disabled, e.g. by restoring a backup of a single table.
+    """
+    conn.execute("DELETE FROM course_seats")
+    conn.execute("""
+        INSERT INTO course_seats (course_id, semester, enrolled_count)
+        SELECT course_id, semester, COUNT(*) FROM enrollments GROUP BY course_id, semester
+    """)
+    conn.commit()
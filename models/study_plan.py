@@ -1,85 +1,109 @@
+import hashlib
 import json
+import os
+import zlib
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 from database.schema import get_db_connection
 from models.gpa_predictor import calculate_gpa
+from models.memo import memoize_by_student
+
+# Below this many students a batch is computed in-process; starting worker processes costs more
+PROCESS_POOL_THRESHOLD = 200
+
+# Plan versions kept per student and semester
+STUDY_PLAN_HISTORY = 5
+
+# Bump when build_study_plan changes so stored plans are regenerated
+PLAN_FORMAT_VERSION = 1
+
+def plan_input_hash(student_name, semester, courses, attendance, today=None):
+    """Fingerprint of everything a study plan is computed from
+
+    The week the plan starts on is included, so a new week produces a new plan.
+
+    Returns:
+        str: SHA-256 hex digest
+    """
+    today = today or datetime.now()
+    inputs = {
+        "format": PLAN_FORMAT_VERSION,
+        "student_name": student_name,
+        "semester": semester,
+        "week": (today - timedelta(days=today.weekday())).strftime("%Y-%m-%d"),
+        "courses": sorted(
+            [[c['id'], c['code'], c['title'], c['credit_hour'], c['mid'], c['assignment'], c['final']] for c in courses]
+        ),
+        "attendance": sorted(
+            [course_id, att['total_classes'], att['attended_classes']] for course_id, att in attendance.items()
+        )
+    }
+    return hashlib.sha256(json.dumps(inputs, default=str).encode("utf-8")).hexdigest()
+
+def compress_plan(plan):
+    """Serialise a plan for the study_plans.plan_json column (zlib-compressed JSON)"""
+    return zlib.compress(json.dumps(plan, separators=(",", ":")).encode("utf-8"))
+
+def load_plan_json(value):
+    """Decode a study_plans.plan_json value; rows written before compression hold plain JSON text"""
+    if isinstance(value, bytes):
+        value = zlib.decompress(value).decode("utf-8")
+    return json.loads(value)
+
+def get_latest_study_plan(conn, student_id, semester):
+    """Latest stored plan for a student and semester
 
-def generate_study_plan(student_id, semester=None):
-    """Generate a study plan for a student based on their current grades and attendance
-    
     Args:
+        conn: Open database connection
         student_id: ID of the student
-        semester: Semester to generate plan for, if None uses current semester
-        
+        semester: Semester name
+
     Returns:
-        dict: Study plan with recommendations
+        dict: {"id", "version", "input_hash", "created_at", "plan"} or None
     """
-    conn = get_db_connection()
-    
-    # Get student info
-    student = conn.execute(
-        "SELECT * FROM students WHERE id = ?", 
-        (student_id,)
-    ).fetchone()
-    
-    if not student:
-        conn.close()
-        return {"error": "Student not found"}
-    
-    # Verify student info is correct
-    if not student['name']:
-        conn.close()
-        return {"error": "Invalid student record - missing name"}
-    
-    # Get current semester if not provided
-    if not semester:
-        # Use latest semester from enrollments
-        semester_data = conn.execute(
-            "SELECT semester FROM enrollments WHERE student_id = ? ORDER BY created_at DESC LIMIT 1",
-            (student_id,)
-        ).fetchone()
-        
-        if semester_data:
-            semester = semester_data['semester']
-        else:
-            semester = f"Fall {datetime.now().year}"  # Default
-    
-    # Get student's courses for this semester
-    courses_query = """
-        SELECT c.id, c.code, c.title, c.credit_hour,
-               g.mid, g.assignment, g.final
-        FROM enrollments e
-        JOIN courses c ON e.course_id = c.id
-        LEFT JOIN grades g ON e.student_id = g.student_id AND e.course_id = g.course_id AND e.semester = g.semester
-        WHERE e.student_id = ? AND e.semester = ?
+    row = conn.execute("""
+        SELECT id, version, input_hash, created_at, plan_json FROM study_plans
+        WHERE student_id = ? AND semester = ?
+        ORDER BY version DESC LIMIT 1
+    """, (student_id, semester)).fetchone()
+    if not row:
+        return None
+    return {"id": row['id'], "version": row['version'], "input_hash": row['input_hash'],
+            "created_at": row['created_at'], "plan": load_plan_json(row['plan_json'])}
+
+def save_study_plans(conn, rows):
+    """Store new plan versions and trim each history to STUDY_PLAN_HISTORY versions
+
+    The caller commits.
+
+    Args:
+        conn: Open database connection
+        rows: (student_id, semester, input_hash, compressed plan) tuples
     """
-    courses = conn.execute(courses_query, (student_id, semester)).fetchall()
-    
-    # Get attendance data
-    attendance_query = """
-        SELECT a.course_id, COUNT(*) as total_classes,
-               SUM(CASE WHEN a.present = 1 THEN 1 ELSE 0 END) as attended_classes
-        FROM attendance a
-        JOIN enrollments e ON a.student_id = e.student_id AND a.course_id = e.course_id
-        WHERE a.student_id = ? AND e.semester = ?
-        GROUP BY a.course_id
+    conn.executemany("""
+        INSERT INTO study_plans (student_id, semester, input_hash, plan_json, version)
+        VALUES (?1, ?2, ?3, ?4, COALESCE((SELECT MAX(version) FROM study_plans WHERE student_id = ?1 AND semester = ?2), 0) + 1)
+    """, rows)
+    conn.executemany("""
+        DELETE FROM study_plans
+        WHERE student_id = ?1 AND semester = ?2
+          AND version <= (SELECT MAX(version) FROM study_plans WHERE student_id = ?1 AND semester = ?2) - ?3
+    """, [(row[0], row[1], STUDY_PLAN_HISTORY) for row in rows])
+
+def build_study_plan(student_id, student_name, semester, courses, attendance, today=None):
+    """Compute a study plan from already loaded data (no database access)
+
+    Args:
+        student_id: ID of the student
+        student_name: Name of the student
+        semester: Semester the plan is for
+        courses: Rows/dicts with id, code, title, credit_hour, mid, assignment, final
+        attendance: dict course_id -> {"total_classes", "attended_classes"}
+        today: Date the weekly plan starts from (defaults to now)
+
+    Returns:
+        dict: Study plan with recommendations
     """
-    attendance_data = conn.execute(attendance_query, (student_id, semester)).fetchall()
-    
-    # Double-check that we're generating a plan for the correct student
-    verification_check = conn.execute(
-        "SELECT id, name FROM students WHERE id = ?", 
-        (student_id,)
-    ).fetchone()
-    
-    if not verification_check or verification_check['id'] != student_id:
-        conn.close()
-        return {"error": "Student verification failed"}
-        
-    student_name = verification_check['name']
-    
-    # Close the database connection after all data retrieval
-    conn.close()
-    
     # Process course data
     course_analysis = []
     grades = {}
@@ -89,10 +113,9 @@ def generate_study_plan(student_id, semester=None):
         
         # Get attendance for this course
         attendance_pct = None
-        for att in attendance_data:
-            if att['course_id'] == course_id and att['total_classes'] > 0:
-                attendance_pct = (att['attended_classes'] / att['total_classes']) * 100
-                break
+        att = attendance.get(course_id)
+        if att and att['total_classes'] > 0:
+            attendance_pct = (att['attended_classes'] / att['total_classes']) * 100
         
         # Calculate total score so far
         mid_score = course['mid'] or 0
@@ -151,10 +174,10 @@ def generate_study_plan(student_id, semester=None):
         }
     
     # Calculate current GPA
-    current_gpa = calculate_gpa(grades)
+    current_gpa = calculate_gpa(grades, {c['id']: c['credit_hour'] for c in courses})
     
     # Generate weekly study plan
-    today = datetime.now()
+    today = today or datetime.now()
     start_of_week = today - timedelta(days=today.weekday())
     weekly_plan = []
     
@@ -209,10 +232,10 @@ def generate_study_plan(student_id, semester=None):
     # Create final study plan
     study_plan = {
         "student_id": student_id,
-        "student_name": student_name,  # Use verified student name
+        "student_name": student_name,
         "semester": semester,
         "current_gpa": current_gpa,
-        "generated_date": datetime.now().strftime("%Y-%m-%d"),
+        "generated_date": today.strftime("%Y-%m-%d"),
         "course_analysis": course_analysis,
         "weekly_plan": weekly_plan,
         "general_recommendations": [
@@ -224,13 +247,229 @@ def generate_study_plan(student_id, semester=None):
         ]
     }
     
-    # Store in database
+    return study_plan
+
+def _plan_week():
+    """Start of the current week; plans are memoized per week because the weekly plan is dated"""
+    today = datetime.now()
+    return (today - timedelta(days=today.weekday())).strftime("%Y-%m-%d")
+
+@memoize_by_student(extra_key=_plan_week)
+def generate_study_plan(student_id, semester=None, force=False):
+    """Generate a study plan for a student based on their current grades and attendance
+    
+    If the grades, attendance and week are unchanged since the latest stored
+    plan, that plan is returned and nothing is written.
+    
+    Args:
+        student_id: ID of the student
+        semester: Semester to generate plan for, if None uses current semester
+        force: Store a new version even if the inputs are unchanged
+        
+    Returns:
+        dict: Study plan with recommendations
+    """
     conn = get_db_connection()
-    conn.execute(
-        "INSERT INTO study_plans (student_id, plan_json, semester) VALUES (?, ?, ?)",
-        (student_id, json.dumps(study_plan), semester)
-    )
-    conn.commit()
-    conn.close()
+    try:
+        # Get student info
+        student = conn.execute(
+            "SELECT id, name FROM students WHERE id = ?", 
+            (student_id,)
+        ).fetchone()
+        
+        if not student:
+            return {"error": "Student not found"}
+        
+        # Verify student info is correct
+        if not student['name']:
+            return {"error": "Invalid student record - missing name"}
+        
+        # Get current semester if not provided
+        if not semester:
+            # Use latest semester from enrollments
+            semester_data = conn.execute(
+                "SELECT semester FROM enrollments WHERE student_id = ? ORDER BY created_at DESC LIMIT 1",
+                (student_id,)
+            ).fetchone()
+            
+            if semester_data:
+                semester = semester_data['semester']
+            else:
+                semester = f"Fall {datetime.now().year}"  # Default
+        
+        # Get student's courses for this semester
+        courses = conn.execute("""
+            SELECT c.id, c.code, c.title, c.credit_hour,
+                   g.mid, g.assignment, g.final
+            FROM enrollments e
+            JOIN courses c ON e.course_id = c.id
+            LEFT JOIN grades g ON e.student_id = g.student_id AND e.course_id = g.course_id AND e.semester = g.semester
+            WHERE e.student_id = ? AND e.semester = ?
+        """, (student_id, semester)).fetchall()
+        
+        # Get attendance data
+        attendance = {row['course_id']: row for row in conn.execute("""
+            SELECT a.course_id, COUNT(*) as total_classes,
+                   SUM(CASE WHEN a.present = 1 THEN 1 ELSE 0 END) as attended_classes
+            FROM attendance a
+            JOIN enrollments e ON a.student_id = e.student_id AND a.course_id = e.course_id
+            WHERE a.student_id = ? AND e.semester = ?
+            GROUP BY a.course_id
+        """, (student_id, semester)).fetchall()}
+        
+        input_hash = plan_input_hash(student['name'], semester, courses, attendance)
+        latest = get_latest_study_plan(conn, student_id, semester)
+        if latest and latest['input_hash'] == input_hash and not force:
+            return latest['plan']
+        
+        study_plan = build_study_plan(student_id, student['name'], semester, courses, attendance)
+        
+        # Store in database
+        save_study_plans(conn, [(student_id, semester, input_hash, compress_plan(study_plan))])
+        conn.commit()
+    finally:
+        conn.close()
     
-    return study_plan 
\ No newline at end of file
+    return study_plan
+
+def load_study_plan_inputs(conn, semester, student_ids=None, department=None):
+    """Load everything needed to plan a whole cohort with three queries
+
+    The target students go into a temporary table that the course/grade and
+    attendance queries join against, so the cost does not depend on how
+    many students are selected.
+
+    Args:
+        conn: Open database connection
+        semester: Semester name
+        student_ids: Optional list of student IDs (defaults to everyone enrolled)
+        department: Optional department filter
+
+    Returns:
+        list: One payload dict per student for build_study_plan
+    """
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS plan_students (id INTEGER PRIMARY KEY, name TEXT)")
+    conn.execute("DELETE FROM plan_students")
+
+    query = """
+        INSERT INTO plan_students (id, name)
+        SELECT DISTINCT s.id, s.name FROM students s
+        JOIN enrollments e ON e.student_id = s.id AND e.semester = ?
+        WHERE s.name IS NOT NULL AND s.name != ''
+    """
+    params = [semester]
+    if department:
+        query += " AND s.dept = ?"
+        params.append(department)
+    if student_ids is not None:
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS plan_requested (id INTEGER PRIMARY KEY)")
+        conn.execute("DELETE FROM plan_requested")
+        conn.executemany("INSERT OR IGNORE INTO plan_requested (id) VALUES (?)", [(i,) for i in student_ids])
+        query += " AND s.id IN (SELECT id FROM plan_requested)"
+    conn.execute(query, params)
+
+    payloads = {
+        row['id']: {"student_id": row['id'], "student_name": row['name'], "semester": semester,
+                    "courses": [], "attendance": {}}
+        for row in conn.execute("SELECT id, name FROM plan_students ORDER BY id").fetchall()
+    }
+
+    for row in conn.execute("""
+        SELECT e.student_id, c.id, c.code, c.title, c.credit_hour, g.mid, g.assignment, g.final
+        FROM plan_students p
+        JOIN enrollments e ON e.student_id = p.id AND e.semester = ?
+        JOIN courses c ON e.course_id = c.id
+        LEFT JOIN grades g ON g.student_id = e.student_id AND g.course_id = e.course_id AND g.semester = e.semester
+    """, (semester,)).fetchall():
+        course = dict(row)
+        payloads[course.pop('student_id')]["courses"].append(course)
+
+    for row in conn.execute("""
+        SELECT a.student_id, a.course_id, COUNT(*) as total_classes,
+               SUM(CASE WHEN a.present = 1 THEN 1 ELSE 0 END) as attended_classes
+        FROM plan_students p
+        JOIN enrollments e ON e.student_id = p.id AND e.semester = ?
+        JOIN attendance a ON a.student_id = e.student_id AND a.course_id = e.course_id
+        GROUP BY a.student_id, a.course_id
+    """, (semester,)).fetchall():
+        payloads[row['student_id']]["attendance"][row['course_id']] = {
+            "total_classes": row['total_classes'],
+            "attended_classes": row['attended_classes']
+        }
+
+    return list(payloads.values())
+
+def _build_plan_row(payload):
+    """Build and compress one plan in a worker process"""
+    plan = build_study_plan(payload["student_id"], payload["student_name"], payload["semester"],
+                            payload["courses"], payload["attendance"], payload.get("today"))
+    return payload["student_id"], payload["semester"], payload["input_hash"], compress_plan(plan)
+
+def generate_study_plans(semester, student_ids=None, department=None, processes=None, force=False, progress=None):
+    """Generate study plans for a whole semester, department or list of students
+
+    Inputs are loaded in bulk and students whose inputs are unchanged since
+    their latest stored plan are skipped. The remaining plans are computed
+    across CPU cores with a ProcessPoolExecutor and written in one transaction.
+
+    Args:
+        semester: Semester name
+        student_ids: Optional list of student IDs (defaults to everyone enrolled)
+        department: Optional department filter
+        processes: Worker processes (defaults to the CPU count; 1 computes in-process)
+        force: Regenerate every plan even if its inputs are unchanged
+        progress: Optional callable(fraction, message) for progress reporting
+
+    Returns:
+        dict: {"students", "generated", "unchanged", "semester"}
+    """
+    conn = get_db_connection()
+    try:
+        payloads = load_study_plan_inputs(conn, semester, student_ids, department)
+        latest_hashes = {} if force else {
+            row['student_id']: row['input_hash']
+            for row in conn.execute("""
+                SELECT sp.student_id, sp.input_hash FROM plan_students p
+                JOIN study_plans sp ON sp.student_id = p.id AND sp.semester = ?1
+                WHERE sp.version = (SELECT MAX(version) FROM study_plans WHERE student_id = p.id AND semester = ?1)
+            """, (semester,)).fetchall()
+        }
+        today = datetime.now()
+        pending = []
+        for payload in payloads:
+            payload["today"] = today
+            payload["input_hash"] = plan_input_hash(payload["student_name"], semester,
+                                                    payload["courses"], payload["attendance"], today)
+            if latest_hashes.get(payload["student_id"]) != payload["input_hash"]:
+                pending.append(payload)
+        # Filling the temp tables opened a transaction whose read lock would block every other
+        # writer (including progress reports) until the plans are saved; end it here
+        conn.commit()
+        if progress:
+            progress(0.1, f"Loaded {len(payloads)} students, {len(pending)} changed")
+
+        processes = processes or os.cpu_count() or 1
+        rows = []
+        if processes > 1 and len(pending) >= PROCESS_POOL_THRESHOLD:
+            chunksize = max(1, len(pending) // (processes * 8))
+            with ProcessPoolExecutor(max_workers=processes) as pool:
+                for index, row in enumerate(pool.map(_build_plan_row, pending, chunksize=chunksize)):
+                    rows.append(row)
+                    if progress and index % 1000 == 0:
+                        progress(0.1 + 0.8 * index / len(pending), f"{index} of {len(pending)} plans")
+        else:
+            rows = list(map(_build_plan_row, pending))
+
+        if progress:
+            progress(0.9, "Saving plans")
+        try:
+            save_study_plans(conn, rows)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    finally:
+        conn.close()
+
+    return {"students": len(payloads), "generated": len(rows), "unchanged": len(payloads) - len(rows),
+            "semester": semester}
@@ -0,0 +1,263 @@
+import json
+from collections import defaultdict
+from database.schema import get_db_connection
+from models.seats import begin_immediate
+from models.test_grading import get_answer_key, record_submissions
+
+# Questions shown per page while taking a test
+QUESTIONS_PER_PAGE = 5
+
+# Answers saved this many seconds after the deadline are still accepted (slow networks);
+# the sweeper only closes attempts once the grace period has passed too
+SUBMIT_GRACE_SECONDS = 30
+
+# Attempt columns plus the seconds left, computed by the database clock
+ATTEMPT_COLUMNS = """
+    id, student_id, test_id, status, current_page, started_at, deadline,
+    (julianday(deadline) - julianday('now')) * 86400 AS seconds_left
+"""
+
+def _attempt_dict(row):
+    """Attempt row as a dict with the seconds left computed by the database clock"""
+    return {
+        "id": row['id'], "student_id": row['student_id'], "test_id": row['test_id'],
+        "status": row['status'], "current_page": row['current_page'],
+        "started_at": row['started_at'], "deadline": row['deadline'],
+        "seconds_left": max(0, int(row['seconds_left'])) if row['seconds_left'] is not None else 0
+    }
+
+def get_attempt(conn, student_id, test_id):
+    """A student's attempt at a test, or None"""
+    row = conn.execute(
+        f"SELECT {ATTEMPT_COLUMNS} FROM test_attempts WHERE student_id = ? AND test_id = ?", (student_id, test_id)
+    ).fetchone()
+    return _attempt_dict(row) if row else None
+
+def get_active_attempt(conn, student_id):
+    """The student's in-progress attempt (any test), or None"""
+    row = conn.execute(f"""
+        SELECT {ATTEMPT_COLUMNS} FROM test_attempts
+        WHERE student_id = ? AND status = 'in_progress'
+        ORDER BY started_at DESC LIMIT 1
+    """, (student_id,)).fetchone()
+    return _attempt_dict(row) if row else None
+
+def start_attempt(conn, student_id, test_id):
+    """Start a timed attempt, or resume the student's existing one
+
+    The deadline is fixed by the database clock when the attempt starts, so
+    reconnecting or restarting the app does not reset the timer.
+
+    Args:
+        conn: Open database connection
+        student_id: ID of the student
+        test_id: ID of the class test
+
+    Returns:
+        dict: Attempt (see get_attempt)
+
+    Raises:
+        ValueError: If the test does not exist or was already submitted
+    """
+    begin_immediate(conn)
+    try:
+        test = conn.execute("SELECT duration_minutes FROM class_tests WHERE id = ?", (test_id,)).fetchone()
+        if not test:
+            raise ValueError("Class test not found")
+        submitted = conn.execute(
+            "SELECT 1 FROM student_test_submissions WHERE student_id = ? AND test_id = ?", (student_id, test_id)
+        ).fetchone()
+        if submitted:
+            raise ValueError("You have already submitted this test")
+        conn.execute("""
+            INSERT OR IGNORE INTO test_attempts (student_id, test_id, deadline)
+            VALUES (?, ?, datetime('now', '+' || ? || ' minutes'))
+        """, (student_id, test_id, int(test['duration_minutes'] or 30)))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return get_attempt(conn, student_id, test_id)
+
+def get_attempt_answers(conn, attempt_id):
+    """Saved answers of an attempt keyed "q_<position>" (the student_test_submissions.answers format)"""
+    return {
+        f"q_{row['position']}": json.loads(row['value'])
+        for row in conn.execute(
+            "SELECT position, value FROM test_attempt_answers WHERE attempt_id = ?", (attempt_id,)
+        ).fetchall()
+        if row['value'] is not None
+    }
+
+def save_answers(conn, attempt_id, answers, current_page=None):
+    """Save some answers of an in-progress attempt; rejected once the deadline has passed
+
+    Args:
+        conn: Open database connection
+        attempt_id: ID of the attempt
+        answers: dict position -> answer value (option index or text)
+        current_page: Optional page to resume on
+
+    Returns:
+        bool: False if the attempt is closed or past its deadline
+    """
+    open_attempt = conn.execute("""
+        SELECT 1 FROM test_attempts
+        WHERE id = ? AND status = 'in_progress' AND deadline > datetime('now', ?)
+    """, (attempt_id, f"-{SUBMIT_GRACE_SECONDS} seconds")).fetchone()
+    if not open_attempt:
+        return False
+    conn.executemany("""
+        INSERT OR REPLACE INTO test_attempt_answers (attempt_id, position, value, saved_at)
+        VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+    """, [(attempt_id, position, json.dumps(value)) for position, value in answers.items()])
+    if current_page is not None:
+        conn.execute("UPDATE test_attempts SET current_page = ? WHERE id = ?", (current_page, attempt_id))
+    conn.commit()
+    return True
+
+def get_question_page(conn, test_id, page):
+    """Questions on one page of a test, served from the cached answer key
+
+    Returns:
+        tuple: (list of (position, question dict), page count)
+    """
+    key = get_answer_key(conn, test_id)
+    if key is None:
+        return [], 0
+    pages = max(1, -(-len(key.positions) // QUESTIONS_PER_PAGE))
+    page = min(max(page, 0), pages - 1)
+    positions = key.positions[page * QUESTIONS_PER_PAGE:(page + 1) * QUESTIONS_PER_PAGE]
+    return [(position, key.questions[position]) for position in positions], pages
+
+def _close_attempts(conn, attempts, status):
+    """Score and submit attempts in bulk; attempts is a list of (attempt_id, student_id, test_id)"""
+    if not attempts:
+        return 0
+    answers = defaultdict(dict)
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS closing_attempts (id INTEGER PRIMARY KEY)")
+    conn.execute("DELETE FROM closing_attempts")
+    conn.executemany("INSERT INTO closing_attempts (id) VALUES (?)", [(a[0],) for a in attempts])
+    for row in conn.execute("""
+        SELECT taa.attempt_id, taa.position, taa.value FROM test_attempt_answers taa
+        JOIN closing_attempts c ON c.id = taa.attempt_id
+    """).fetchall():
+        if row['value'] is not None:
+            answers[row['attempt_id']][f"q_{row['position']}"] = json.loads(row['value'])
+
+    submitted = {(row['student_id'], row['test_id']) for row in conn.execute("""
+        SELECT sts.student_id, sts.test_id FROM student_test_submissions sts
+        JOIN test_attempts ta ON ta.student_id = sts.student_id AND ta.test_id = sts.test_id
+        JOIN closing_attempts c ON c.id = ta.id
+    """).fetchall()}
+
+    # Attempts at a test that has since been deleted are closed without a submission
+    test_ids = list({a[2] for a in attempts})
+    existing = {row['id'] for row in conn.execute(
+        f"SELECT id FROM class_tests WHERE id IN ({', '.join('?' for _ in test_ids)})", test_ids
+    ).fetchall()}
+
+    by_test = defaultdict(list)
+    for attempt_id, student_id, test_id in attempts:
+        if test_id in existing and (student_id, test_id) not in submitted:
+            by_test[test_id].append((student_id, answers.get(attempt_id, {})))
+    for test_id, entries in by_test.items():
+        record_submissions(conn, test_id, entries)
+
+    conn.executemany(
+        "UPDATE test_attempts SET status = ?, submitted_at = CURRENT_TIMESTAMP WHERE id = ?",
+        [(status, attempt_id) for attempt_id, _, _ in attempts]
+    )
+    return sum(len(entries) for entries in by_test.values())
+
+def submit_attempt(conn, attempt_id):
+    """Submit an attempt with its saved answers
+
+    Returns:
+        float: Marks awarded, or None if the attempt was already closed
+    """
+    begin_immediate(conn)
+    try:
+        row = conn.execute("""
+            SELECT id, student_id, test_id,
+                   deadline <= datetime('now', ?) AS expired
+            FROM test_attempts WHERE id = ? AND status = 'in_progress'
+        """, (f"-{SUBMIT_GRACE_SECONDS} seconds", attempt_id)).fetchone()
+        if not row:
+            conn.rollback()
+            return None
+        _close_attempts(conn, [(row['id'], row['student_id'], row['test_id'])],
+                        "expired" if row['expired'] else "submitted")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    marks = conn.execute(
+        "SELECT marks FROM student_test_submissions WHERE student_id = ? AND test_id = ?",
+        (row['student_id'], row['test_id'])
+    ).fetchone()
+    return marks['marks'] if marks else None
+
+def sweep_expired_attempts(test_ids=None):
+    """Auto-submit every in-progress attempt whose deadline (plus grace) has passed
+
+    All expired attempts are scored per test with one compiled key and written
+    in a single transaction. The worker loop sweeps every test; result views
+    sweep just the tests they show, so their marks are complete even while
+    no worker is running. Nothing is locked when no attempt has expired.
+
+    Args:
+        test_ids: Optional list of class test IDs to restrict the sweep to
+
+    Returns:
+        int: Number of submissions created
+    """
+    query = """
+        SELECT id, student_id, test_id FROM test_attempts
+        WHERE status = 'in_progress' AND deadline <= datetime('now', ?)
+    """
+    params = [f"-{SUBMIT_GRACE_SECONDS} seconds"]
+    if test_ids is not None:
+        if not test_ids:
+            return 0
+        query += f" AND test_id IN ({', '.join('?' for _ in test_ids)})"
+        params += list(test_ids)
+
+    conn = get_db_connection()
+    try:
+        if not conn.execute(f"SELECT EXISTS ({query})", params).fetchone()[0]:
+            return 0
+        begin_immediate(conn)
+        attempts = [(row['id'], row['student_id'], row['test_id']) for row in conn.execute(query, params).fetchall()]
+        created = _close_attempts(conn, attempts, "expired")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return created
+
+def delete_class_test(conn, test_id):
+    """Delete a class test together with its questions, answers and attempts
+
+    Attempts still in progress are discarded, so the sweeper never tries
+    to score them against a test that no longer exists.
+
+    Args:
+        conn: Open database connection
+        test_id: ID of the class test
+    """
+    begin_immediate(conn)
+    try:
+        conn.execute(
+            "DELETE FROM test_attempt_answers WHERE attempt_id IN (SELECT id FROM test_attempts WHERE test_id = ?)",
+            (test_id,)
+        )
+        for table in ("test_attempts", "test_answers", "test_questions"):
+            conn.execute(f"DELETE FROM {table} WHERE test_id = ?", (test_id,))
+        conn.execute("DELETE FROM class_tests WHERE id = ?", (test_id,))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
@@ -0,0 +1,429 @@
+import json
+import re
+import threading
+from collections import OrderedDict
+from difflib import SequenceMatcher
+import numpy as np
+from database.schema import get_db_connection
+
+# Compiled answer keys kept per process
+ANSWER_KEY_CACHE_SIZE = 128
+
+# Minimum similarity (0-1) for a short answer to count as a typo of the expected one
+FUZZY_MATCH_THRESHOLD = 0.85
+
+# Expected short answers may list alternatives, e.g. "NaCl | sodium chloride"
+ALTERNATIVE_SEPARATOR = "|"
+
+PUNCTUATION_PATTERN = re.compile(r"[^\w\s.]")
+# A whole answer that is a signed number or fraction, e.g. "-5", "+0.25", "1/2", "- 3 / 4"
+NUMBER_PATTERN = re.compile(r"[-+]?(?:\d+(?:\.\d*)?|\.\d+)(?:/(?:\d+(?:\.\d*)?|\.\d+))?")
+WHITESPACE_PATTERN = re.compile(r"\s+")
+SIGN_SPACING_PATTERN = re.compile(r"\s*([-+/])\s*")
+ARTICLES = {"a", "an", "the"}
+
+ANSWER_INSERT = """
+    INSERT OR REPLACE INTO test_answers
+    (submission_id, test_id, student_id, position, choice, text_answer, is_correct, marks_awarded)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+_keys = OrderedDict()
+_keys_lock = threading.Lock()
+
+class AnswerKey:
+    """A class test's questions compiled for vectorised scoring
+
+    MCQ answers and marks are numpy arrays aligned with mcq_positions; short
+    answers keep their normalised alternatives and a per-key cache of
+    already judged student answers. Questions are addressed by position,
+    the <n> in the "q_<n>" answer keys.
+    """
+
+    def __init__(self, test_id, version, questions):
+        self.test_id = test_id
+        self.version = version
+        self.questions = questions
+        self.positions = sorted(questions)
+        self.max_marks = float(sum(q.get('marks') or 0 for q in questions.values()))
+
+        self.mcq_positions = [p for p in self.positions if questions[p].get('type') == 'mcq']
+        self.mcq_answers = np.array([_as_choice(questions[p].get('answer')) for p in self.mcq_positions], dtype=np.int64)
+        self.mcq_marks = np.array([float(questions[p]['marks']) for p in self.mcq_positions])
+
+        self.short_positions = [p for p in self.positions if questions[p].get('type') != 'mcq']
+        self.short_expected = [
+            [normalize_answer(alt) for alt in str(questions[p].get('expected_answer') or '').split(ALTERNATIVE_SEPARATOR)]
+            for p in self.short_positions
+        ]
+        self.short_marks = np.array([float(questions[p]['marks']) for p in self.short_positions])
+        self._judged = [{} for _ in self.short_positions]
+
+        column_of = {p: i for i, p in enumerate(self.positions)}
+        self._mcq_columns = [column_of[p] for p in self.mcq_positions]
+        self._short_columns = [column_of[p] for p in self.short_positions]
+
+    def short_answer_correct(self, column, answer):
+        """Whether a student's short answer matches question column; memoised per distinct answer"""
+        answer = normalize_answer(answer)
+        judged = self._judged[column]
+        if answer not in judged:
+            judged[answer] = bool(answer) and any(_answers_match(answer, expected)
+                                                  for expected in self.short_expected[column] if expected)
+        return judged[answer]
+
+    def item_marks(self, submissions):
+        """Marks awarded per question for many submissions at once
+
+        Args:
+            submissions: List of answer dicts keyed "q_<position>" (as stored in
+                         student_test_submissions.answers)
+
+        Returns:
+            numpy.ndarray: submissions x questions matrix, columns in self.positions order
+        """
+        count = len(submissions)
+        marks = np.zeros((count, len(self.positions)))
+        if count == 0:
+            return marks
+
+        if self.mcq_positions:
+            chosen = np.full((count, len(self.mcq_positions)), -1, dtype=np.int64)
+            for row, answers in enumerate(submissions):
+                for column, position in enumerate(self.mcq_positions):
+                    chosen[row, column] = _as_choice(answers.get(f"q_{position}"))
+            marks[:, self._mcq_columns] = (chosen == self.mcq_answers) * self.mcq_marks
+
+        if self.short_positions:
+            correct = np.zeros((count, len(self.short_positions)), dtype=bool)
+            for row, answers in enumerate(submissions):
+                for column, position in enumerate(self.short_positions):
+                    value = answers.get(f"q_{position}")
+                    if value is not None:
+                        correct[row, column] = self.short_answer_correct(column, str(value))
+            marks[:, self._short_columns] = correct * self.short_marks
+
+        return marks
+
+    def score(self, submissions):
+        """Total marks per submission (see item_marks)
+
+        Returns:
+            numpy.ndarray: Marks per submission
+        """
+        return np.round(self.item_marks(submissions).sum(axis=1), 2)
+
+    def answer_rows(self, submission_id, test_id, student_id, answers, item_marks):
+        """test_answers rows for one scored submission"""
+        rows = []
+        for column, position in enumerate(self.positions):
+            value = answers.get(f"q_{position}")
+            if value is None:
+                continue
+            is_mcq = position in self.mcq_positions
+            awarded = float(item_marks[column])
+            rows.append((submission_id, test_id, student_id, position,
+                         _as_choice(value) if is_mcq else None, None if is_mcq else str(value),
+                         awarded > 0, awarded))
+        return rows
+
+def _as_choice(value):
+    """MCQ option index from a stored answer, -1 if there is none"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return int(value)
+    if isinstance(value, str) and value.strip().lstrip("-").isdigit():
+        return int(value)
+    return -1
+
+def normalize_answer(text):
+    """Normalise a short answer: case, punctuation, articles and whitespace are ignored
+
+    Numeric answers keep their sign and fraction bar, so "-5" never matches "5".
+    """
+    compact = SIGN_SPACING_PATTERN.sub(r"\1", str(text).strip())
+    if NUMBER_PATTERN.fullmatch(compact):
+        return compact
+    text = PUNCTUATION_PATTERN.sub(" ", str(text).lower())
+    words = [word.strip(".") for word in WHITESPACE_PATTERN.split(text)]
+    return " ".join(word for word in words if word and word not in ARTICLES)
+
+def _as_number(text):
+    """Value of a normalised numeric answer ("-5", "1/2"), None for anything else"""
+    if not NUMBER_PATTERN.fullmatch(text):
+        return None
+    numerator, _, denominator = text.partition("/")
+    if not denominator:
+        return float(numerator)
+    return float(numerator) / float(denominator) if float(denominator) else None
+
+def _answers_match(answer, expected):
+    """Compare two normalised answers: numbers by value, text exactly or within FUZZY_MATCH_THRESHOLD"""
+    if answer == expected:
+        return True
+    answer_value, expected_value = _as_number(answer), _as_number(expected)
+    if answer_value is not None or expected_value is not None:
+        # Numbers are never fuzzy-matched: "-12.5" is not a typo of "12.5"
+        return answer_value is not None and expected_value is not None and abs(answer_value - expected_value) < 1e-9
+    # Short words are all-or-nothing; one typo in "cat" makes a different word
+    if min(len(answer), len(expected)) < 4:
+        return False
+    return SequenceMatcher(None, answer, expected).ratio() >= FUZZY_MATCH_THRESHOLD
+
+def load_test_questions(conn, test_id, questions_json=None):
+    """A test's questions by position from test_questions, falling back to the class_tests JSON
+
+    Returns:
+        dict: position -> {"question", "type", "options", "answer", "expected_answer", "marks"}
+    """
+    rows = conn.execute("""
+        SELECT position, question, type, options, answer, expected_answer, marks
+        FROM test_questions WHERE test_id = ? ORDER BY position
+    """, (test_id,)).fetchall()
+    if rows:
+        return {
+            row['position']: {
+                "question": row['question'], "type": row['type'],
+                "options": json.loads(row['options']) if row['options'] else None,
+                "answer": row['answer'], "expected_answer": row['expected_answer'], "marks": row['marks']
+            }
+            for row in rows
+        }
+    if questions_json is None:
+        row = conn.execute("SELECT questions FROM class_tests WHERE id = ?", (test_id,)).fetchone()
+        questions_json = row['questions'] if row else "[]"
+    return dict(enumerate(json.loads(questions_json or "[]")))
+
+def save_test_questions(conn, test_id, questions):
+    """Replace a test's rows in test_questions; the caller commits
+
+    Args:
+        conn: Open database connection
+        test_id: ID of the class test
+        questions: List of question dicts in display order (the class_tests.questions format)
+    """
+    conn.execute("DELETE FROM test_questions WHERE test_id = ?", (test_id,))
+    conn.executemany("""
+        INSERT INTO test_questions (test_id, position, question, type, options, answer, expected_answer, marks)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, [
+        (test_id, position, q.get('question', ''), q.get('type', 'short_answer'),
+         json.dumps(q['options']) if q.get('options') is not None else None,
+         q.get('answer'), q.get('expected_answer'), q.get('marks', 0))
+        for position, q in enumerate(questions)
+    ])
+
+def get_answer_key(conn, test_id):
+    """Compiled answer key for a test, recompiled only when class_tests.updated_at changes
+
+    Args:
+        conn: Open database connection
+        test_id: ID of the class test
+
+    Returns:
+        AnswerKey, or None if the test does not exist
+    """
+    row = conn.execute("SELECT questions, updated_at FROM class_tests WHERE id = ?", (test_id,)).fetchone()
+    if not row:
+        return None
+    with _keys_lock:
+        key = _keys.get(test_id)
+        if key and key.version == row['updated_at']:
+            _keys.move_to_end(test_id)
+            return key
+    key = AnswerKey(test_id, row['updated_at'], load_test_questions(conn, test_id, row['questions']))
+    with _keys_lock:
+        _keys[test_id] = key
+        _keys.move_to_end(test_id)
+        while len(_keys) > ANSWER_KEY_CACHE_SIZE:
+            _keys.popitem(last=False)
+    return key
+
+def score_submission(conn, test_id, answers):
+    """Marks for one set of answers against a test's current key
+
+    Returns:
+        tuple: (marks, key_version)
+    """
+    key = get_answer_key(conn, test_id)
+    if key is None:
+        raise ValueError(f"Class test {test_id} not found")
+    return float(key.score([answers])[0]), key.version
+
+def record_submission(conn, student_id, test_id, answers, status="completed"):
+    """Score and store a student's submission with one test_answers row per answered question
+
+    The caller commits.
+
+    Args:
+        conn: Open database connection
+        student_id: ID of the student
+        test_id: ID of the class test
+        answers: Answer dict keyed "q_<position>"
+        status: Submission status
+
+    Returns:
+        float: Marks awarded
+    """
+    return record_submissions(conn, test_id, [(student_id, answers)], status)[0]
+
+def record_submissions(conn, test_id, entries, status="completed"):
+    """Score and store many submissions of one test with a single key and bulk inserts
+
+    The caller commits.
+
+    Args:
+        conn: Open database connection
+        test_id: ID of the class test
+        entries: List of (student_id, answers) tuples
+        status: Submission status
+
+    Returns:
+        list: Marks awarded, in entries order
+    """
+    key = get_answer_key(conn, test_id)
+    if key is None:
+        raise ValueError(f"Class test {test_id} not found")
+    item_marks = key.item_marks([answers for _, answers in entries])
+    marks = np.round(item_marks.sum(axis=1), 2)
+    conn.executemany("""
+        INSERT INTO student_test_submissions (student_id, test_id, answers, marks, status, submitted_at, key_version)
+        VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP, ?)
+    """, [(student_id, test_id, json.dumps(answers), float(total), status, key.version)
+          for (student_id, answers), total in zip(entries, marks)])
+
+    submission_ids = dict(conn.execute(
+        "SELECT student_id, id FROM student_test_submissions WHERE test_id = ?", (test_id,)
+    ).fetchall())
+    conn.executemany(ANSWER_INSERT, [
+        answer_row
+        for (student_id, answers), items in zip(entries, item_marks)
+        for answer_row in key.answer_rows(submission_ids[student_id], test_id, student_id, answers, items)
+    ])
+    return [float(total) for total in marks]
+
+def regrade_test(test_id, conn=None):
+    """Rescore every submission of a test and rewrite the marks that changed
+
+    Per-question results in test_answers are rebuilt for the test in the
+    same transaction.
+
+    Args:
+        test_id: ID of the class test
+        conn: Optional open connection (committed here); one is opened otherwise
+
+    Returns:
+        dict: {"submissions": scored, "changed": rows whose marks changed}
+    """
+    own_conn = conn is None
+    conn = conn or get_db_connection()
+    try:
+        key = get_answer_key(conn, test_id)
+        if key is None:
+            raise ValueError(f"Class test {test_id} not found")
+        rows = conn.execute(
+            "SELECT id, student_id, answers, marks FROM student_test_submissions WHERE test_id = ?", (test_id,)
+        ).fetchall()
+
+        submissions = []
+        for row in rows:
+            try:
+                answers = json.loads(row['answers'] or "{}")
+            except ValueError:
+                answers = {}
+            submissions.append(answers if isinstance(answers, dict) else {})
+        item_marks = key.item_marks(submissions)
+        marks = np.round(item_marks.sum(axis=1), 2)
+        old_marks = np.array([row['marks'] if row['marks'] is not None else np.nan for row in rows], dtype=float)
+
+        changed = np.flatnonzero(~np.isclose(marks, old_marks)) if rows else []
+        conn.executemany(
+            "UPDATE student_test_submissions SET marks = ?, key_version = ? WHERE id = ?",
+            [(float(marks[i]), key.version, rows[i]['id']) for i in changed]
+        )
+        conn.execute(
+            "UPDATE student_test_submissions SET key_version = ? WHERE test_id = ? AND key_version IS NOT ?",
+            (key.version, test_id, key.version)
+        )
+        conn.execute("DELETE FROM test_answers WHERE test_id = ?", (test_id,))
+        conn.executemany(ANSWER_INSERT, [
+            answer_row
+            for row, answers, items in zip(rows, submissions, item_marks)
+            for answer_row in key.answer_rows(row['id'], test_id, row['student_id'], answers, items)
+        ])
+        conn.commit()
+    finally:
+        if own_conn:
+            conn.close()
+
+    return {"submissions": len(rows), "changed": len(changed)}
+
+def regrade_outdated_tests():
+    """Regrade every test whose answer key changed after some of its submissions were scored
+
+    Returns:
+        dict: {"tests": number regraded, "changed": submissions whose marks changed}
+    """
+    conn = get_db_connection()
+    try:
+        test_ids = [row['id'] for row in conn.execute("""
+            SELECT DISTINCT ct.id FROM class_tests ct
+            JOIN student_test_submissions sts ON sts.test_id = ct.id
+            WHERE sts.key_version IS NOT ct.updated_at
+        """).fetchall()]
+        changed = sum(regrade_test(test_id, conn)["changed"] for test_id in test_ids)
+    finally:
+        conn.close()
+    return {"tests": len(test_ids), "changed": changed}
+
+def item_analysis(conn, test_id):
+    """Per-question statistics for a test in one grouped query
+
+    Difficulty is the mean fraction of the question's marks earned (higher
+    is easier). Discrimination is the correct rate in the top quarter of
+    submissions by total marks minus the rate in the bottom quarter.
+    Unanswered questions count as wrong.
+
+    Args:
+        conn: Open database connection
+        test_id: ID of the class test
+
+    Returns:
+        list: sqlite3.Row per question with position, question, type, marks,
+              submissions, answered, correct, difficulty, discrimination
+    """
+    return conn.execute("""
+        WITH ranked AS (
+            SELECT id, NTILE(4) OVER (ORDER BY marks) AS quartile
+            FROM student_test_submissions WHERE test_id = ?1
+        )
+        SELECT tq.position, tq.question, tq.type, tq.marks,
+               COUNT(r.id) AS submissions,
+               COUNT(ta.id) AS answered,
+               IFNULL(SUM(ta.is_correct), 0) AS correct,
+               AVG(IFNULL(ta.marks_awarded, 0) / NULLIF(tq.marks, 0)) AS difficulty,
+               AVG(CASE WHEN r.quartile = 4 THEN IFNULL(ta.is_correct, 0) END)
+                 - AVG(CASE WHEN r.quartile = 1 THEN IFNULL(ta.is_correct, 0) END) AS discrimination
+        FROM test_questions tq
+        LEFT JOIN ranked r ON 1 = 1
+        LEFT JOIN test_answers ta ON ta.submission_id = r.id AND ta.position = tq.position
+        WHERE tq.test_id = ?1
+        GROUP BY tq.position
+        ORDER BY tq.position
+    """, (test_id,)).fetchall()
+
+def distractor_analysis(conn, test_id):
+    """How often each MCQ option was chosen, in one grouped query
+
+    Returns:
+        dict: position -> {option index: count}
+    """
+    counts = {}
+    for row in conn.execute("""
+        SELECT ta.position, ta.choice, COUNT(*) AS picks
+        FROM test_answers ta
+        JOIN test_questions tq ON tq.test_id = ta.test_id AND tq.position = ta.position
+        WHERE ta.test_id = ? AND tq.type = 'mcq'
+        GROUP BY ta.position, ta.choice
+    """, (test_id,)).fetchall():
+        counts.setdefault(row['position'], {})[row['choice']] = row['picks']
+    return counts
@@ -0,0 +1,91 @@
+import base64
+import hashlib
+import os
+import uuid
+from functools import lru_cache
+from PIL import Image, ImageOps, features
+from models.blob_store import is_blob
+
+# Generated thumbnails live next to the other static files and can be deleted at any time
+THUMBNAIL_DIR = os.path.join("static", "thumbnails")
+
+# Square sizes in pixels: directory cards show 40px avatars (80px covers high-DPI screens),
+# the profile view shows 200px
+CARD_THUMBNAIL_SIZE = 80
+PROFILE_THUMBNAIL_SIZE = 400
+
+THUMBNAIL_QUALITY = 80
+
+# Encoded thumbnails kept in memory per process (a few KB each)
+THUMBNAIL_CACHE_SIZE = 2048
+
+THUMBNAIL_FORMAT, THUMBNAIL_MIME, THUMBNAIL_EXTENSION = (
+    ("WEBP", "image/webp", "webp") if features.check("webp") else ("JPEG", "image/jpeg", "jpg")
+)
+
+def _source_key(photo_path):
+    """Cache key of a photo: its content hash for blobs, else path, size and mtime"""
+    if is_blob(photo_path):
+        return os.path.splitext(os.path.basename(photo_path))[0]
+    stat = os.stat(photo_path)
+    return hashlib.sha256(f"{photo_path}\t{stat.st_size}\t{stat.st_mtime_ns}".encode()).hexdigest()
+
+def thumbnail_path(photo_path, size=CARD_THUMBNAIL_SIZE):
+    """Where the thumbnail of a photo at the given size is cached"""
+    return os.path.join(THUMBNAIL_DIR, f"{_source_key(photo_path)}_{size}.{THUMBNAIL_EXTENSION}")
+
+def get_thumbnail(photo_path, size=CARD_THUMBNAIL_SIZE):
+    """Path of a square thumbnail of a photo, generating it on first use
+
+    Args:
+        photo_path: Path stored in a students/teachers photo column
+        size: Edge length in pixels
+
+    Returns:
+        str: Thumbnail path, or None if the photo is missing or not a readable image
+    """
+    if not photo_path or not os.path.exists(photo_path):
+        return None
+    path = thumbnail_path(photo_path, size)
+    if os.path.exists(path):
+        return path
+
+    try:
+        with Image.open(photo_path) as img:
+            img = ImageOps.exif_transpose(img)
+            img = ImageOps.fit(img.convert("RGB"), (size, size), Image.LANCZOS)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+
+    os.makedirs(THUMBNAIL_DIR, exist_ok=True)
+    temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    img.save(temp_path, THUMBNAIL_FORMAT, quality=THUMBNAIL_QUALITY)
+    os.replace(temp_path, path)
+    return path
+
+def create_thumbnails(photo_path):
+    """Generate every thumbnail size of a freshly uploaded photo"""
+    for size in (CARD_THUMBNAIL_SIZE, PROFILE_THUMBNAIL_SIZE):
+        get_thumbnail(photo_path, size)
+
+@lru_cache(maxsize=THUMBNAIL_CACHE_SIZE)
+def _encoded(path):
+    with open(path, "rb") as f:
+        return f"data:{THUMBNAIL_MIME};base64,{base64.b64encode(f.read()).decode('ascii')}"
+
+def thumbnail_data_uri(photo_path, size=CARD_THUMBNAIL_SIZE):
+    """Thumbnail as a data: URI for inline <img> tags, or None if there is no usable photo"""
+    path = get_thumbnail(photo_path, size)
+    return _encoded(path) if path else None
+
+def discard_thumbnails(photo_path):
+    """Delete cached thumbnails of a photo that is being removed"""
+    if not photo_path or not os.path.exists(photo_path):
+        return
+    for size in (CARD_THUMBNAIL_SIZE, PROFILE_THUMBNAIL_SIZE):
+        path = thumbnail_path(photo_path, size)
+        if os.path.exists(path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
@@ -0,0 +1,349 @@
+import re
+import calendar
+from functools import lru_cache
+from datetime import datetime, timedelta
+from database.schema import get_db_connection
+from models.scheduler import ROUTINE_DAYS, ROUTINE_TIME_SLOTS
+from models.seats import begin_immediate
+
+def _order_case(column, values):
+    """SQL CASE expression mapping each value to its position in a list"""
+    whens = " ".join(f"WHEN '{value}' THEN {index}" for index, value in enumerate(values))
+    return f"CASE {column} {whens} ELSE {len(values)} END"
+
+# Weekday name -> datetime.weekday() number
+WEEKDAYS = {name: index for index, name in enumerate(calendar.day_name)}
+
+DAY_ORDER_SQL = _order_case("r.day", ROUTINE_DAYS)
+SLOT_ORDER_SQL = _order_case("r.time_slot", ROUTINE_TIME_SLOTS)
+
+# Owners rebuilt per transaction, so a routine or exam regeneration never locks writers out for long
+TIMETABLE_BATCH_SIZE = 100
+
+# Each query materializes one (role, kind) slice of the timetables of the owners in temp.timetable_batch
+MATERIALIZE_QUERIES = [
+    f"""
+    INSERT INTO timetable_entries (owner_role, owner_id, session, kind, course_id, course_code, course_title,
+                                   teacher_name, day, day_order, time_slot, slot_order, room)
+    SELECT 'student', e.student_id, r.session, 'class', r.course_id, c.code, c.title,
+           t.name, r.day, {DAY_ORDER_SQL}, r.time_slot, {SLOT_ORDER_SQL}, r.room
+    FROM temp.timetable_batch b
+    JOIN enrollments e ON e.student_id = b.owner_id AND e.semester = b.session
+    JOIN class_routine r ON r.course_id = e.course_id AND r.session = b.session
+    JOIN courses c ON c.id = r.course_id
+    LEFT JOIN teachers t ON t.id = r.teacher_id
+    WHERE b.owner_role = 'student'
+    """,
+    f"""
+    INSERT INTO timetable_entries (owner_role, owner_id, session, kind, course_id, course_code, course_title,
+                                   teacher_name, day, day_order, time_slot, slot_order, room)
+    SELECT 'teacher', r.teacher_id, r.session, 'class', r.course_id, c.code, c.title,
+           t.name, r.day, {DAY_ORDER_SQL}, r.time_slot, {SLOT_ORDER_SQL}, r.room
+    FROM temp.timetable_batch b
+    JOIN class_routine r ON r.teacher_id = b.owner_id AND r.session = b.session
+    JOIN courses c ON c.id = r.course_id
+    LEFT JOIN teachers t ON t.id = r.teacher_id
+    WHERE b.owner_role = 'teacher'
+    """,
+    """
+    INSERT INTO timetable_entries (owner_role, owner_id, session, kind, course_id, course_code, course_title,
+                                   exam_date, start_time, end_time, exam_type, room)
+    SELECT 'student', e.student_id, x.session, 'exam', x.course_id, c.code, c.title,
+           x.exam_date, x.start_time, x.end_time, x.exam_type, x.room
+    FROM temp.timetable_batch b
+    JOIN enrollments e ON e.student_id = b.owner_id AND e.semester = b.session
+    JOIN exam_schedule x ON x.course_id = e.course_id AND x.session = b.session
+    JOIN courses c ON c.id = x.course_id
+    WHERE b.owner_role = 'student'
+    """,
+    """
+    INSERT INTO timetable_entries (owner_role, owner_id, session, kind, course_id, course_code, course_title,
+                                   exam_date, start_time, end_time, exam_type, room)
+    SELECT DISTINCT 'teacher', te.teacher_id, x.session, 'exam', x.course_id, c.code, c.title,
+           x.exam_date, x.start_time, x.end_time, x.exam_type, x.room
+    FROM temp.timetable_batch b
+    JOIN teaching te ON te.teacher_id = b.owner_id AND te.semester = b.session
+    JOIN exam_schedule x ON x.course_id = te.course_id AND x.session = b.session
+    JOIN courses c ON c.id = x.course_id
+    WHERE b.owner_role = 'teacher'
+    """
+]
+
+# Row-value filter matching the owners of the current batch
+IN_BATCH = "(owner_role, owner_id, session) IN (SELECT owner_role, owner_id, session FROM temp.timetable_batch)"
+
+@lru_cache(maxsize=256)
+def _parse_time(text):
+    """Parse "8:00 AM" or "09:00" into (hour, minute)"""
+    text = text.strip().upper()
+    for fmt in ("%I:%M %p", "%H:%M"):
+        try:
+            parsed = datetime.strptime(text, fmt)
+            return parsed.hour, parsed.minute
+        except ValueError:
+            continue
+    return 0, 0
+
+@lru_cache(maxsize=4096)
+def _ical_text(value):
+    """Escape a value for an iCalendar TEXT property"""
+    return re.sub(r"([,;\\])", r"\\\1", str(value or "")).replace("\n", "\\n")
+
+def _ical_stamp(moment):
+    """Format a datetime as an iCalendar floating local time"""
+    return moment.strftime("%Y%m%dT%H%M%S")
+
+def build_ical(rows, session_name, start_date=None, end_date=None):
+    """Render one owner's timetable rows as an iCalendar document
+
+    Classes become weekly recurring events from the first matching weekday
+    on or after the session start (today when the session has no dates) up
+    to the session end; exams become single events.
+
+    Args:
+        rows: timetable_entries rows for one owner and session
+        session_name: Academic session name, used in the calendar name
+        start_date: Session start date as "YYYY-MM-DD", optional
+        end_date: Session end date as "YYYY-MM-DD", optional
+
+    Returns:
+        str: The iCalendar document
+    """
+    start = datetime.strptime(start_date, "%Y-%m-%d") if start_date else datetime.now()
+    start = start.replace(hour=0, minute=0, second=0, microsecond=0)
+    until = f";UNTIL={end_date.replace('-', '')}T235959" if end_date else ""
+    stamp = _ical_stamp(datetime.now())
+
+    lines = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        "PRODID:-//Intellix//Timetable//EN",
+        f"X-WR-CALNAME:{_ical_text(session_name)}"
+    ]
+    for row in rows:
+        if row["kind"] == "class":
+            if row["day"] not in ROUTINE_DAYS or " - " not in row["time_slot"]:
+                continue
+            weekday = WEEKDAYS[row["day"]]
+            first = start + timedelta(days=(weekday - start.weekday()) % 7)
+            begin_text, end_text = row["time_slot"].split(" - ", 1)
+            summary = f"{row['course_code']} - {row['course_title']}"
+            uid = f"class-{row['course_id']}-{row['day']}-{row['slot_order']}"
+            rule = f"RRULE:FREQ=WEEKLY{until}"
+        else:
+            first = datetime.fromisoformat(row["exam_date"])
+            begin_text, end_text = row["start_time"], row["end_time"]
+            summary = f"{row['exam_type'] or 'Exam'} Exam: {row['course_code']} - {row['course_title']}"
+            uid = f"exam-{row['course_id']}-{row['exam_date']}-{row['exam_type']}"
+            rule = None
+
+        begin_hour, begin_minute = _parse_time(begin_text)
+        end_hour, end_minute = _parse_time(end_text)
+        begin = first.replace(hour=begin_hour, minute=begin_minute)
+        end = first.replace(hour=end_hour, minute=end_minute)
+        lines += [
+            "BEGIN:VEVENT",
+            f"UID:{uid}-{_ical_text(session_name).replace(' ', '')}@intellix",
+            f"DTSTAMP:{stamp}",
+            f"DTSTART:{_ical_stamp(begin)}",
+            f"DTEND:{_ical_stamp(end)}",
+            f"SUMMARY:{_ical_text(summary)}",
+            f"LOCATION:{_ical_text(row['room'])}"
+        ]
+        if rule:
+            lines.append(rule)
+        if row["teacher_name"]:
+            lines.append(f"DESCRIPTION:{_ical_text('Instructor: ' + row['teacher_name'])}")
+        lines.append("END:VEVENT")
+    lines.append("END:VCALENDAR")
+    return "\r\n".join(lines) + "\r\n"
+
+def refresh_dirty_timetables(conn, limit=TIMETABLE_BATCH_SIZE):
+    """Rebuild the timetables of up to ``limit`` owners marked in timetable_dirty
+
+    The owners' rows are produced with set-based INSERT ... SELECT statements
+    and their iCalendar blobs are rendered from them, all in one short
+    transaction that also clears their dirty marks.
+
+    Args:
+        conn: Open database connection
+        limit: Maximum number of owners rebuilt
+
+    Returns:
+        dict: Counts of owners rebuilt and timetable rows and calendars written
+    """
+    try:
+        begin_immediate(conn)
+        conn.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS timetable_batch (
+                owner_role TEXT NOT NULL,
+                owner_id INTEGER NOT NULL,
+                session TEXT NOT NULL,
+                PRIMARY KEY (owner_role, owner_id, session)
+            ) WITHOUT ROWID
+        """)
+        conn.execute("DELETE FROM temp.timetable_batch")
+        owners = conn.execute("""
+            INSERT INTO temp.timetable_batch (owner_role, owner_id, session)
+            SELECT owner_role, owner_id, session FROM timetable_dirty
+            ORDER BY session, owner_role, owner_id
+            LIMIT ?
+        """, (limit,)).rowcount
+
+        conn.execute(f"DELETE FROM timetable_entries WHERE {IN_BATCH}")
+        conn.execute(f"DELETE FROM timetable_ical WHERE {IN_BATCH}")
+        for query in MATERIALIZE_QUERIES:
+            conn.execute(query)
+
+        dates = {
+            row["name"]: (row["start_date"], row["end_date"])
+            for row in conn.execute("""
+                SELECT name, start_date, end_date FROM academic_sessions
+                WHERE name IN (SELECT session FROM temp.timetable_batch)
+            """).fetchall()
+        }
+
+        calendars = {}
+        for row in conn.execute("""
+            SELECT t.* FROM temp.timetable_batch b
+            JOIN timetable_entries t
+              ON t.owner_role = b.owner_role AND t.owner_id = b.owner_id AND t.session = b.session
+            ORDER BY t.session, t.owner_role, t.owner_id, t.kind, t.day_order, t.slot_order, t.exam_date, t.start_time
+        """).fetchall():
+            calendars.setdefault((row["owner_role"], row["owner_id"], row["session"]), []).append(row)
+
+        conn.executemany(
+            "INSERT INTO timetable_ical (owner_role, owner_id, session, ical) VALUES (?, ?, ?, ?)",
+            [(role, owner_id, session_name, build_ical(rows, session_name, *dates.get(session_name, (None, None))))
+             for (role, owner_id, session_name), rows in calendars.items()]
+        )
+        conn.execute(f"DELETE FROM timetable_dirty WHERE {IN_BATCH}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    return {"owners": owners, "rows": sum(len(rows) for rows in calendars.values()), "calendars": len(calendars)}
+
+def refresh_all_timetables(conn=None):
+    """Rebuild every out-of-date timetable, one batch of owners per transaction
+
+    Returns:
+        dict: Totals of the counts returned by refresh_dirty_timetables
+    """
+    own_conn = conn is None
+    conn = conn or get_db_connection()
+    totals = {"owners": 0, "rows": 0, "calendars": 0}
+    try:
+        while True:
+            batch = refresh_dirty_timetables(conn)
+            if not batch["owners"]:
+                return totals
+            for key in totals:
+                totals[key] += batch[key]
+    finally:
+        if own_conn:
+            conn.close()
+
+def refresh_timetables(conn, session_name):
+    """Rebuild every student and teacher timetable of a session
+
+    All of the session's owners are marked out of date and rebuilt in
+    batches, along with anything else already waiting.
+
+    Args:
+        conn: Open database connection
+        session_name: Academic session name
+
+    Returns:
+        dict: Counts of owners rebuilt and timetable rows and calendars written
+    """
+    conn.execute("""
+        INSERT OR IGNORE INTO timetable_dirty (owner_role, owner_id, session)
+        SELECT 'student', student_id, semester FROM enrollments WHERE semester = ?1
+        UNION SELECT 'teacher', teacher_id, semester FROM teaching WHERE semester = ?1
+        UNION SELECT 'teacher', teacher_id, session FROM class_routine WHERE session = ?1
+        UNION SELECT owner_role, owner_id, session FROM timetable_ical WHERE session = ?1
+    """, (session_name,))
+    conn.commit()
+    return refresh_all_timetables(conn)
+
+def get_weekly_timetable(conn, role, owner_id, session_name):
+    """Get an owner's weekly classes in day and time-slot order
+
+    Getters only read the materialized rows; changes show up once the
+    worker has rebuilt the owners they marked out of date.
+
+    Args:
+        conn: Open database connection
+        role: "student" or "teacher"
+        owner_id: students.id or teachers.id
+        session_name: Academic session name
+
+    Returns:
+        list: timetable_entries rows
+    """
+    return conn.execute("""
+        SELECT * FROM timetable_entries
+        WHERE owner_role = ? AND owner_id = ? AND session = ? AND kind = 'class'
+        ORDER BY day_order, slot_order
+    """, (role, owner_id, session_name)).fetchall()
+
+def get_classes_on_day(conn, role, owner_id, session_name, day=None):
+    """Get an owner's classes on one weekday (today by default) in time order"""
+    day = day or datetime.now().strftime("%A")
+    if day not in ROUTINE_DAYS:
+        return []
+    return conn.execute("""
+        SELECT * FROM timetable_entries
+        WHERE owner_role = ? AND owner_id = ? AND session = ? AND kind = 'class' AND day_order = ?
+        ORDER BY slot_order
+    """, (role, owner_id, session_name, ROUTINE_DAYS.index(day))).fetchall()
+
+def get_exam_timetable(conn, role, owner_id, session_name, since=None, until=None, limit=None):
+    """Get an owner's exams in date order
+
+    Args:
+        conn: Open database connection
+        role: "student" or "teacher"
+        owner_id: students.id or teachers.id
+        session_name: Academic session name
+        since: Optional earliest exam date ("YYYY-MM-DD")
+        until: Optional latest exam date ("YYYY-MM-DD")
+        limit: Optional maximum number of rows
+
+    Returns:
+        list: timetable_entries rows
+    """
+    query = """
+        SELECT * FROM timetable_entries
+        WHERE owner_role = ? AND owner_id = ? AND session = ? AND kind = 'exam'
+    """
+    params = [role, owner_id, session_name]
+    if since:
+        query += " AND exam_date >= ?"
+        params.append(since)
+    if until:
+        query += " AND exam_date <= ?"
+        params.append(until)
+    query += " ORDER BY exam_date, start_time"
+    if limit:
+        query += " LIMIT ?"
+        params.append(limit)
+    return conn.execute(query, params).fetchall()
+
+def get_ical(conn, role, owner_id, session_name):
+    """Get an owner's iCalendar export, or None if they have nothing scheduled"""
+    row = conn.execute(
+        "SELECT ical FROM timetable_ical WHERE owner_role = ? AND owner_id = ? AND session = ?",
+        (role, owner_id, session_name)
+    ).fetchone()
+    return row["ical"] if row else None
+
+def weekly_grid(rows):
+    """Arrange weekly class rows as {day: {time_slot: [rows]}} for grid displays"""
+    grid = {day: {slot: [] for slot in ROUTINE_TIME_SLOTS} for day in ROUTINE_DAYS}
+    for row in rows:
+        if row["day"] in grid and row["time_slot"] in grid[row["day"]]:
+            grid[row["day"]][row["time_slot"]].append(row)
+    return grid
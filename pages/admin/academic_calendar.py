@@ -1,8 +1,12 @@
 import streamlit as st
 import pandas as pd
-import numpy as np
 from datetime import datetime, timedelta
 from database.schema import get_db_connection
+from models.scheduler import (
+    schedule_routine, schedule_exams, repair_routine, repair_exam_schedule, has_exam_type_column,
+    get_schedule_blocks, clear_schedule_blocks,
+    ROUTINE_DAYS, ROUTINE_TIME_SLOTS, ROUTINE_ROOMS, EXAM_HALLS
+)
 from components.header import render_page_title
 
 def show():
@@ -52,15 +56,46 @@ def show():
                     # Delete existing routine
                     delete_existing_routine(conn, active_session['name'])
                     # Generate new routine
-                    generate_routine(conn, courses_with_teachers, active_session['name'])
+                    st.session_state.routine_report = generate_routine(conn, courses_with_teachers, active_session['name'])
                     st.success("New routine generated successfully!")
                     st.rerun()
+                
+                # Incremental changes keep every unaffected class where it is
+                if st.button("Update for Changes", help="Schedule new courses and teacher changes without moving other classes"):
+                    st.session_state.routine_report = repair_routine(conn, active_session['name'])
+                    st.rerun()
+                
+                with st.expander("Block Room or Day"):
+                    block_day = st.selectbox("Day", ["Any"] + ROUTINE_DAYS, key="block_routine_day")
+                    block_room = st.selectbox("Room", ["Any"] + ROUTINE_ROOMS, key="block_routine_room")
+                    if st.button("Block and Reschedule"):
+                        block = {}
+                        if block_day != "Any":
+                            block["day"] = block_day
+                        if block_room != "Any":
+                            block["room"] = block_room
+                        if block:
+                            st.session_state.routine_report = repair_routine(conn, active_session['name'], [block])
+                            st.rerun()
+                        else:
+                            st.warning("Select a day, a room or both to block.")
+                    
+                    # Blocks stay in force for every later update until they are lifted
+                    routine_blocks = get_schedule_blocks(conn, active_session['name'], "routine")
+                    if routine_blocks:
+                        st.write("**Blocked:** " + "; ".join(", ".join(b.values()) for b in routine_blocks))
+                        if st.button("Lift All Blocks", key="lift_routine_blocks"):
+                            clear_schedule_blocks(conn, active_session['name'], "routine")
+                            st.rerun()
             else:
                 if st.button("Generate Routine", type="primary"):
                     # Generate new routine
-                    generate_routine(conn, courses_with_teachers, active_session['name'])
+                    st.session_state.routine_report = generate_routine(conn, courses_with_teachers, active_session['name'])
                     st.success("Routine generated successfully!")
                     st.rerun()
+            
+            if "routine_report" in st.session_state:
+                show_routine_report(st.session_state.routine_report)
         
         with col1:
             # Display the routine
@@ -97,21 +132,45 @@ def show():
         with col2:
             st.write("**Actions:**")
             
+            exam_type = st.selectbox("Exam Type", ["Midterm", "Final"], index=1)
+            
             if exam_schedule_exists:
                 if st.button("Generate New Exam Schedule", type="primary"):
-                    # Delete existing exam schedule
-                    delete_existing_exam_schedule(conn, active_session['name'])
-                    # Generate new exam schedule
-                    generate_exam_schedule(conn, courses, active_session['name'])
+                    # Regenerating replaces the existing exams of the selected type
+                    st.session_state.exam_report = generate_exam_schedule(conn, courses, active_session['name'], exam_type)
                     st.success("New exam schedule generated successfully!")
                     st.rerun()
+                
+                if st.button("Update for Changes", key="update_exams", help="Add exams for new courses without moving existing exams"):
+                    st.session_state.exam_report = repair_exam_schedule(conn, courses, active_session['name'], exam_type)
+                    st.rerun()
+                
+                with st.expander("Block Date or Hall"):
+                    block_date = st.date_input("Date", key="block_exam_date")
+                    block_hall = st.selectbox("Hall", ["All Halls"] + list(EXAM_HALLS), key="block_exam_hall")
+                    if st.button("Block and Reschedule", key="block_exams"):
+                        block = {"exam_date": block_date.strftime("%Y-%m-%d")}
+                        if block_hall != "All Halls":
+                            block["room"] = block_hall
+                        st.session_state.exam_report = repair_exam_schedule(conn, courses, active_session['name'], exam_type, [block])
+                        st.rerun()
+                    
+                    exam_blocks = get_schedule_blocks(conn, active_session['name'], "exam")
+                    if exam_blocks:
+                        st.write("**Blocked:** " + "; ".join(", ".join(b.values()) for b in exam_blocks))
+                        if st.button("Lift All Blocks", key="lift_exam_blocks"):
+                            clear_schedule_blocks(conn, active_session['name'], "exam")
+                            st.rerun()
             else:
                 if st.button("Generate Exam Schedule", type="primary"):
                     # Generate new exam schedule
-                    generate_exam_schedule(conn, courses, active_session['name'])
+                    st.session_state.exam_report = generate_exam_schedule(conn, courses, active_session['name'], exam_type)
                     st.success("Exam schedule generated successfully!")
                     st.rerun()
         
+        if "exam_report" in st.session_state:
+            show_exam_report(st.session_state.exam_report)
+        
         with col1:
             # Display the exam schedule
             if exam_schedule_exists:
@@ -175,12 +234,6 @@ def delete_existing_routine(conn, session_name):
     cursor.execute("DELETE FROM class_routine WHERE session = ?", (session_name,))
     conn.commit()
 
-def delete_existing_exam_schedule(conn, session_name):
-    """Delete existing exam schedule for the current session"""
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM exam_schedule WHERE session = ?", (session_name,))
-    conn.commit()
-
 def create_routine_table_if_not_exists(conn):
     """Create class_routine table if it doesn't exist"""
     cursor = conn.cursor()
@@ -210,214 +263,80 @@ def create_exam_schedule_table_if_not_exists(conn):
             start_time TEXT NOT NULL,
             end_time TEXT NOT NULL,
             room TEXT NOT NULL,
+            exam_type TEXT NOT NULL DEFAULT 'Final',
             session TEXT NOT NULL,
             FOREIGN KEY (course_id) REFERENCES courses (id)
         )
     """)
+    # Tables created by older versions of this page have no exam_type column
+    if not has_exam_type_column(conn):
+        cursor.execute("ALTER TABLE exam_schedule ADD COLUMN exam_type TEXT NOT NULL DEFAULT 'Final'")
     conn.commit()
 
 def generate_routine(conn, courses_with_teachers, session_name):
-    """Generate a weekly class routine"""
+    """Generate a weekly class routine
+
+    Classes are placed by the constraint scheduler, which never double-books
+    a teacher or a room and keeps courses that share students apart.
+
+    Returns:
+        dict: Scheduler report with placed, unplaced and clashes
+    """
     # Create routine table if it doesn't exist
     create_routine_table_if_not_exists(conn)
-    
-    # Define days and time slots
-    days = ["Sunday", "Monday", "Tuesday", "Wednesday", "Thursday"]
-    time_slots = [
-        "8:00 AM - 9:30 AM",
-        "9:45 AM - 11:15 AM", 
-        "11:30 AM - 1:00 PM",
-        "2:00 PM - 3:30 PM",
-        "3:45 PM - 5:15 PM"
-    ]
-    
-    # Prepare room numbers
-    rooms = [f"Room {i:03d}" for i in range(101, 121)]
-    
-    # Track assigned slots for each teacher to avoid conflicts
-    teacher_slots = {}
-    
-    # Track assigned slots for each course to distribute classes
-    course_slots = {}
-    
-    # Initialize random seed for consistent but random-looking assignments
-    np.random.seed(42)
-    
-    # Convert courses to a list for easier manipulation
-    courses_list = list(courses_with_teachers)
-    
-    # Shuffle courses to randomize allocation
-    np.random.shuffle(courses_list)
-    
-    for course in courses_list:
-        course_id = course["course_id"]
-        teacher_id = course["teacher_id"]
-        credit = course["credit"]
-        
-        # Determine how many classes per week based on credit hours
-        classes_per_week = min(int(credit), 3)  # Max 3 classes per week
-        
-        if teacher_id not in teacher_slots:
-            teacher_slots[teacher_id] = set()
-        
-        if course_id not in course_slots:
-            course_slots[course_id] = set()
-        
-        # Try to assign classes
-        for _ in range(classes_per_week):
-            # Try to find a suitable day and time slot
-            found_slot = False
-            
-            # Shuffle days and time slots for more balanced allocation
-            shuffled_days = days.copy()
-            np.random.shuffle(shuffled_days)
-            
-            for day in shuffled_days:
-                if found_slot:
-                    break
-                
-                shuffled_slots = time_slots.copy()
-                np.random.shuffle(shuffled_slots)
-                
-                for time_slot in shuffled_slots:
-                    slot_key = f"{day}_{time_slot}"
-                    
-                    # Check if teacher is available at this slot
-                    if slot_key in teacher_slots[teacher_id]:
-                        continue
-                    
-                    # Check if course already has a class at this slot
-                    if slot_key in course_slots[course_id]:
-                        continue
-                    
-                    # Assign the slot
-                    teacher_slots[teacher_id].add(slot_key)
-                    course_slots[course_id].add(slot_key)
-                    
-                    # Assign a random room
-                    room = np.random.choice(rooms)
-                    
-                    # Save to database
-                    conn.execute("""
-                        INSERT INTO class_routine 
-                        (course_id, teacher_id, day, time_slot, room, session)
-                        VALUES (?, ?, ?, ?, ?, ?)
-                    """, (course_id, teacher_id, day, time_slot, room, session_name))
-                    
-                    found_slot = True
-                    break
-    
-    conn.commit()
 
-def generate_exam_schedule(conn, courses, session_name):
-    """Generate an exam schedule"""
+    return schedule_routine(conn, courses_with_teachers, session_name)
+
+def show_routine_report(report):
+    """Show classes the scheduler could not place or had to overlap"""
+    if report["unplaced"]:
+        st.warning(f"{len(report['unplaced'])} course section(s) could not be fully scheduled:")
+        st.dataframe(pd.DataFrame([
+            {"Course": s["course_code"], "Teacher": s["teacher_name"],
+             "Classes Needed": s["classes"], "Not Placed": s["missing"]}
+            for s in report["unplaced"]
+        ]), hide_index=True)
+    if report["clashes"]:
+        st.info(f"{len(report['clashes'])} class(es) overlap with another course that shares students.")
+    if "kept" in report:
+        st.caption(f"Kept {report['kept']} classes, moved or removed {report['removed']}, "
+                   f"reassigned {report['reassigned']} to new teachers, placed {report['entries']} new.")
+
+def generate_exam_schedule(conn, courses, session_name, exam_type="Final"):
+    """Generate an exam schedule
+
+    Exams are timetabled by the conflict-aware exam scheduler: courses that
+    share students are kept apart, back-to-back exams are minimised and
+    seats are packed into exam halls by course size.
+
+    Returns:
+        dict: Quality report from the scheduler
+    """
     # Create exam schedule table if it doesn't exist
     create_exam_schedule_table_if_not_exists(conn)
-    
-    # Define start date for exams (2 weeks from now)
-    start_date = datetime.now() + timedelta(days=14)
-    start_date = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
-    
-    # Only use weekdays (Monday to Friday)
-    weekdays = [0, 1, 2, 3, 4]  # Monday is 0, Sunday is 6
-    
-    # Define exam slots
-    exam_slots = [
-        ("9:00 AM", "11:00 AM"),
-        ("12:00 PM", "2:00 PM"),
-        ("3:00 PM", "5:00 PM")
-    ]
-    
-    # Prepare room numbers for exams
-    exam_rooms = [f"Exam Hall {i:02d}" for i in range(1, 11)]
-    
-    # Track used rooms for each slot
-    used_rooms = {}
-    
-    # Track exams per day to limit them
-    exams_per_day = {}
-    
-    # Limit the number of exams per day
-    max_exams_per_day = 6
-    
-    # Convert courses to a list for easier manipulation
-    courses_list = list(courses)
-    
-    # Shuffle courses to randomize allocation
-    np.random.seed(42)
-    np.random.shuffle(courses_list)
-    
-    # Current date for scheduling
-    current_date = start_date
-    
-    for course in courses_list:
-        course_id = course["id"]
-        
-        # Find a suitable date and slot
-        found_slot = False
-        
-        while not found_slot:
-            # Skip weekends
-            while current_date.weekday() not in weekdays:
-                current_date += timedelta(days=1)
-            
-            # Format the date for checking
-            date_str = current_date.strftime("%Y-%m-%d")
-            
-            # Check if we have too many exams on this day
-            if date_str in exams_per_day and exams_per_day[date_str] >= max_exams_per_day:
-                current_date += timedelta(days=1)
-                continue
-            
-            # Initialize the day if not already
-            if date_str not in exams_per_day:
-                exams_per_day[date_str] = 0
-                used_rooms[date_str] = {}
-                for slot_start, slot_end in exam_slots:
-                    used_rooms[date_str][f"{slot_start}-{slot_end}"] = set()
-            
-            # Try to find an available slot and room on this day
-            for slot_start, slot_end in exam_slots:
-                slot_key = f"{slot_start}-{slot_end}"
-                
-                # Check available rooms for this slot
-                available_rooms = set(exam_rooms) - used_rooms[date_str][slot_key]
-                
-                if available_rooms:
-                    # Assign a random available room
-                    room = np.random.choice(list(available_rooms))
-                    used_rooms[date_str][slot_key].add(room)
-                    
-                    # Update exams count for this day
-                    exams_per_day[date_str] += 1
-                    
-                    # Save to database
-                    conn.execute("""
-                        INSERT INTO exam_schedule 
-                        (course_id, exam_date, start_time, end_time, room, session)
-                        VALUES (?, ?, ?, ?, ?, ?)
-                    """, (course_id, date_str, slot_start, slot_end, room, session_name))
-                    
-                    found_slot = True
-                    break
-            
-            # Move to next day if no slot found on this day
-            if not found_slot:
-                current_date += timedelta(days=1)
-    
-    conn.commit()
+
+    return schedule_exams(conn, courses, session_name, exam_type)
+
+def show_exam_report(report):
+    """Show the quality report of the last generated exam schedule"""
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Exams Scheduled", report["scheduled"])
+    col2.metric("Exam Days", report["days"])
+    col3.metric("Student Clashes", report["student_clashes"])
+    col4.metric("Back-to-Back", report["back_to_back"])
+    st.caption(f"Hall seat utilisation: {report['seat_utilisation']}%")
+    if "kept" in report:
+        st.caption(f"Kept {report['kept']} exams, removed {report['removed']}, placed {report['placed']} new.")
+    if report["unplaced"]:
+        st.warning(f"{len(report['unplaced'])} exam(s) could not be scheduled:")
+        st.dataframe(pd.DataFrame([
+            {"Course": u["code"], "Seats": u["seats"], "Reason": u["reason"]} for u in report["unplaced"]
+        ]), hide_index=True)
 
 def display_routine(conn, session_name):
     """Display the class routine in a tabular format"""
-    # Define days and time slots
-    days = ["Sunday", "Monday", "Tuesday", "Wednesday", "Thursday"]
-    time_slots = [
-        "8:00 AM - 9:30 AM",
-        "9:45 AM - 11:15 AM", 
-        "11:30 AM - 1:00 PM",
-        "2:00 PM - 3:30 PM",
-        "3:45 PM - 5:15 PM"
-    ]
+    days = ROUTINE_DAYS
+    time_slots = ROUTINE_TIME_SLOTS
     
     # Fetch all routine entries
     cursor = conn.cursor()
@@ -505,7 +424,7 @@ def display_exam_schedule(conn, session_name):
     # Fetch all exam schedule entries
     cursor = conn.cursor()
     cursor.execute("""
-        SELECT e.exam_date, e.start_time, e.end_time, e.room,
+        SELECT e.exam_date, e.start_time, e.end_time, e.room, e.exam_type,
                c.code as course_code, c.title as course_title
         FROM exam_schedule e
         JOIN courses c ON e.course_id = c.id
@@ -546,6 +465,7 @@ def display_exam_schedule(conn, session_name):
         for entry in entries:
             date_data.append({
                 "Course": f"{entry['course_code']} - {entry['course_title']}",
+                "Type": entry["exam_type"],
                 "Time": f"{entry['start_time']} - {entry['end_time']}",
                 "Room": entry["room"]
             })
@@ -554,6 +474,7 @@ def display_exam_schedule(conn, session_name):
             exam_data.append({
                 "Date": formatted_date,
                 "Course": f"{entry['course_code']} - {entry['course_title']}",
+                "Type": entry["exam_type"],
                 "Time": f"{entry['start_time']} - {entry['end_time']}",
                 "Room": entry["room"]
             })
@@ -3,9 +3,11 @@ import pandas as pd
 import plotly.express as px
 from database.schema import get_db_connection
 from components.header import render_page_title
-from models.command_parser import parse_command, execute_command
+from models.command_parser import parse_command, execute_command, undo_command, get_command_history
 from models.gpa_predictor import predict_gpa
+from models.gpa_model import active_model_version
 from models.study_plan import generate_study_plan
+from models.jobs import enqueue_job, list_jobs, cancel_job, JOB_LABELS
 from datetime import datetime, timedelta
 
 def show():
@@ -13,7 +15,7 @@ def show():
     render_page_title("🤖", "AI Tools")
     
     # Create tabs for different AI tools
-    tab1, tab2, tab3, tab4 = st.tabs(["Command Assistant", "Risk Analysis", "GPA Predictor", "Study Plan Generator"])
+    tab1, tab2, tab3, tab4, tab5 = st.tabs(["Command Assistant", "Risk Analysis", "GPA Predictor", "Study Plan Generator", "Background Jobs"])
     
     # Tab 1: Command Assistant (Enhanced)
     with tab1:
@@ -23,6 +25,8 @@ def show():
         
         - "Assign student 101 to CSE303"
         - "Enroll students 101, 102 to courses CSE303, CSE304 for Fall 2023"
+        - "Enroll students 101-250 to CSE303"
+        - "Enroll all students in department computer science to CSE303"
         - "Assign teacher 10 to CSE402"
         - "Show all students in CSE101"
         - "Move students from CSE201 to CSE202"
@@ -51,45 +55,78 @@ def show():
         with col1:
             if st.button("Parse Command", use_container_width=True):
                 if command_text:
-                    # Parse command
-                    parsed_command = parse_command(command_text)
-                    
-                    if parsed_command["valid"]:
-                        st.success(f"Command parsed successfully: {parsed_command['message']}")
-                        
-                        # Show command details
-                        st.json(parsed_command)
-                        
-                        # Ask for confirmation
-                        if st.button("Execute Command", type="primary"):
-                            result = execute_command(parsed_command)
-                            
-                            if result["success"]:
-                                st.success(result["message"])
-                                
-                                # Show operation details
-                                if "details" in result:
-                                    for detail in result["details"]:
-                                        st.write(f"- {detail}")
-                            else:
-                                st.error(result["message"])
-                                
-                                # Show operation details
-                                if "details" in result:
-                                    for detail in result["details"]:
-                                        st.write(f"- {detail}")
-                    else:
-                        st.error("Invalid command. Please check the examples and try again.")
+                    # Parse command and keep it across reruns so it can be previewed and executed
+                    st.session_state.parsed_command = parse_command(command_text)
+                    st.session_state.command_result = None
                 else:
+                    st.session_state.parsed_command = None
                     st.warning("Please enter a command")
         
         with col2:
             st.button("🎤 Voice Input", use_container_width=True, help="Click to speak your command (not implemented yet)")
         
+        parsed_command = st.session_state.get("parsed_command")
+        if parsed_command:
+            if parsed_command["valid"]:
+                st.success(f"Command parsed successfully: {parsed_command['message']}")
+                
+                # Show the compact execution plan
+                st.json(parsed_command["plan"])
+                
+                preview_col, execute_col = st.columns(2)
+                executed_by = (st.session_state.get("user") or {}).get("username")
+                
+                if preview_col.button("Preview Changes (Dry Run)", use_container_width=True):
+                    st.session_state.command_result = execute_command(parsed_command, dry_run=True, executed_by=executed_by)
+                
+                # Ask for confirmation
+                if execute_col.button("Execute Command", type="primary", use_container_width=True):
+                    st.session_state.command_result = execute_command(parsed_command, executed_by=executed_by)
+                    st.session_state.parsed_command = None
+            else:
+                st.error(parsed_command.get("message") or "Invalid command. Please check the examples and try again.")
+        
+        result = st.session_state.get("command_result")
+        if result:
+            if result["success"]:
+                if result.get("dry_run"):
+                    st.info(f"Dry run: {result['message']}")
+                    delta_cols = st.columns(max(len(result["delta"]), 1))
+                    for delta_col, (key, value) in zip(delta_cols, result["delta"].items()):
+                        delta_col.metric(key.replace("_", " ").title(), value)
+                    st.caption(f"Estimated cost: {result['cost'].get('rows_to_write', 0)} rows in {result['cost'].get('write_statements', 0)} write statements")
+                else:
+                    st.success(result["message"])
+                
+                if result.get("rows"):
+                    st.dataframe(pd.DataFrame(result["rows"]), use_container_width=True, hide_index=True)
+            else:
+                st.error(result["message"])
+            
+            # Show operation details
+            for detail in result.get("details", []):
+                st.write(f"- {detail}")
+        
         # Command history
         with st.expander("Command History"):
-            st.info("Recent commands will appear here after execution")
-            # This would be populated from a database of previous commands
+            history = get_command_history(limit=20)
+            if history:
+                for entry in history:
+                    entry_cols = st.columns([4, 1.2, 1, 1])
+                    entry_cols[0].write(f"**#{entry['id']}** {entry['command_text']}  \n{entry['message'] or ''}")
+                    entry_cols[1].write(f"{entry['status']}  \n{entry['created_at']}")
+                    entry_cols[2].write(f"{entry['duration_ms'] or 0:.0f} ms")
+                    if entry['status'] == "executed" and entry['operation'] not in ("show_students", "show_courses"):
+                        if entry_cols[3].button("Undo", key=f"undo_command_{entry['id']}"):
+                            undo_result = undo_command(entry['id'])
+                            if undo_result["success"]:
+                                st.success(undo_result["message"])
+                                for detail in undo_result["details"]:
+                                    st.write(f"- {detail}")
+                            else:
+                                st.error(undo_result["message"])
+            else:
+                st.info("Recent commands will appear here after execution")
     
     # Tab 2: Risk Analysis (New)
     with tab2:
@@ -562,4 +599,92 @@ def show():
         else:
             st.info("No students found in the database")
         
-        conn.close() 
\ No newline at end of file
+        conn.close() 
+    
+    # Tab 5: Background Jobs
+    with tab5:
+        show_background_jobs()
+
+def show_background_jobs():
+    """Enqueue heavy recomputations and follow their progress"""
+    st.subheader("Background Jobs")
+    st.write("Heavy recomputations run in worker processes. You can leave or refresh this page while they run.")
+    
+    conn = get_db_connection()
+    active_session = conn.execute("SELECT name FROM academic_sessions WHERE is_active = 1").fetchone()
+    semesters = [row['semester'] for row in conn.execute(
+        "SELECT DISTINCT semester FROM enrollments ORDER BY semester DESC"
+    ).fetchall()]
+    departments = [row['dept'] for row in conn.execute("SELECT DISTINCT dept FROM students ORDER BY dept").fetchall()]
+    conn.close()
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        job_type = st.selectbox("Job", list(JOB_LABELS), format_func=lambda j: JOB_LABELS[j], key="job_type_select")
+    
+    params = {}
+    with col2:
+        if job_type in ("generate_study_plans", "predict_gpa"):
+            if not semesters:
+                st.info("No enrollments found.")
+                return
+            params["semester"] = st.selectbox("Semester", semesters, key="job_semester_select")
+            department = st.selectbox("Department", ["All"] + departments, key="job_department_select")
+            if department != "All":
+                params["department"] = department
+        elif job_type == "train_gpa_model":
+            version = active_model_version()
+            st.write(f"**Active model:** {f'v{version}' if version else 'none (rule-based predictions)'}")
+        elif job_type == "regrade_class_tests":
+            st.write("Rescores submissions of every class test whose answer key changed after grading.")
+        elif job_type == "sweep_test_attempts":
+            st.write("Submits class test attempts whose time ran out. Workers also do this automatically.")
+        elif job_type == "collect_blob_garbage":
+            st.write("Deletes uploaded files and photos that no submission or profile refers to any more.")
+            params["recount"] = st.checkbox("Recount references first", value=True)
+        elif job_type == "deliver_notifications":
+            st.write("Sends notifications for queued events now. Workers also do this automatically.")
+        else:
+            if not active_session:
+                st.warning("No active academic session.")
+                return
+            params["session"] = active_session['name']
+            st.write(f"**Session:** {active_session['name']}")
+            if job_type == "generate_exam_schedule":
+                params["exam_type"] = st.selectbox("Exam Type", ["Midterm", "Final"], index=1, key="job_exam_type")
+    
+    if st.button("Run in Background", type="primary"):
+        job_id = enqueue_job(job_type, params, created_by=st.session_state.user.get('username'))
+        st.success(f"Job #{job_id} queued.")
+    
+    st.divider()
+    header_col, refresh_col = st.columns([4, 1])
+    header_col.write("**Recent Jobs**")
+    if refresh_col.button("Refresh", key="refresh_jobs"):
+        st.rerun()
+    
+    jobs = list_jobs(limit=15)
+    if not jobs:
+        st.info("No jobs have been run yet.")
+        return
+    
+    for job in jobs:
+        with st.container(border=True):
+            info_col, action_col = st.columns([5, 1])
+            with info_col:
+                st.write(f"**#{job['id']} {JOB_LABELS.get(job['job_type'], job['job_type'])}** - {job['status']} "
+                         f"(attempt {job['attempts']}/{job['max_attempts']})")
+                st.caption(f"{job['params']} · queued {job['created_at']}"
+                           + (f" by {job['created_by']}" if job['created_by'] else ""))
+                if job['status'] in ('queued', 'running'):
+                    st.progress(job['progress'], text=job['progress_message'] or job['status'].capitalize())
+                elif job['status'] == 'succeeded' and job['result']:
+                    summary = {k: v for k, v in job['result'].items() if not isinstance(v, (dict, list))}
+                    st.caption(f"Result: {summary}")
+                elif job['status'] == 'failed' and job['error']:
+                    st.caption(f"Error: {job['error'].splitlines()[0]}")
+            with action_col:
+                if job['status'] in ('queued', 'running'):
+                    if st.button("Cancel", key=f"cancel_job_{job['id']}"):
+                        cancel_job(job['id'])
+                        st.rerun()
@@ -2,6 +2,8 @@ import streamlit as st
 import pandas as pd
 import json
 from database.schema import get_db_connection
+from models.enrollment import plan_enrollment_changes, apply_enrollment_changes, batch_enroll
+from models.seats import get_seat_availability, get_waitlist, reserve_seat, release_seat
 from components.header import render_page_title
 from datetime import datetime
 
@@ -273,22 +275,34 @@ def show():
                             ORDER BY s.name
                         """, (selected_course_id, active_session['name'])).fetchall()
                         
+                        # Seat counters are maintained on every enrollment change, so this is a single lookup
+                        seats = get_seat_availability(conn, [selected_course_id], active_session['name']).get(selected_course_id)
+                        if seats and seats["capacity"] is not None:
+                            st.progress(
+                                min(seats["enrolled"] / seats["capacity"], 1.0) if seats["capacity"] else 1.0,
+                                text=f"Seats: {seats['enrolled']}/{seats['capacity']} filled, {seats['waitlisted']} waitlisted"
+                            )
+                        
                         if enrolled_students:
                             st.write(f"**Enrolled Students ({len(enrolled_students)}):**")
                             for student in enrolled_students:
                                 col1, col2 = st.columns([3, 1])
                                 col1.write(f"{student['student_id']} - {student['name']}")
                                 if col2.button("Remove", key=f"remove_student_{student['id']}"):
-                                    # Remove enrollment
-                                    conn.execute(
-                                        "DELETE FROM enrollments WHERE student_id = ? AND course_id = ? AND semester = ?",
-                                        (student['id'], selected_course_id, active_session['name'])
-                                    )
-                                    conn.commit()
+                                    # Remove enrollment and give the seat to the next waitlisted student
+                                    release = release_seat(student['id'], selected_course_id, active_session['name'], conn=conn)
                                     st.success(f"Student {student['name']} removed from course")
+                                    if release["promoted"]:
+                                        st.info(f"{len(release['promoted'])} waitlisted student(s) enrolled into the freed seat")
                                     st.rerun()
                         else:
                             st.info("No students enrolled in this course for the current session")
+                        
+                        waitlisted_students = get_waitlist(conn, selected_course_id, active_session['name'])
+                        if waitlisted_students:
+                            st.write(f"**Waitlist ({len(waitlisted_students)}):**")
+                            for position, entry in enumerate(waitlisted_students, start=1):
+                                st.write(f"{position}. {entry['student_code']} - {entry['name']}")
                     
                     with col2:
                         st.write("**Enroll Students:**")
@@ -299,21 +313,13 @@ def show():
                         selected_student_id = student_options[selected_student_name]
                         
                         if st.button("Enroll Student"):
-                            # Check if already enrolled
-                            existing = conn.execute(
-                                "SELECT id FROM enrollments WHERE student_id = ? AND course_id = ? AND semester = ?",
-                                (selected_student_id, selected_course_id, active_session['name'])
-                            ).fetchone()
+                            reservation = reserve_seat(selected_student_id, selected_course_id, active_session['name'], conn=conn)
                             
-                            if existing:
+                            if reservation["status"] == "already_enrolled":
                                 st.error("Student is already enrolled in this course for the current session")
+                            elif reservation["status"] == "waitlisted":
+                                st.warning(f"This course is full. Student added to the waitlist at position {reservation['position']}.")
                             else:
-                                # Add enrollment
-                                conn.execute(
-                                    "INSERT INTO enrollments (student_id, course_id, semester) VALUES (?, ?, ?)",
-                                    (selected_student_id, selected_course_id, active_session['name'])
-                                )
-                                conn.commit()
                                 st.success("Student enrolled successfully")
                                 st.rerun()
                         
@@ -321,7 +327,17 @@ def show():
                         
                         # Bulk enrollment
                         st.write("**Bulk Enroll Students by ID:**")
-                        st.write("Select the students to enroll in this course:")
+                        bulk_course_names = st.multiselect(
+                            "Courses",
+                            options=list(course_options.keys()),
+                            default=[selected_course_name],
+                            key="bulk_enroll_courses"
+                        )
+                        bulk_course_ids = [course_options[name] for name in bulk_course_names]
+                        
+                        waitlist_overflow = st.checkbox("Waitlist students who do not get a seat", value=True)
+                        
+                        st.write("Select the students to enroll in these courses:")
                         selected_students = []
                         
                         # Show all students as checkboxes
@@ -330,37 +346,45 @@ def show():
                             if st.checkbox(student_name, key=f"student_{student['id']}"):
                                 selected_students.append(student['id'])
                         
-                        if st.button("Bulk Enroll"):
-                            if selected_students:
-                                success_count = 0
-                                error_count = 0
+                        bulk_col1, bulk_col2 = st.columns(2)
+                        bulk_action = None
+                        if bulk_col1.button("Bulk Enroll"):
+                            bulk_action = "enroll"
+                        if bulk_col2.button("Bulk Remove"):
+                            bulk_action = "remove"
+                        
+                        if bulk_action:
+                            if selected_students and bulk_course_ids:
+                                # Plan the whole students x courses delta, then apply it in one transaction
+                                plan = plan_enrollment_changes(
+                                    conn, selected_students, bulk_course_ids, active_session['name'], bulk_action
+                                )
+                                summary = apply_enrollment_changes(conn, plan, waitlist_overflow)
                                 
-                                for student_id in selected_students:
-                                    # Check if already enrolled
-                                    existing = conn.execute(
-                                        "SELECT id FROM enrollments WHERE student_id = ? AND course_id = ? AND semester = ?",
-                                        (student_id, selected_course_id, active_session['name'])
-                                    ).fetchone()
-                                    
-                                    if not existing:
-                                        # Add enrollment
-                                        conn.execute(
-                                            "INSERT INTO enrollments (student_id, course_id, semester) VALUES (?, ?, ?)",
-                                            (student_id, selected_course_id, active_session['name'])
-                                        )
-                                        success_count += 1
-                                    else:
-                                        error_count += 1
+                                if summary["enrolled"] > 0:
+                                    st.success(f"Successfully created {summary['enrolled']} enrollments.")
                                 
-                                conn.commit()
+                                if summary["removed"] > 0:
+                                    st.success(f"Successfully removed {summary['removed']} enrollments.")
                                 
-                                if success_count > 0:
-                                    st.success(f"Successfully enrolled {success_count} students.")
+                                if summary["unchanged"] > 0:
+                                    skipped_reason = "already enrolled" if bulk_action == "enroll" else "not enrolled"
+                                    st.warning(f"{summary['unchanged']} student-course pairs were skipped ({skipped_reason}).")
                                 
-                                if error_count > 0:
-                                    st.warning(f"{error_count} students were skipped (already enrolled).")
+                                if summary["over_capacity"] > 0:
+                                    full_courses = [info["code"] for info in plan["courses"].values()
+                                                    if info["max_students"] is not None and info["after"] >= info["max_students"]]
+                                    st.warning(f"{summary['over_capacity']} enrollments were rejected because these courses are full: {', '.join(full_courses)}")
+                                
+                                if summary["waitlisted"] > 0:
+                                    st.info(f"{summary['waitlisted']} student-course pairs were added to waitlists.")
+                                
+                                if summary["promoted"] > 0:
+                                    st.info(f"{summary['promoted']} waitlisted students were enrolled into freed seats.")
                                 
                                 st.rerun()
+                            else:
+                                st.info("Select at least one student and one course")
                 else:
                     st.warning("No students found in the database")
             else:
@@ -519,33 +543,16 @@ def show():
                                     
                                     if st.button("Confirm Enrollment"):
                                         if selected_students:
-                                            success_count = 0
-                                            error_count = 0
-                                            
-                                            for student_id in selected_students:
-                                                # Check if already enrolled
-                                                existing = conn.execute(
-                                                    "SELECT id FROM enrollments WHERE student_id = ? AND course_id = ? AND semester = ?",
-                                                    (student_id, selected_course_id, active_session['name'])
-                                                ).fetchone()
-                                                
-                                                if not existing:
-                                                    # Add enrollment
-                                                    conn.execute(
-                                                        "INSERT INTO enrollments (student_id, course_id, semester) VALUES (?, ?, ?)",
-                                                        (student_id, selected_course_id, active_session['name'])
-                                                    )
-                                                    success_count += 1
-                                                else:
-                                                    error_count += 1
+                                            summary = batch_enroll(selected_students, [selected_course_id], active_session['name'], conn=conn)
                                             
-                                            conn.commit()
+                                            if summary["enrolled"] > 0:
+                                                st.success(f"Successfully enrolled {summary['enrolled']} students.")
                                             
-                                            if success_count > 0:
-                                                st.success(f"Successfully enrolled {success_count} students.")
+                                            if summary["unchanged"] > 0:
+                                                st.warning(f"{summary['unchanged']} students were skipped (already enrolled).")
                                             
-                                            if error_count > 0:
-                                                st.warning(f"{error_count} students were skipped (already enrolled).")
+                                            if summary["over_capacity"] > 0:
+                                                st.warning(f"{summary['over_capacity']} students were not enrolled because the course is full.")
                                                 
                                             st.rerun()
                                 else:
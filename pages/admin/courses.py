@@ -6,6 +6,7 @@ import csv
 import io
 from PIL import Image
 from database.schema import get_db_connection
+from models.course_import import read_course_file, plan_course_import, apply_course_import
 from components.header import render_page_title
 from datetime import datetime
 
@@ -321,9 +322,9 @@ def show():
                             st.error("Course Code and Title are required fields")
         
         # Bulk import form
-        with st.expander("Bulk Import Courses from CSV"):
+        with st.expander("Bulk Import Courses from CSV or Excel"):
             st.markdown("""
-            Upload a CSV file with the following columns:
+            Upload a CSV or Excel (.xlsx) file with the following columns:
             - Code (required)
             - Title (required)
             - CreditHours (required)
@@ -335,6 +336,7 @@ def show():
             CS101,Introduction to Computer Science,3.0,50
             MATH201,Calculus I,4.0,60
             ```
+            Excel workbooks may use "Course Code", "Course Title" and "Credit Hours" headers on any sheet.
             """)
             
             # Add session selection for bulk import
@@ -350,59 +352,51 @@ def show():
             else:
                 st.warning("No academic sessions found. Please create a session in the Course Assignment and Enrollment page first.")
                 bulk_selected_session_id = None
+            
+            update_existing = st.checkbox(
+                "Update existing courses with values from the file",
+                value=False,
+                help="When unchecked, rows whose course code already exists are skipped"
+            )
                 
-            uploaded_file = st.file_uploader("Choose a CSV file", type=['csv'])
+            uploaded_file = st.file_uploader("Choose a CSV or Excel file", type=['csv', 'xlsx'])
             
             if uploaded_file:
                 try:
-                    # Read CSV file
-                    df = pd.read_csv(uploaded_file)
+                    # Read file and build the dry-run diff against existing courses
+                    df = read_course_file(uploaded_file)
+                    plan = plan_course_import(conn, df, update_existing)
                     
-                    # Check required columns
-                    required_columns = ['Code', 'Title', 'CreditHours']
-                    if not all(col in df.columns for col in required_columns):
-                        st.error("CSV file must contain columns: Code, Title, CreditHours")
-                    else:
-                        # Display preview
-                        st.write("Preview of data to be imported:")
-                        st.dataframe(df.head(5))
+                    # Display dry-run report
+                    st.write("Import preview (no changes have been made yet):")
+                    report_cols = st.columns(5)
+                    report_cols[0].metric("New", len(plan["new"]))
+                    report_cols[1].metric("Updated", len(plan["updated"]))
+                    report_cols[2].metric("Unchanged", len(plan["unchanged"]))
+                    report_cols[3].metric("Skipped", len(plan["skipped"]))
+                    report_cols[4].metric("Invalid / Duplicate", len(plan["invalid"]) + len(plan["duplicates"]))
+                    
+                    for key, label in [("new", "New courses"), ("updated", "Courses to update"),
+                                       ("skipped", "Existing courses (skipped)"),
+                                       ("duplicates", "Duplicate codes in file (ignored)"),
+                                       ("invalid", "Invalid rows (ignored)")]:
+                        if plan[key]:
+                            st.write(f"**{label}:**")
+                            st.dataframe(pd.DataFrame(plan[key]), hide_index=True)
+                    
+                    if st.button("Import Courses") and bulk_selected_session_id:
+                        result = apply_course_import(conn, plan)
                         
-                        if st.button("Import Courses") and bulk_selected_session_id:
-                            # Process each row
-                            success_count = 0
-                            error_count = 0
-                            
-                            for _, row in df.iterrows():
-                                code = row['Code']
-                                title = row['Title']
-                                credit_hour = row['CreditHours']
-                                max_students = row.get('MaxStudents', 40)
-                                
-                                # Check if code already exists
-                                existing = conn.execute("SELECT id FROM courses WHERE code = ?", (code,)).fetchone()
-                                
-                                if not existing:
-                                    # Insert new course
-                                    conn.execute(
-                                        "INSERT INTO courses (code, title, credit_hour, max_students) VALUES (?, ?, ?, ?)",
-                                        (code, title, credit_hour, max_students)
-                                    )
-                                    success_count += 1
-                                else:
-                                    error_count += 1
-                            
-                            conn.commit()
-                            
-                            # Get the session name
-                            session_name = next((s["name"] for s in sessions if s["id"] == bulk_selected_session_id), "")
-                            
-                            if success_count > 0:
-                                st.success(f"Successfully imported {success_count} courses for the {session_name} academic session.")
-                            
-                            if error_count > 0:
-                                st.warning(f"{error_count} courses were skipped because their course codes already exist.")
+                        # Get the session name
+                        session_name = next((s["name"] for s in sessions if s["id"] == bulk_selected_session_id), "")
+                        
+                        if result["inserted"] > 0 or result["updated"] > 0:
+                            st.success(f"Imported {result['inserted']} new and updated {result['updated']} courses for the {session_name} academic session.")
+                        
+                        if plan["skipped"]:
+                            st.warning(f"{len(plan['skipped'])} courses were skipped because their course codes already exist.")
                 except Exception as e:
-                    st.error(f"Error processing CSV file: {e}")
+                    st.error(f"Error processing import file: {e}")
         
         conn.close()
     
@@ -444,7 +444,7 @@ def show():
         SELECT s.name, s.student_id, s.dept, sp.created_at
         FROM study_plans sp
         JOIN students s ON sp.student_id = s.id
-        ORDER BY sp.created_at DESC
+        ORDER BY sp.id DESC
         LIMIT 10
         """
         study_plans = conn.execute(study_plan_query).fetchall()
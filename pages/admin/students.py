@@ -1,13 +1,10 @@
 import streamlit as st
 import pandas as pd
-import os
-import uuid
 import random
 import string
-import base64
-import io
-from PIL import Image
 from database.schema import get_db_connection
+from models.blob_store import store_file, discard_file
+from models.thumbnails import thumbnail_data_uri, get_thumbnail, create_thumbnails, PROFILE_THUMBNAIL_SIZE
 from components.header import render_page_title
 from utils.auth import generate_credentials
 from datetime import datetime
@@ -124,19 +121,16 @@ def show():
                     
                     # Display profile photo as circular
                     with cols[0]:
-                        if student['Photo'] and os.path.exists(student['Photo']):
-                            try:
-                                img = Image.open(student['Photo'])
-                                st.markdown(
-                                    f"""
-                                    <div class="profile-pic-container">
-                                        <img src="data:image/png;base64,{image_to_base64(img)}" class="profile-pic">
-                                    </div>
-                                    """, 
-                                    unsafe_allow_html=True
-                                )
-                            except:
-                                st.image("https://via.placeholder.com/40x40?text=?", width=40)
+                        thumbnail = thumbnail_data_uri(student['Photo'])
+                        if thumbnail:
+                            st.markdown(
+                                f"""
+                                <div class="profile-pic-container">
+                                    <img src="{thumbnail}" class="profile-pic">
+                                </div>
+                                """, 
+                                unsafe_allow_html=True
+                            )
                         else:
                             st.image("https://via.placeholder.com/40x40?text=?", width=40)
                     
@@ -182,12 +176,9 @@ def show():
                     
                     with col1:
                         # Display student photo if available
-                        if student_data['photo'] and os.path.exists(student_data['photo']):
-                            try:
-                                img = Image.open(student_data['photo'])
-                                st.image(img, width=200)
-                            except:
-                                st.image("https://via.placeholder.com/200x200?text=No+Photo", width=200)
+                        profile_thumbnail = get_thumbnail(student_data['photo'], PROFILE_THUMBNAIL_SIZE)
+                        if profile_thumbnail:
+                            st.image(profile_thumbnail, width=200)
                         else:
                             st.image("https://via.placeholder.com/200x200?text=No+Photo", width=200)
                     
@@ -255,12 +246,8 @@ def show():
                                 if user:
                                     conn.execute("DELETE FROM users WHERE id = ?", (user['id'],))
                                 
-                                # Delete photo if exists
-                                if student_data['photo'] and os.path.exists(student_data['photo']):
-                                    try:
-                                        os.remove(student_data['photo'])
-                                    except:
-                                        pass
+                                # Release the old photo (shared blobs are collected once unreferenced)
+                                discard_file(student_data['photo'])
                                 
                                 # Delete student record
                                 conn.execute("DELETE FROM students WHERE id = ?", (student_data['id'],))
@@ -312,16 +299,9 @@ def show():
                     # Save photo if uploaded
                     photo_path = None
                     if photo:
-                        # Create directory if it doesn't exist
-                        os.makedirs("static/images", exist_ok=True)
-                        
-                        # Create filename with unique ID
-                        filename = f"student_{uuid.uuid4()}.{photo.name.split('.')[-1]}"
-                        photo_path = os.path.join("static", "images", filename)
-                        
-                        # Save image
-                        with open(photo_path, "wb") as f:
-                            f.write(photo.getbuffer())
+                        # Stream into the content-addressed store
+                        photo_path = store_file(photo)
+                        create_thumbnails(photo_path)
                     
                     # Connect to database
                     conn = get_db_connection()
@@ -418,23 +398,12 @@ def show():
                                 # Process photo if a new one is uploaded
                                 photo_path = student['photo']
                                 if photo:
-                                    # Delete old photo if exists
-                                    if student['photo'] and os.path.exists(student['photo']):
-                                        try:
-                                            os.remove(student['photo'])
-                                        except:
-                                            pass
+                                    # Release the old photo (shared blobs are collected once unreferenced)
+                                    discard_file(student['photo'])
                                     
-                                    # Create directory if it doesn't exist
-                                    os.makedirs("static/images", exist_ok=True)
-                                    
-                                    # Create filename with unique ID
-                                    filename = f"student_{uuid.uuid4()}.{photo.name.split('.')[-1]}"
-                                    photo_path = os.path.join("static", "images", filename)
-                                    
-                                    # Save image
-                                    with open(photo_path, "wb") as f:
-                                        f.write(photo.getbuffer())
+                                    # Stream into the content-addressed store
+                                    photo_path = store_file(photo)
+                                    create_thumbnails(photo_path)
                                 
                                 # Update student record
                                 conn.execute(
@@ -463,12 +432,8 @@ def show():
                             if user:
                                 conn.execute("DELETE FROM users WHERE id = ?", (user['id'],))
                             
-                            # Delete photo if exists
-                            if student['photo'] and os.path.exists(student['photo']):
-                                try:
-                                    os.remove(student['photo'])
-                                except:
-                                    pass
+                            # Release the old photo (shared blobs are collected once unreferenced)
+                            discard_file(student['photo'])
                             
                             # Delete student record
                             conn.execute("DELETE FROM students WHERE id = ?", (student['id'],))
@@ -568,10 +533,3 @@ def show():
             st.info("No student accounts found in the database")
         
         conn.close()
-
-def image_to_base64(img):
-    """Convert PIL Image to base64 string"""
-    buffer = io.BytesIO()
-    img.save(buffer, format="PNG")
-    img_str = base64.b64encode(buffer.getvalue()).decode("utf-8")
-    return img_str 
\ No newline at end of file
@@ -1,22 +1,12 @@
 import streamlit as st
 import pandas as pd
-import os
-import uuid
-import base64
-import io
-from PIL import Image
 from database.schema import get_db_connection
+from models.blob_store import store_file, discard_file
+from models.thumbnails import thumbnail_data_uri, get_thumbnail, create_thumbnails, PROFILE_THUMBNAIL_SIZE
 from components.header import render_page_title
 from utils.auth import generate_credentials
 from datetime import datetime
 
-def image_to_base64(img):
-    """Convert PIL Image to base64 string"""
-    buffer = io.BytesIO()
-    img.save(buffer, format="PNG")
-    img_str = base64.b64encode(buffer.getvalue()).decode("utf-8")
-    return img_str
-
 def show():
     """Display the teacher management page"""
     render_page_title("👩‍🏫", "Teacher Management")
@@ -111,19 +101,16 @@ def show():
                     
                     # Display profile photo as circular
                     with cols[0]:
-                        if teacher['Photo'] and os.path.exists(teacher['Photo']):
-                            try:
-                                img = Image.open(teacher['Photo'])
-                                st.markdown(
-                                    f"""
-                                    <div class="profile-pic-container">
-                                        <img src="data:image/png;base64,{image_to_base64(img)}" class="profile-pic">
-                                    </div>
-                                    """, 
-                                    unsafe_allow_html=True
-                                )
-                            except:
-                                st.image("https://via.placeholder.com/40x40?text=?", width=40)
+                        thumbnail = thumbnail_data_uri(teacher['Photo'])
+                        if thumbnail:
+                            st.markdown(
+                                f"""
+                                <div class="profile-pic-container">
+                                    <img src="{thumbnail}" class="profile-pic">
+                                </div>
+                                """, 
+                                unsafe_allow_html=True
+                            )
                         else:
                             st.image("https://via.placeholder.com/40x40?text=?", width=40)
                     
@@ -164,12 +151,9 @@ def show():
                     
                     with col1:
                         # Display teacher photo if available
-                        if teacher_data['photo'] and os.path.exists(teacher_data['photo']):
-                            try:
-                                img = Image.open(teacher_data['photo'])
-                                st.image(img, width=200)
-                            except:
-                                st.image("https://via.placeholder.com/200x200?text=No+Photo", width=200)
+                        profile_thumbnail = get_thumbnail(teacher_data['photo'], PROFILE_THUMBNAIL_SIZE)
+                        if profile_thumbnail:
+                            st.image(profile_thumbnail, width=200)
                         else:
                             st.image("https://via.placeholder.com/200x200?text=No+Photo", width=200)
                     
@@ -234,12 +218,8 @@ def show():
                                 if user:
                                     conn.execute("DELETE FROM users WHERE id = ?", (user['id'],))
                                 
-                                # Delete photo if exists
-                                if teacher_data['photo'] and os.path.exists(teacher_data['photo']):
-                                    try:
-                                        os.remove(teacher_data['photo'])
-                                    except:
-                                        pass
+                                # Release the old photo (shared blobs are collected once unreferenced)
+                                discard_file(teacher_data['photo'])
                                 
                                 # Delete teacher record
                                 conn.execute("DELETE FROM teachers WHERE id = ?", (teacher_data['id'],))
@@ -286,16 +266,9 @@ def show():
                     # Save photo if uploaded
                     photo_path = None
                     if photo:
-                        # Create directory if it doesn't exist
-                        os.makedirs("static/images", exist_ok=True)
-                        
-                        # Create filename with unique ID
-                        filename = f"teacher_{uuid.uuid4()}.{photo.name.split('.')[-1]}"
-                        photo_path = os.path.join("static", "images", filename)
-                        
-                        # Save image
-                        with open(photo_path, "wb") as f:
-                            f.write(photo.getbuffer())
+                        # Stream into the content-addressed store
+                        photo_path = store_file(photo)
+                        create_thumbnails(photo_path)
                     
                     # Connect to database
                     conn = get_db_connection()
@@ -389,23 +362,12 @@ def show():
                                 # Process photo if a new one is uploaded
                                 photo_path = teacher['photo']
                                 if photo:
-                                    # Delete old photo if exists
-                                    if teacher['photo'] and os.path.exists(teacher['photo']):
-                                        try:
-                                            os.remove(teacher['photo'])
-                                        except:
-                                            pass
-                                    
-                                    # Create directory if it doesn't exist
-                                    os.makedirs("static/images", exist_ok=True)
-                                    
-                                    # Create filename with unique ID
-                                    filename = f"teacher_{uuid.uuid4()}.{photo.name.split('.')[-1]}"
-                                    photo_path = os.path.join("static", "images", filename)
+                                    # Release the old photo (shared blobs are collected once unreferenced)
+                                    discard_file(teacher['photo'])
                                     
-                                    # Save image
-                                    with open(photo_path, "wb") as f:
-                                        f.write(photo.getbuffer())
+                                    # Stream into the content-addressed store
+                                    photo_path = store_file(photo)
+                                    create_thumbnails(photo_path)
                                 
                                 # Update teacher record
                                 conn.execute(
@@ -434,12 +396,8 @@ def show():
                             if user:
                                 conn.execute("DELETE FROM users WHERE id = ?", (user['id'],))
                             
-                            # Delete photo if exists
-                            if teacher['photo'] and os.path.exists(teacher['photo']):
-                                try:
-                                    os.remove(teacher['photo'])
-                                except:
-                                    pass
+                            # Release the old photo (shared blobs are collected once unreferenced)
+                            discard_file(teacher['photo'])
                             
                             # Delete teacher record
                             conn.execute("DELETE FROM teachers WHERE id = ?", (teacher['id'],))
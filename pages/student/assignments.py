@@ -1,10 +1,11 @@
 import streamlit as st
 import pandas as pd
-import json
-import os
 from datetime import datetime
 from components.header import render_page_title
 from database.schema import get_db_connection
+from models.blob_store import store_file
+from models.test_attempts import (get_active_attempt, start_attempt, get_attempt_answers, save_answers,
+                                  get_question_page, submit_attempt)
 
 def show():
     """Display the student assignments and class tests page"""
@@ -94,14 +95,8 @@ def show():
                             
                             if submit_button and uploaded_file:
                                 try:
-                                    # Create directory for uploads if it doesn't exist
-                                    upload_dir = os.path.join("static", "uploads", "assignments")
-                                    os.makedirs(upload_dir, exist_ok=True)
-                                    
-                                    # Save the uploaded file
-                                    file_path = os.path.join(upload_dir, f"{student_id}_{assignment['id']}_{uploaded_file.name}")
-                                    with open(file_path, "wb") as f:
-                                        f.write(uploaded_file.getbuffer())
+                                    # Stream the upload into the content-addressed store
+                                    file_path = store_file(uploaded_file)
                                     
                                     # Insert submission record
                                     conn.execute("""
@@ -171,10 +166,21 @@ def show():
     with class_test_tab:
         st.write("### My Class Tests")
         
+        # A running attempt whose time is up is submitted with its saved answers
+        active_attempt = get_active_attempt(conn, student_id)
+        if active_attempt and active_attempt['seconds_left'] <= 0:
+            try:
+                marks = submit_attempt(conn, active_attempt['id'])
+                if marks is not None:
+                    st.warning(f"Time's up! Your test was submitted automatically. Score: {marks}")
+            except ValueError as e:
+                st.error(str(e))
+            active_attempt = None
+        
         # Get all published class tests for courses the student is enrolled in
         tests = conn.execute("""
             SELECT ct.id, ct.title, ct.description, ct.test_date, ct.max_marks, ct.duration_minutes,
-                   c.code, c.title as course_title, ct.questions,
+                   c.code, c.title as course_title,
                    sts.id as submission_id, sts.marks, sts.status, sts.submitted_at
             FROM class_tests ct
             JOIN courses c ON ct.course_id = c.id
@@ -217,11 +223,11 @@ def show():
                 
                 st.dataframe(upcoming_df, use_container_width=True, hide_index=True)
                 
-                # Take a test
-                st.write("#### Take a Test")
+                # Take a test (hidden while another attempt is running)
                 test_options = {f"{t['code']} - {t['title']}": t for t in upcoming_tests}
                 
-                if test_options:
+                if test_options and not active_attempt:
+                    st.write("#### Take a Test")
                     selected_test_name = st.selectbox(
                         "Select a test to take:",
                         options=list(test_options.keys())
@@ -234,96 +240,73 @@ def show():
                     st.write(f"**Duration:** {selected_test['duration_minutes']} minutes")
                     st.write(f"**Max Marks:** {selected_test['max_marks']}")
                     
-                    # Start test button
+                    # Start test button; the timer runs on the server from here on
                     if st.button("Start Test"):
-                        st.session_state.test_in_progress = True
-                        st.session_state.current_test = selected_test
-                        st.session_state.test_answers = {}
-                        st.session_state.test_start_time = datetime.now()
-                        st.rerun()
+                        try:
+                            start_attempt(conn, student_id, selected_test['id'])
+                            st.rerun()
+                        except ValueError as e:
+                            st.error(str(e))
             
-            # Handle test in progress
-            if hasattr(st.session_state, 'test_in_progress') and st.session_state.test_in_progress:
-                test = st.session_state.current_test
+            # Handle test in progress (persisted, so it survives reruns, reconnects and restarts)
+            if active_attempt:
+                attempt_id = active_attempt['id']
+                test = next((t for t in tests if t['id'] == active_attempt['test_id']), None)
+                minutes, seconds = divmod(active_attempt['seconds_left'], 60)
                 
-                # Check if time is up
-                elapsed_time = (datetime.now() - st.session_state.test_start_time).total_seconds() / 60
-                remaining_time = max(0, test['duration_minutes'] - elapsed_time)
+                st.write(f"#### {test['title'] if test else 'Class Test'} (In Progress)")
+                st.write(f"**Time Remaining:** {minutes} min {seconds:02d} s")
                 
-                st.write(f"#### {test['title']} (In Progress)")
-                st.write(f"**Time Remaining:** {int(remaining_time)} minutes")
+                # Only the current page of questions is rendered
+                saved_answers = get_attempt_answers(conn, attempt_id)
+                page = active_attempt['current_page']
+                page_questions, page_count = get_question_page(conn, active_attempt['test_id'], page)
+                page = min(page, page_count - 1)
+                st.caption(f"Page {page + 1} of {page_count}. Your answers are saved whenever you change page.")
                 
-                if remaining_time <= 0:
-                    st.warning("Time's up! Your test will be submitted automatically.")
-                    # Auto-submit logic would go here
-                
-                # Display questions and collect answers
-                questions = json.loads(test['questions'])
-                
-                with st.form("test_submission_form"):
-                    for i, q in enumerate(questions):
-                        st.write(f"**Question {i+1}:** {q['question']} ({q['marks']} marks)")
+                with st.form(f"test_page_form_{attempt_id}_{page}"):
+                    for position, q in page_questions:
+                        st.write(f"**Question {position + 1}:** {q['question']} ({q['marks']} marks)")
+                        saved = saved_answers.get(f"q_{position}")
+                        widget_key = f"attempt_{attempt_id}_q_{position}"
                         
                         if q['type'] == 'mcq':
-                            options = q['options']
-                            selected_option = st.radio(
-                                f"Select answer for Question {i+1}:",
+                            options = q['options'] or []
+                            st.radio(
+                                f"Select answer for Question {position + 1}:",
                                 options=range(len(options)),
-                                format_func=lambda j: f"{chr(97+j)}) {options[j]}",
-                                key=f"q_{i}"
+                                index=saved if isinstance(saved, int) and 0 <= saved < len(options) else None,
+                                format_func=lambda j, options=options: f"{chr(97+j)}) {options[j]}",
+                                key=widget_key
                             )
-                            
-                            # Store answer in session state
-                            if f"q_{i}" not in st.session_state.test_answers:
-                                st.session_state.test_answers[f"q_{i}"] = selected_option
                         else:  # short answer
-                            answer = st.text_input(f"Your answer for Question {i+1}:", key=f"q_{i}")
-                            
-                            # Store answer in session state
-                            if f"q_{i}" not in st.session_state.test_answers:
-                                st.session_state.test_answers[f"q_{i}"] = answer
+                            st.text_input(f"Your answer for Question {position + 1}:",
+                                          value=saved if isinstance(saved, str) else "", key=widget_key)
                     
-                    submit_test = st.form_submit_button("Submit Test")
+                    prev_col, next_col, submit_col = st.columns(3)
+                    go_previous = prev_col.form_submit_button("Previous", disabled=page == 0)
+                    go_next = next_col.form_submit_button("Save & Next", disabled=page >= page_count - 1)
+                    submit_test = submit_col.form_submit_button("Submit Test", type="primary")
+                
+                if go_previous or go_next or submit_test:
+                    page_answers = {
+                        position: st.session_state[f"attempt_{attempt_id}_q_{position}"]
+                        for position, _ in page_questions
+                        if st.session_state.get(f"attempt_{attempt_id}_q_{position}") is not None
+                    }
+                    new_page = page - 1 if go_previous else page + 1 if go_next else page
+                    saved_in_time = save_answers(conn, attempt_id, page_answers, new_page)
                     
-                    if submit_test or remaining_time <= 0:
-                        # Calculate score
-                        total_marks = 0
-                        
-                        for i, q in enumerate(questions):
-                            if q['type'] == 'mcq':
-                                student_answer = st.session_state.test_answers.get(f"q_{i}")
-                                if student_answer == q['answer']:
-                                    total_marks += q['marks']
-                            else:  # short answer - simplified for example
-                                student_answer = st.session_state.test_answers.get(f"q_{i}", "").strip().lower()
-                                expected_answer = q['expected_answer'].strip().lower()
-                                
-                                if student_answer == expected_answer:
-                                    total_marks += q['marks']
-                                # In a real app, you might use more sophisticated matching
-                        
-                        # Save submission to database
-                        answers_json = json.dumps(st.session_state.test_answers)
-                        
-                        try:
-                            conn.execute("""
-                                INSERT INTO student_test_submissions
-                                (student_id, test_id, answers, marks, status, submitted_at)
-                                VALUES (?, ?, ?, ?, 'completed', CURRENT_TIMESTAMP)
-                            """, (student_id, test['id'], answers_json, total_marks))
-                            
-                            conn.commit()
-                            
-                            # Clear test session state
-                            st.session_state.test_in_progress = False
-                            del st.session_state.current_test
-                            del st.session_state.test_answers
-                            del st.session_state.test_start_time
-                            
-                            st.success(f"Test submitted successfully! Your score: {total_marks}/{test['max_marks']}")
-                            st.rerun()
-                        except Exception as e:
-                            st.error(f"Error submitting test: {str(e)}")
+                    try:
+                        if submit_test or not saved_in_time:
+                            marks = submit_attempt(conn, attempt_id)
+                            if not saved_in_time:
+                                st.warning("Time's up! Your saved answers were submitted automatically.")
+                            if marks is not None:
+                                st.success(f"Test submitted successfully! Your score: {marks}/{test['max_marks'] if test else ''}")
+                        st.rerun()
+                    except ValueError as e:
+                        st.error(str(e))
             
             # Completed Tests
             if completed_tests:
@@ -1,6 +1,7 @@
 import streamlit as st
 import pandas as pd
 from database.schema import get_db_connection
+from models.timetable import get_weekly_timetable, get_exam_timetable, get_ical
 from components.header import render_page_title
 
 def show():
@@ -60,15 +61,11 @@ def show():
             c.title, 
             c.credit_hour,
             t.name as teacher,
-            t.dept as department,
-            r.day,
-            r.time_slot,
-            r.room
+            t.dept as department
         FROM enrollments e
         JOIN courses c ON e.course_id = c.id
         LEFT JOIN teaching te ON c.id = te.course_id AND te.semester = e.semester
         LEFT JOIN teachers t ON te.teacher_id = t.id
-        LEFT JOIN class_routine r ON c.id = r.course_id AND r.session = e.semester
         WHERE e.student_id = ? AND e.semester = ?
         ORDER BY c.code
     """, (student_id, selected_session)).fetchall()
@@ -85,17 +82,15 @@ def show():
         course_info.columns = ['Course Code', 'Course Title', 'Credit Hours', 'Instructor', 'Department']
         st.dataframe(course_info, use_container_width=True, hide_index=True)
         
-        # Create class schedule section if routine info exists
-        if 'day' in df_courses and df_courses['day'].notna().any():
+        # Class schedule from the materialized timetable
+        weekly_classes = get_weekly_timetable(conn, "student", student_id, selected_session)
+        if weekly_classes:
             st.write("#### Class Schedule")
-            schedule_info = df_courses[['code', 'day', 'time_slot', 'room']].copy()
-            schedule_info = schedule_info.dropna(subset=['day'])
-            
-            if not schedule_info.empty:
-                schedule_info.columns = ['Course Code', 'Day', 'Time', 'Room']
-                st.dataframe(schedule_info, use_container_width=True, hide_index=True)
-            else:
-                st.info("Class schedule has not been published yet.")
+            schedule_info = pd.DataFrame([
+                {"Course Code": c["course_code"], "Day": c["day"], "Time": c["time_slot"], "Room": c["room"]}
+                for c in weekly_classes
+            ])
+            st.dataframe(schedule_info, use_container_width=True, hide_index=True)
         else:
             st.info("Class schedule has not been published yet.")
         
@@ -104,28 +99,28 @@ def show():
         st.write(f"**Total Credit Hours:** {total_credits}")
         
         # Get exam schedule if available
-        exam_schedule = conn.execute("""
-            SELECT 
-                c.code, 
-                c.title,
-                e.exam_date,
-                e.start_time,
-                e.end_time,
-                e.room
-            FROM enrollments en
-            JOIN courses c ON en.course_id = c.id
-            LEFT JOIN exam_schedule e ON c.id = e.course_id AND e.session = en.semester
-            WHERE en.student_id = ? AND en.semester = ? AND e.exam_date IS NOT NULL
-            ORDER BY e.exam_date, e.start_time
-        """, (student_id, selected_session)).fetchall()
+        exam_schedule = get_exam_timetable(conn, "student", student_id, selected_session)
         
         if exam_schedule:
             st.write("#### Exam Schedule")
-            df_exams = pd.DataFrame([dict(exam) for exam in exam_schedule])
-            df_exams.columns = ['Course Code', 'Course Title', 'Exam Date', 'Start Time', 'End Time', 'Room']
+            df_exams = pd.DataFrame([
+                {"Course Code": e["course_code"], "Course Title": e["course_title"], "Type": e["exam_type"],
+                 "Exam Date": e["exam_date"], "Start Time": e["start_time"], "End Time": e["end_time"], "Room": e["room"]}
+                for e in exam_schedule
+            ])
             st.dataframe(df_exams, use_container_width=True, hide_index=True)
         else:
             st.info("Exam schedule has not been published yet.")
+        
+        # Calendar export of classes and exams
+        ical = get_ical(conn, "student", student_id, selected_session)
+        if ical:
+            st.download_button(
+                label="Add to Calendar (.ics)",
+                data=ical.encode("utf-8"),
+                file_name=f"timetable_{selected_session.replace(' ', '_')}.ics",
+                mime="text/calendar"
+            )
     
     # Close the database connection
     conn.close()
@@ -6,6 +6,9 @@ import plotly.graph_objects as go
 from datetime import datetime, timedelta
 from components.header import render_page_title
 from database.schema import get_db_connection
+from models.messaging import count_unread
+from models.notifications import get_notifications, count_unread_notifications, mark_notifications_read
+from models.timetable import get_exam_timetable
 import random
 
 def create_top_navigation():
@@ -71,32 +74,25 @@ def show():
     session_name = active_session['name']
     
     # Get unread messages count
-    unread_messages = conn.execute("""
-        SELECT COUNT(*) as count
-        FROM messages 
-        WHERE recipient_id = ? AND recipient_role = 'student' AND is_read = 0
-    """, (student_id,)).fetchone()
-    
-    unread_count = unread_messages['count'] if unread_messages else 0
+    unread_count = count_unread(conn, student_id, 'student')
     
     # Create the top navigation bar
     create_top_navigation()
     
     # Show notifications panel if active
     if st.session_state.show_notifications:
-        with st.expander("Notifications", expanded=True):
-            notifications = conn.execute("""
-                SELECT title, message, created_at, is_read
-                FROM notifications
-                WHERE user_id = ? AND user_role = 'student'
-                ORDER BY created_at DESC
-                LIMIT 10
-            """, (student_id,)).fetchall()
+        unread_notifications = count_unread_notifications(conn, student_id, 'student')
+        with st.expander(f"Notifications ({unread_notifications} unread)", expanded=True):
+            notifications = get_notifications(conn, student_id, 'student')
             
             if notifications:
+                if unread_notifications and st.button("Mark all as read", key="mark_notifications_read"):
+                    mark_notifications_read(conn, student_id, 'student')
+                    st.rerun()
                 for notification in notifications:
                     read_status = "✅" if notification['is_read'] else "🔵"
-                    st.markdown(f"**{read_status} {notification['title']}** - {notification['created_at']}")
+                    updates = f" ({notification['event_count']} updates)" if notification['event_count'] > 1 else ""
+                    st.markdown(f"**{read_status} {notification['title']}**{updates} - {notification['created_at']}")
                     st.markdown(f"{notification['message']}")
                     st.divider()
             else:
@@ -186,37 +182,12 @@ def show():
         LIMIT 3
     """, (student_id, session_name)).fetchall()
     
-    # Check if exam_type column exists in exam_schedule table
-    check_exam_type = conn.execute("""
-        SELECT COUNT(*) as count FROM pragma_table_info('exam_schedule') 
-        WHERE name = 'exam_type'
-    """).fetchone()
-    
-    has_exam_type = check_exam_type['count'] > 0 if check_exam_type else False
-    
-    # Get upcoming exams based on schema
-    if has_exam_type:
-        upcoming_exams_query = """
-            SELECT e.exam_type, e.exam_date, c.code
-            FROM exam_schedule e
-            JOIN courses c ON e.course_id = c.id
-            JOIN enrollments enr ON enr.course_id = c.id AND enr.student_id = ?
-            WHERE e.session = ? AND e.exam_date >= date('now') AND e.exam_date <= date('now', '+14 days')
-            ORDER BY e.exam_date
-            LIMIT 2
-        """
-    else:
-        upcoming_exams_query = """
-            SELECT 'Exam' as exam_type, e.exam_date, c.code
-            FROM exam_schedule e
-            JOIN courses c ON e.course_id = c.id
-            JOIN enrollments enr ON enr.course_id = c.id AND enr.student_id = ?
-            WHERE e.session = ? AND e.exam_date >= date('now') AND e.exam_date <= date('now', '+14 days')
-            ORDER BY e.exam_date
-            LIMIT 2
-        """
-    
-    upcoming_exams = conn.execute(upcoming_exams_query, (student_id, session_name)).fetchall()
+    # Upcoming exams in the next two weeks from the materialized timetable
+    today = datetime.now()
+    upcoming_exams = get_exam_timetable(
+        conn, "student", student_id, session_name,
+        since=today.strftime("%Y-%m-%d"), until=(today + timedelta(days=14)).strftime("%Y-%m-%d"), limit=2
+    )
     
     # Combine notices
     notices = []
@@ -224,7 +195,7 @@ def show():
         notices.append(f"Assignment '{notice['title']}' for {notice['code']} due on {notice['due_date']}")
     
     for exam in upcoming_exams:
-        notices.append(f"{exam['exam_type']} exam for {exam['code']} on {exam['exam_date']}")
+        notices.append(f"{exam['exam_type'] or 'Exam'} exam for {exam['course_code']} on {exam['exam_date']}")
     
     if not notices:
         notices = ["No upcoming deadlines or exams in the next 2 weeks."]
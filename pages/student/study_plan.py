@@ -1,6 +1,6 @@
 import streamlit as st
 from components.header import render_page_title
-from models.study_plan import generate_study_plan
+from models.study_plan import generate_study_plan, get_latest_study_plan
 from database.schema import get_db_connection
 import pandas as pd
 
@@ -48,14 +48,18 @@ def show():
     selected_semester = st.selectbox("Select Semester", semester_list)
     
     # Check if a study plan already exists
-    existing_plan = conn.execute(
-        "SELECT id, plan_json FROM study_plans WHERE student_id = ? AND semester = ? ORDER BY created_at DESC LIMIT 1",
-        (student_id, selected_semester)
-    ).fetchone()
+    existing_plan = get_latest_study_plan(conn, student_id, selected_semester)
     
     if existing_plan:
         st.success("Your study plan is ready!")
-        st.button("Generate New Plan", key="new_plan")
+        if st.button("Generate New Plan", key="new_plan"):
+            with st.spinner("Updating your study plan..."):
+                plan = generate_study_plan(student_id, selected_semester)
+                
+                if "error" in plan:
+                    st.error(plan["error"])
+                else:
+                    st.rerun()
     else:
         st.info("You don't have a study plan for this semester yet.")
         generate_new = st.button("Generate Study Plan", key="first_plan")
@@ -71,8 +75,7 @@ def show():
     
     # Display the study plan if it exists
     if existing_plan:
-        import json
-        plan = json.loads(existing_plan['plan_json'])
+        plan = existing_plan['plan']
         
         # Show student info and GPA - use current user's name from session
         col1, col2, col3 = st.columns(3)
@@ -2,9 +2,15 @@ import streamlit as st
 import pandas as pd
 import json
 import os
+import mimetypes
 from datetime import datetime, timedelta
 from components.header import render_page_title
 from database.schema import get_db_connection
+from models.blob_store import build_submissions_zip, submission_download_name
+from models.grade_sheet import load_grade_sheet, save_grade_sheet
+from models.notifications import queue_event
+from models.test_attempts import sweep_expired_attempts, delete_class_test
+from models.test_grading import regrade_test, save_test_questions, item_analysis, distractor_analysis
 
 def show():
     """Display the teacher assignments and class tests page"""
@@ -129,6 +135,8 @@ def show():
                                     "UPDATE assignments SET is_published = 1, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
                                     (selected_assignment['id'],)
                                 )
+                                queue_event(conn, "assignment_published", selected_course_id, session_name,
+                                            title=selected_assignment['title'], due_date=selected_assignment['due_date'])
                                 conn.commit()
                                 st.success("Assignment published!")
                                 st.rerun()
@@ -183,6 +191,25 @@ def show():
                             
                             # Display submissions
                             st.dataframe(submissions_df, use_container_width=True, hide_index=True)
+                            
+                            # Bundle every submitted file into one download, built on disk on request
+                            if st.button("Prepare ZIP of All Submissions", key="zip_submissions"):
+                                with st.spinner("Bundling submissions..."):
+                                    st.session_state.submissions_zip = build_submissions_zip(st.session_state.view_assignment_id)
+                            
+                            bundle = st.session_state.get('submissions_zip')
+                            if bundle and bundle['assignment_id'] == st.session_state.view_assignment_id:
+                                if bundle['path'] and os.path.exists(bundle['path']):
+                                    with open(bundle['path'], "rb") as archive:
+                                        st.download_button(
+                                            label=f"Download ZIP ({bundle['files']} files, {bundle['bytes'] / 1048576:.1f} MB)",
+                                            data=archive,
+                                            file_name=submission_download_name("submissions", st.session_state.view_assignment_title, "all.zip"),
+                                            mime="application/zip",
+                                            key="download_submissions_zip"
+                                        )
+                                elif not bundle['path']:
+                                    st.info("No submitted files to bundle.")
                         else:
                             st.info("No submissions yet.")
                         
@@ -217,6 +244,9 @@ def show():
                                 VALUES (?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
                             """, (selected_course_id, title, description, due_date, max_marks, 
                                   1 if publish_now else 0, session_name))
+                            if publish_now:
+                                queue_event(conn, "assignment_published", selected_course_id, session_name,
+                                            title=title, due_date=str(due_date))
                             
                             conn.commit()
                             st.success("Assignment created successfully!")
@@ -327,11 +357,7 @@ def show():
                             if selected_test['submission_count'] > 0:
                                 st.warning("Cannot delete test with submissions!")
                             else:
-                                conn.execute(
-                                    "DELETE FROM class_tests WHERE id = ?",
-                                    (selected_test['id'],)
-                                )
-                                conn.commit()
+                                delete_class_test(conn, selected_test['id'])
                                 st.success("Class test deleted!")
                                 st.rerun()
                     
@@ -346,6 +372,9 @@ def show():
                     if hasattr(st.session_state, 'view_test_id') and st.session_state.view_test_id == selected_test['id']:
                         st.write(f"#### Results for: {st.session_state.view_test_title}")
                         
+                        # Score attempts that ran out of time before showing the marks
+                        sweep_expired_attempts([st.session_state.view_test_id])
+                        
                         # Get submissions
                         submissions = conn.execute("""
                             SELECT sts.id, s.student_id as display_id, s.name, sts.marks, sts.status, sts.submitted_at
@@ -370,9 +399,35 @@ def show():
                             
                             # Display submissions
                             st.dataframe(submissions_df, use_container_width=True, hide_index=True)
+                            
+                            # Per-question statistics from the normalized answer tables
+                            st.write("##### Item Analysis")
+                            items = item_analysis(conn, st.session_state.view_test_id)
+                            distractors = distractor_analysis(conn, st.session_state.view_test_id)
+                            st.dataframe(pd.DataFrame([
+                                {
+                                    "Q": item['position'] + 1,
+                                    "Question": item['question'],
+                                    "Answered": f"{item['answered']}/{item['submissions']}",
+                                    "Correct": item['correct'],
+                                    "Difficulty": f"{item['difficulty']:.2f}" if item['difficulty'] is not None else "-",
+                                    "Discrimination": f"{item['discrimination']:.2f}" if item['discrimination'] is not None else "-",
+                                    "Option Picks": ", ".join(
+                                        f"{chr(97 + choice)}: {picks}" if choice is not None and choice >= 0 else f"none: {picks}"
+                                        for choice, picks in sorted(distractors.get(item['position'], {}).items(),
+                                                                    key=lambda pair: (pair[0] is None, pair[0] or 0))
+                                    ) if item['type'] == 'mcq' else ""
+                                } for item in items
+                            ]), use_container_width=True, hide_index=True)
                         else:
                             st.info("No submissions yet.")
                         
+                        # Rescore every submission against the current answer key
+                        if submissions and st.button("Regrade Submissions", key="regrade_test"):
+                            result = regrade_test(st.session_state.view_test_id)
+                            st.success(f"Regraded {result['submissions']} submissions, {result['changed']} marks changed.")
+                            st.rerun()
+                        
                         # Close button
                         if st.button("Close Results View"):
                             del st.session_state.view_test_id
@@ -441,13 +496,14 @@ def show():
                                 st.warning(f"Total question marks ({total_marks}) don't match maximum marks ({max_marks}).")
                             else:
                                 # Insert the new class test
-                                conn.execute("""
+                                cursor = conn.execute("""
                                     INSERT INTO class_tests 
                                     (course_id, title, description, test_date, duration_minutes, questions, max_marks, 
                                      is_published, semester, created_at, updated_at)
                                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
                                 """, (selected_course_id, title, description, test_date, duration, 
                                       json.dumps(questions), max_marks, 1 if publish_now else 0, session_name))
+                                save_test_questions(conn, cursor.lastrowid, questions)
                                 
                                 conn.commit()
                                 st.success("Class test created successfully!")
@@ -463,9 +519,65 @@ def show():
         st.write("View and grade student submissions")
         
         # Choose what to grade
-        grade_type = st.radio("Select what to grade:", ["Assignments", "Class Tests"])
+        grade_type = st.radio("Select what to grade:", ["Assignments", "Assignment Grade Sheet", "Class Tests"])
         
-        if grade_type == "Assignments":
+        if grade_type == "Assignment Grade Sheet":
+            # Grade every submission of one assignment in a single save
+            sheet_assignments = conn.execute("""
+                SELECT id, title, max_marks FROM assignments
+                WHERE course_id = ? AND semester = ?
+                ORDER BY due_date DESC
+            """, (selected_course_id, session_name)).fetchall()
+            
+            if sheet_assignments:
+                sheet_idx = st.selectbox(
+                    "Select assignment:",
+                    options=range(len(sheet_assignments)),
+                    format_func=lambda i: sheet_assignments[i]['title'],
+                    key="grade_sheet_assignment"
+                )
+                sheet_assignment = sheet_assignments[sheet_idx]
+                sheet = load_grade_sheet(conn, sheet_assignment['id'])
+                
+                if sheet.empty:
+                    st.info("No submissions for this assignment yet.")
+                else:
+                    graded_count = int((sheet["Status"] == "graded").sum())
+                    st.write(f"**{graded_count}/{len(sheet)}** graded, max marks **{sheet_assignment['max_marks']:g}**. "
+                             "Rows left without marks stay pending.")
+                    
+                    # Edits are collected in the form and only sent when saved
+                    with st.form(f"grade_sheet_{sheet_assignment['id']}"):
+                        edited_sheet = st.data_editor(
+                            sheet,
+                            column_config={
+                                "submission_id": None,
+                                "Marks": st.column_config.NumberColumn(
+                                    "Marks", min_value=0.0, max_value=float(sheet_assignment['max_marks']), step=0.5
+                                ),
+                                "Remarks": st.column_config.TextColumn("Remarks")
+                            },
+                            disabled=["Student ID", "Name", "Submitted At", "Status"],
+                            hide_index=True,
+                            use_container_width=True,
+                            key=f"grade_sheet_editor_{sheet_assignment['id']}"
+                        )
+                        save_sheet = st.form_submit_button("Save Grades")
+                    
+                    if save_sheet:
+                        try:
+                            updated = save_grade_sheet(conn, sheet_assignment['id'], edited_sheet)
+                            if updated:
+                                st.success(f"Saved grades for {updated} submissions.")
+                                st.rerun()
+                            else:
+                                st.info("No changes to save.")
+                        except ValueError as e:
+                            st.error(str(e))
+            else:
+                st.info("No assignments created yet for this course.")
+        
+        elif grade_type == "Assignments":
             # Show pending assignment submissions
             pending_submissions = conn.execute("""
                 SELECT sa.id, a.title as assignment_title, s.student_id as display_id, s.name, 
@@ -484,35 +596,30 @@ def show():
                     with st.expander(f"{sub['display_id']} - {sub['name']} - {sub['assignment_title']}"):
                         st.write(f"**Submitted at:** {sub['submitted_at']}")
                         
-                        # Display submission file link if available
+                        # Display submission file; it is only read from disk once the teacher opens it
                         if sub['submission_file']:
                             st.write(f"**Submission File:**")
                             
-                            # Get file path and name
+                            # Get file path and a readable download name
                             file_path = sub['submission_file']
-                            file_name = os.path.basename(file_path)
+                            file_name = submission_download_name(sub['display_id'], sub['assignment_title'], file_path)
                             
                             # Check if file exists on disk
-                            if os.path.exists(file_path):
-                                # Display download button for the file
+                            if not os.path.exists(file_path):
+                                st.error(f"File not found on server: {file_name}")
+                            elif st.session_state.get('open_submission_id') == sub['id']:
                                 with open(file_path, "rb") as file:
-                                    file_content = file.read()
                                     st.download_button(
                                         label="Download Submission", 
-                                        data=file_content,
+                                        data=file,
                                         file_name=file_name,
-                                        mime="application/pdf"
+                                        mime=mimetypes.guess_type(file_name)[0] or "application/octet-stream",
+                                        key=f"download_submission_{sub['id']}"
                                     )
-                                
-                                # If PDF, show a preview using an iframe
-                                if file_path.lower().endswith('.pdf'):
-                                    # Create a relative path for the iframe
-                                    relative_path = os.path.relpath(file_path, os.getcwd())
-                                    st.write("**Preview:**")
-                                    st.write(f"<iframe src='{relative_path}' width='100%' height='500'></iframe>", 
-                                             unsafe_allow_html=True)
-                            else:
-                                st.error(f"File not found on server: {file_name}")
+                            elif st.button(f"Open Submission ({os.path.getsize(file_path) / 1024:.0f} KB)",
+                                           key=f"open_submission_{sub['id']}"):
+                                st.session_state.open_submission_id = sub['id']
+                                st.rerun()
                         else:
                             st.info("No file was submitted.")
                         
@@ -568,6 +675,10 @@ def show():
         
         else:  # Class Tests
             # Auto-graded class tests don't need manual grading, so show results instead
+            sweep_expired_attempts([row['id'] for row in conn.execute(
+                "SELECT id FROM class_tests WHERE course_id = ? AND semester = ? AND is_published = 1",
+                (selected_course_id, session_name)
+            ).fetchall()])
             test_results = conn.execute("""
                 SELECT ct.title, COUNT(sts.id) as total_submissions, 
                        AVG(sts.marks) as avg_marks, MAX(sts.marks) as max_marks,
@@ -6,6 +6,7 @@ from datetime import datetime, timedelta
 import calendar
 from components.header import render_page_title
 from database.schema import get_db_connection
+from models.notifications import queue_event
 
 def show():
     """Display the teacher attendance management page"""
@@ -140,11 +141,13 @@ def show():
                 )
                 
                 # Insert new attendance records
-                for student_id, is_present in attendance_status.items():
-                    conn.execute(
-                        "INSERT INTO attendance (student_id, course_id, date, present) VALUES (?, ?, ?, ?)",
-                        (student_id, selected_course_id, formatted_date, 1 if is_present else 0)
-                    )
+                conn.executemany(
+                    "INSERT INTO attendance (student_id, course_id, date, present) VALUES (?, ?, ?, ?)",
+                    [(student_id, selected_course_id, formatted_date, 1 if is_present else 0)
+                     for student_id, is_present in attendance_status.items()]
+                )
+                # Students who fall below the attendance threshold are warned by the notification worker
+                queue_event(conn, "attendance_low", selected_course_id, session_name)
                 
                 conn.commit()
                 st.success(f"Attendance for {selected_course_name} on {formatted_date} has been saved!")
@@ -12,6 +12,8 @@ import numpy as np
 import calendar
 from components.header import render_page_title
 from database.schema import get_db_connection
+from models.messaging import count_unread
+from models.timetable import get_weekly_timetable, get_exam_timetable, get_ical, weekly_grid
 
 # Helper function for CSV download
 def get_csv_download_link(df, filename, link_text):
@@ -78,13 +80,7 @@ def show():
     session_name = active_session['name'] if active_session else "No active session"
     
     # Get unread messages count
-    unread_messages = conn.execute("""
-        SELECT COUNT(*) as count
-        FROM messages
-        WHERE recipient_id = ? AND recipient_role = 'teacher' AND is_read = 0
-    """, (teacher_id,)).fetchone()
-    
-    unread_count = unread_messages['count'] if unread_messages else 0
+    unread_count = count_unread(conn, teacher_id, 'teacher')
     
     # Welcome message
     st.write(f"### Welcome, {teacher['name']}!")
@@ -258,6 +254,15 @@ def show():
             LIMIT 10
         """, (teacher_id,)).fetchall()
         
+        recent_broadcasts = conn.execute("""
+            SELECT b.sent_at as timestamp, c.code, c.title, 'message' as activity_type, b.subject
+            FROM broadcasts b
+            JOIN courses c ON b.course_id = c.id
+            WHERE b.sender_id = ? AND b.sender_role = 'teacher'
+            ORDER BY b.sent_at DESC
+            LIMIT 10
+        """, (teacher_id,)).fetchall()
+        
         # Combine all activities and sort by date
         all_activities = []
         
@@ -289,6 +294,15 @@ def show():
                 "details": f"Sent message to {msg['recipient_name']}: {msg['subject']}"
             })
         
+        for msg in recent_broadcasts:
+            all_activities.append({
+                "timestamp": msg['timestamp'],
+                "code": msg['code'],
+                "title": msg['title'],
+                "activity_type": msg['activity_type'],
+                "details": f"Sent announcement to all students: {msg['subject']}"
+            })
+        
         # Sort activities by date
         sorted_activities = sorted(all_activities, key=lambda x: x['timestamp'] if x['timestamp'] else "", reverse=True)
         
@@ -339,19 +353,11 @@ def show():
         st.subheader("📆 Upcoming Deadlines")
         
         # Get upcoming exams with more details
-        upcoming_exams = conn.execute("""
-            SELECT e.exam_date, e.start_time, e.end_time, e.exam_type, c.code, c.title, e.room,
-                   CASE WHEN e.exam_date < date('now') THEN 'Past'
-                        WHEN e.exam_date = date('now') THEN 'Today'
-                        ELSE 'Upcoming' END as status
-            FROM exam_schedule e
-            JOIN courses c ON e.course_id = c.id
-            JOIN teaching t ON t.course_id = c.id
-            WHERE t.teacher_id = ? AND e.session = ? 
-            AND date(e.exam_date) <= date('now', '+21 days')
-            ORDER BY e.exam_date
-            LIMIT 10
-        """, (teacher_id, session_name)).fetchall()
+        today_str = datetime.now().strftime("%Y-%m-%d")
+        upcoming_exams = get_exam_timetable(
+            conn, "teacher", teacher_id, session_name,
+            until=(datetime.now() + timedelta(days=21)).strftime("%Y-%m-%d"), limit=10
+        )
         
         # Get assignment deadlines
         assignment_deadlines = conn.execute("""
@@ -402,8 +408,8 @@ def show():
             upcoming_deadlines.append({
                 "date": exam['exam_date'],
                 "task": f"{exam['exam_type']} Exam ({exam['start_time']} - {exam['end_time']})",
-                "course": exam['code'],
-                "status": exam['status'],
+                "course": exam['course_code'],
+                "status": "Past" if exam['exam_date'] < today_str else "Today" if exam['exam_date'] == today_str else "Upcoming",
                 "location": exam['room'],
                 "type": "exam"
             })
@@ -1372,7 +1378,27 @@ def show():
     
     with row2_col3:
         if st.button("📅 Schedule", use_container_width=True):
-            st.success("Course schedule feature coming soon!")
+            st.session_state.show_teacher_schedule = not st.session_state.get("show_teacher_schedule", False)
+    
+    # Weekly teaching schedule from the materialized timetable
+    if st.session_state.get("show_teacher_schedule") and active_session:
+        with st.container(border=True):
+            st.subheader("📅 My Weekly Schedule")
+            grid = weekly_grid(get_weekly_timetable(conn, "teacher", teacher_id, session_name))
+            schedule_df = pd.DataFrame({
+                day: {slot: ", ".join(f"{c['course_code']} ({c['room']})" for c in classes) for slot, classes in slots.items()}
+                for day, slots in grid.items()
+            })
+            st.dataframe(schedule_df, use_container_width=True)
+            
+            ical = get_ical(conn, "teacher", teacher_id, session_name)
+            if ical:
+                st.download_button(
+                    label="Add to Calendar (.ics)",
+                    data=ical.encode("utf-8"),
+                    file_name=f"teaching_schedule_{session_name.replace(' ', '_')}.ics",
+                    mime="text/calendar"
+                )
     
     with row2_col4:
         if st.button("👤 My Profile", use_container_width=True):
@@ -4,6 +4,7 @@ import numpy as np
 import io
 from components.header import render_page_title
 from database.schema import get_db_connection
+from models.notifications import queue_event
 
 def show():
     """Display the teacher grades submission page"""
@@ -1004,6 +1005,7 @@ def show():
                                 SET marks_finalized = 1, finalized_at = CURRENT_TIMESTAMP
                                 WHERE teacher_id = ? AND course_id = ? AND semester = ?
                             """, (teacher_id, selected_course_id, session_name))
+                            queue_event(conn, "grade_finalized", selected_course_id, session_name)
                             
                             conn.commit()
                             st.success("Grades have been finalized successfully!")
@@ -4,7 +4,9 @@ from datetime import datetime
 import json
 
 from components.header import render_page_title
+from components.pagination import render_page_controls
 from database.schema import get_db_connection
+from models.messaging import get_inbox, get_sent, mark_read, count_unread, send_messages, send_broadcast
 
 def show():
     """Display the messaging system for teachers"""
@@ -38,27 +40,19 @@ def show():
     
     # Inbox tab
     with tab1:
-        st.subheader("Inbox")
+        st.subheader(f"Inbox ({count_unread(conn, teacher_id, 'teacher')} unread)")
         
-        # Fetch received messages
-        messages = conn.execute("""
-            SELECT m.id, m.subject, m.message, m.sent_at, m.is_read, m.sender_role,
-                   CASE 
-                       WHEN m.sender_role = 'admin' THEN 'Administrator'
-                       WHEN m.sender_role = 'teacher' AND t.id IS NOT NULL THEN t.name
-                       WHEN m.sender_role = 'student' AND s.id IS NOT NULL THEN s.name
-                       ELSE 'Unknown'
-                   END as sender_name,
-                   c.code as course_code
-            FROM messages m
-            LEFT JOIN teachers t ON m.sender_id = t.id AND m.sender_role = 'teacher'
-            LEFT JOIN students s ON m.sender_id = s.id AND m.sender_role = 'student'
-            LEFT JOIN courses c ON m.course_id = c.id
-            WHERE m.recipient_id = ? AND m.recipient_role = 'teacher'
-            ORDER BY m.sent_at DESC
-        """, (teacher_id,)).fetchall()
+        # Fetch one page of received messages and course broadcasts; the cursor stack
+        # holds where each page starts so Newer can step back
+        inbox_cursors = st.session_state.setdefault('inbox_cursors', [None])
+        messages, older_inbox_cursor = get_inbox(conn, teacher_id, 'teacher', inbox_cursors[-1])
+        messages_by_key = {msg['key']: msg for msg in messages}
         
-        if not messages:
+        if not messages and len(inbox_cursors) > 1:
+            # The page emptied (e.g. messages deleted); start over from the newest
+            inbox_cursors[:] = [None]
+            st.rerun()
+        elif not messages:
             st.info("No messages in your inbox.")
         else:
             # Convert to DataFrame for better display
@@ -69,7 +63,7 @@ def show():
                 
                 messages_data.append({
                     "ID": msg['id'],
-                    "From": f"{msg['sender_name']}{course_info}",
+                    "From": f"{msg['party_name']}{course_info}",
                     "Subject": msg['subject'],
                     "Date": msg['sent_at'],
                     "Status": status
@@ -99,26 +93,24 @@ def show():
                 height=300
             )
             
+            render_page_controls(inbox_cursors, older_inbox_cursor, "inbox")
+            
             # Show selected message
             st.subheader("Message Details")
             selected_msg_id = st.selectbox("Select a message to view", 
-                                     options=[msg['id'] for msg in messages],
-                                     format_func=lambda x: next((msg['subject'] for msg in messages if msg['id'] == x), ""))
+                                     options=list(messages_by_key),
+                                     format_func=lambda key: messages_by_key[key]['subject'])
             
             if selected_msg_id:
-                selected_msg = next((msg for msg in messages if msg['id'] == selected_msg_id), None)
+                selected_msg = messages_by_key.get(selected_msg_id)
                 
                 if selected_msg:
                     # Mark as read if not already
                     if not selected_msg['is_read']:
-                        conn.execute(
-                            "UPDATE messages SET is_read = 1, read_at = datetime('now') WHERE id = ?",
-                            (selected_msg_id,)
-                        )
-                        conn.commit()
+                        mark_read(conn, selected_msg['kind'], selected_msg['id'], teacher_id, 'teacher')
                     
                     # Display message details
-                    st.markdown(f"**From:** {selected_msg['sender_name']}")
+                    st.markdown(f"**From:** {selected_msg['party_name']}")
                     st.markdown(f"**Subject:** {selected_msg['subject']}")
                     st.markdown(f"**Date:** {selected_msg['sent_at']}")
                     
@@ -129,10 +121,10 @@ def show():
                     if st.button("Reply"):
                         # Store reply info in session state
                         st.session_state.reply_to = {
-                            'id': selected_msg_id,
+                            'id': selected_msg['id'],
                             'recipient_id': selected_msg['sender_id'],
                             'recipient_role': selected_msg['sender_role'],
-                            'recipient_name': selected_msg['sender_name'],
+                            'recipient_name': selected_msg['party_name'],
                             'subject': f"Re: {selected_msg['subject']}",
                             'course_id': selected_msg.get('course_id')
                         }
@@ -144,36 +136,29 @@ def show():
     with tab2:
         st.subheader("Sent Messages")
         
-        # Fetch sent messages
-        sent_messages = conn.execute("""
-            SELECT m.id, m.subject, m.message, m.sent_at, m.is_read, m.recipient_role,
-                   CASE 
-                       WHEN m.recipient_role = 'admin' THEN 'Administrator'
-                       WHEN m.recipient_role = 'teacher' AND t.id IS NOT NULL THEN t.name
-                       WHEN m.recipient_role = 'student' AND s.id IS NOT NULL THEN s.name
-                       ELSE 'Unknown'
-                   END as recipient_name,
-                   c.code as course_code
-            FROM messages m
-            LEFT JOIN teachers t ON m.recipient_id = t.id AND m.recipient_role = 'teacher'
-            LEFT JOIN students s ON m.recipient_id = s.id AND m.recipient_role = 'student'
-            LEFT JOIN courses c ON m.course_id = c.id
-            WHERE m.sender_id = ? AND m.sender_role = 'teacher'
-            ORDER BY m.sent_at DESC
-        """, (teacher_id,)).fetchall()
+        # Fetch one page of sent messages and broadcasts
+        sent_cursors = st.session_state.setdefault('sent_cursors', [None])
+        sent_messages, older_sent_cursor = get_sent(conn, teacher_id, 'teacher', sent_cursors[-1])
+        sent_by_key = {msg['key']: msg for msg in sent_messages}
         
-        if not sent_messages:
+        if not sent_messages and len(sent_cursors) > 1:
+            sent_cursors[:] = [None]
+            st.rerun()
+        elif not sent_messages:
             st.info("No sent messages.")
         else:
             # Convert to DataFrame for better display
             sent_data = []
             for msg in sent_messages:
-                status = "Read" if msg['is_read'] else "Unread"
+                if msg['kind'] == 'broadcast':
+                    status = f"Read by {msg['read_count']}"
+                else:
+                    status = "Read" if msg['is_read'] else "Unread"
                 course_info = f" ({msg['course_code']})" if msg['course_code'] else ""
                 
                 sent_data.append({
                     "ID": msg['id'],
-                    "To": f"{msg['recipient_name']}{course_info}",
+                    "To": msg['party_name'] if msg['kind'] == 'broadcast' else f"{msg['party_name']}{course_info}",
                     "Subject": msg['subject'],
                     "Date": msg['sent_at'],
                     "Status": status
@@ -196,21 +181,26 @@ def show():
                 height=300
             )
             
+            render_page_controls(sent_cursors, older_sent_cursor, "sent")
+            
             # Show selected message
             st.subheader("Message Details")
             selected_sent_id = st.selectbox("Select a sent message to view", 
-                                     options=[msg['id'] for msg in sent_messages],
-                                     format_func=lambda x: next((msg['subject'] for msg in sent_messages if msg['id'] == x), ""))
+                                     options=list(sent_by_key),
+                                     format_func=lambda key: sent_by_key[key]['subject'])
             
             if selected_sent_id:
-                selected_sent = next((msg for msg in sent_messages if msg['id'] == selected_sent_id), None)
+                selected_sent = sent_by_key.get(selected_sent_id)
                 
                 if selected_sent:
                     # Display message details
-                    st.markdown(f"**To:** {selected_sent['recipient_name']}")
+                    st.markdown(f"**To:** {selected_sent['party_name']}")
                     st.markdown(f"**Subject:** {selected_sent['subject']}")
                     st.markdown(f"**Date:** {selected_sent['sent_at']}")
-                    st.markdown(f"**Status:** {'Read' if selected_sent['is_read'] else 'Unread'}")
+                    if selected_sent['kind'] == 'broadcast':
+                        st.markdown(f"**Status:** Read by {selected_sent['read_count']} student(s)")
+                    else:
+                        st.markdown(f"**Status:** {'Read' if selected_sent['is_read'] else 'Unread'}")
                     
                     # Display the message in a text box
                     st.text_area("Message", selected_sent['message'], height=200, disabled=True)
@@ -287,15 +277,12 @@ def show():
                             
                             if st.button("Send", key="send_student"):
                                 if subject and message:
-                                    # Insert message for each student
-                                    for student_id in selected_students:
-                                        conn.execute("""
-                                            INSERT INTO messages 
-                                            (sender_id, sender_role, recipient_id, recipient_role, course_id, subject, message)
-                                            VALUES (?, ?, ?, ?, ?, ?, ?)
-                                        """, (teacher_id, 'teacher', student_id, 'student', selected_course_id, subject, message))
-                                    
-                                    conn.commit()
+                                    if bulk_message:
+                                        # One broadcast row reaches everyone enrolled in the course
+                                        send_broadcast(conn, teacher_id, 'teacher', selected_course_id, session_name, subject, message)
+                                    else:
+                                        send_messages(conn, teacher_id, 'teacher', selected_students, 'student',
+                                                      subject, message, selected_course_id)
                                     st.success(f"Message sent to {len(selected_students)} student(s)!")
                                     
                                     # Clear form using rerun with a flag instead of direct session state manipulation
@@ -353,15 +340,8 @@ def show():
                     
                     if st.button("Send", key="send_teacher"):
                         if subject and message:
-                            # Insert message for each teacher
-                            for rcpt_teacher_id in selected_teacher_ids:
-                                conn.execute("""
-                                    INSERT INTO messages 
-                                    (sender_id, sender_role, recipient_id, recipient_role, course_id, subject, message)
-                                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                                """, (teacher_id, 'teacher', rcpt_teacher_id, 'teacher', selected_course_id, subject, message))
-                            
-                            conn.commit()
+                            send_messages(conn, teacher_id, 'teacher', selected_teacher_ids, 'teacher',
+                                          subject, message, selected_course_id)
                             st.success(f"Message sent to {len(selected_teacher_ids)} teacher(s)!")
                             
                             # Clear form using rerun with a flag instead of direct session state manipulation
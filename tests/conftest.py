@@ -0,0 +1,8 @@
+import os
+import sys
+import tempfile
+
+# Point the app (and the worker processes it spawns) at a throwaway database before
+# anything imports the database package
+os.environ["INTELLIX_DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="intellix-test-"), "intellix.db")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
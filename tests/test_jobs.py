@@ -0,0 +1,42 @@
+import database
+from database.schema import get_db_connection
+from models.jobs import enqueue_job, get_job, run_worker
+
+SEMESTER = "Test Session"
+
+def _seed_students(count=5):
+    conn = get_db_connection()
+    try:
+        course_id = conn.execute(
+            "INSERT INTO courses (code, title, credit_hour) VALUES ('TST101', 'Test Course', 3)"
+        ).lastrowid
+        for index in range(count):
+            student_id = conn.execute(
+                "INSERT INTO students (student_id, name, dept, semester) VALUES (?, ?, 'CSE', '1')",
+                (f"TST-{index}", f"Student {index}")
+            ).lastrowid
+            conn.execute(
+                "INSERT INTO enrollments (student_id, course_id, semester) VALUES (?, ?, ?)",
+                (student_id, course_id, SEMESTER)
+            )
+        conn.commit()
+    finally:
+        conn.close()
+
+def test_generate_study_plans_job_reports_progress_and_succeeds():
+    _seed_students()
+    job_id = enqueue_job("generate_study_plans", {"semester": SEMESTER})
+
+    run_worker(processes=1, poll_interval=0.1, idle_exit=True)
+
+    job = get_job(job_id)
+    assert job["status"] == "succeeded", job["error"]
+    assert job["attempts"] == 1
+    assert job["result"]["generated"] == 5
+
+    conn = get_db_connection()
+    try:
+        plans = conn.execute("SELECT COUNT(*) FROM study_plans WHERE semester = ?", (SEMESTER,)).fetchone()[0]
+    finally:
+        conn.close()
+    assert plans == 5
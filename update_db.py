@@ -1,7 +1,7 @@
 import sqlite3
 import os
 from pathlib import Path
-from database.schema import init_db
+from database.schema import init_db, init_message_indexes
 
 def update_database():
     """Update the database schema to include missing tables and fields"""
@@ -167,6 +167,7 @@ def update_database():
         )
         ''')
         print("Messages table created")
+        init_message_indexes(cursor)
         
         # Create message templates table
         cursor.execute('''